@@ -2,15 +2,12 @@
 
 import sys
 import os
-from PyInstaller.utils.hooks import collect_data_files, collect_submodules
 
 block_cipher = None
 
-# Thu thập tất cả các module con của yt-dlp
-yt_dlp_modules = collect_submodules('yt_dlp')
-
-# Thu thập tất cả các file dữ liệu của yt-dlp
-yt_dlp_data = collect_data_files('yt_dlp')
+# Không ép thu thập mọi module con của yt-dlp: yt-dlp có sẵn hook PyInstaller
+# (yt_dlp/__pyinstaller) khai báo đúng các module cần thiết, còn extractor được nạp
+# qua lazy_extractors khi chạy. Ứng dụng chỉ import yt-dlp sau khi cửa sổ hiển thị.
 
 # Đường dẫn đến thư mục gốc của dự án
 base_path = os.path.abspath('.')
@@ -25,19 +22,17 @@ added_files = [
     (os.path.join(assets_path, 'img'), 'assets/img'),
 ]
 
-# Thêm các file dữ liệu của yt-dlp
-added_files.extend(yt_dlp_data)
-
 a = Analysis(
     ['src/main.py'],
     pathex=[base_path],
     binaries=[],
     datas=added_files,
-    hiddenimports=yt_dlp_modules + ['PyQt5.QtCore', 'PyQt5.QtGui', 'PyQt5.QtWidgets', 'PyQt5.sip'],
+    hiddenimports=['yt_dlp', 'PyQt5.QtCore', 'PyQt5.QtGui', 'PyQt5.QtWidgets', 'PyQt5.sip'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Các module không dùng tới, bỏ đi để giảm kích thước và thời gian giải nén
+    excludes=['tkinter', 'unittest', 'pydoc', 'PyQt5.QtWebEngineWidgets', 'PyQt5.QtQml', 'PyQt5.QtQuick'],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
@@ -59,7 +54,8 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    # Không nén UPX: giải nén khi khởi động và bị phần mềm diệt virus quét lại làm chậm khởi động
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -75,7 +71,7 @@ coll = COLLECT(
     a.zipfiles,
     a.datas,
     strip=False,
-    upx=True,
+    upx=False,
     upx_exclude=[],
     name='LappyTube',
 ) 
\ No newline at end of file
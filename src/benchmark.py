@@ -0,0 +1,455 @@
+"""
+Đo hiệu năng tải xuống của LappyTube trên một máy chủ media cục bộ
+
+Máy chủ HTTP chạy trong tiến trình riêng, phục vụ media giả lập dạng progressive (một file
+mp4, hỗ trợ Range) và dạng phân mảnh HLS/DASH. YouTubeDownloader.download tải các URL này
+qua generic extractor của yt-dlp với từng tổ hợp số fragment đồng thời và kích thước buffer.
+Mỗi lần chạy nằm trong một tiến trình mới để đo chính xác thời gian CPU và RSS đỉnh.
+
+Ví dụ:
+    python -m src.benchmark --concurrency 1,4,8 --buffer-sizes 64K,1M,16M -o bench.json
+    python -m src.benchmark --compare bench.json
+"""
+
+import argparse
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Thêm thư mục gốc vào đường dẫn để có thể import các module
+base_path = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+if base_path not in sys.path:
+    sys.path.insert(0, base_path)
+
+from src.utils.helpers import format_filesize, parse_size, setup_logging
+
+logger = logging.getLogger('lappytube.benchmark')
+
+SCENARIOS = ('progressive', 'hls', 'dash')
+
+# Dữ liệu giả lập được lặp lại để tạo file có kích thước tùy ý
+_PATTERN = os.urandom(1024 * 1024)
+_CHUNK_SIZE = 64 * 1024
+
+
+def parse_list(item_type):
+    """Tạo hàm phân tích danh sách phân tách bằng dấu phẩy cho argparse"""
+    def parse(value):
+        return [item_type(item) for item in value.split(',') if item.strip()]
+    return parse
+
+
+# ----------------------------------------------------------------------
+# Máy chủ media giả lập
+# ----------------------------------------------------------------------
+class _MediaHandler(BaseHTTPRequestHandler):
+    """Phục vụ media giả lập theo cấu hình trong server.bench_config"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            # Máy khách đóng kết nối keep-alive hoặc bỏ dở một đoạn: không phải lỗi của máy chủ
+            pass
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def _handle(self, send_body):
+        config = self.server.bench_config
+        if config['latency']:
+            time.sleep(config['latency'])
+
+        path = self.path.split('?', 1)[0]
+        segment_size = config['segment_size']
+        segments = max(1, config['size'] // segment_size)
+
+        if path == '/progressive.mp4':
+            self._send_bytes(config['size'], 'video/mp4', send_body)
+        elif path == '/hls/master.m3u8':
+            self._send_text(_hls_master(config), 'application/vnd.apple.mpegurl', send_body)
+        elif path == '/hls/media.m3u8':
+            self._send_text(_hls_media(segments), 'application/vnd.apple.mpegurl', send_body)
+        elif path == '/dash/manifest.mpd':
+            self._send_text(_dash_manifest(config, segments), 'application/dash+xml', send_body)
+        elif path == '/dash/init.mp4':
+            self._send_bytes(1024, 'video/mp4', send_body)
+        elif path.startswith(('/hls/seg', '/dash/seg')):
+            self._send_bytes(segment_size, 'video/mp2t' if path.endswith('.ts') else 'video/iso.segment',
+                             send_body)
+        else:
+            self.send_error(404)
+
+    def _send_text(self, text, content_type, send_body):
+        data = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+    def _send_bytes(self, size, content_type, send_body):
+        start, end = 0, size - 1
+        range_header = self.headers.get('Range')
+        if range_header and range_header.startswith('bytes='):
+            first, _, last = range_header[6:].split(',')[0].partition('-')
+            start = int(first) if first else 0
+            end = min(int(last), size - 1) if last else size - 1
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        length = end - start + 1
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if not send_body:
+            return
+
+        # Giới hạn tốc độ mỗi kết nối để mô phỏng mạng thật
+        rate = self.server.bench_config['connection_rate']
+        started = time.monotonic()
+        sent = 0
+        offset = start % len(_PATTERN)
+        try:
+            while sent < length:
+                chunk = min(_CHUNK_SIZE, length - sent, len(_PATTERN) - offset)
+                self.wfile.write(_PATTERN[offset:offset + chunk])
+                sent += chunk
+                offset = (offset + chunk) % len(_PATTERN)
+                if rate:
+                    delay = sent / rate - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def _hls_master(config):
+    return (
+        "#EXTM3U\n"
+        f"#EXT-X-STREAM-INF:BANDWIDTH={config['bitrate']},RESOLUTION=1280x720,"
+        'CODECS="avc1.64001f,mp4a.40.2"\n'
+        "media.m3u8\n"
+    )
+
+
+def _hls_media(segments):
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:4", "#EXT-X-MEDIA-SEQUENCE:0",
+             "#EXT-X-PLAYLIST-TYPE:VOD"]
+    for index in range(segments):
+        lines += ["#EXTINF:4.0,", f"seg{index}.ts"]
+    lines.append("#EXT-X-ENDLIST")
+    return '\n'.join(lines) + '\n'
+
+
+def _dash_manifest(config, segments):
+    segment_urls = ''.join(f'<SegmentURL media="seg{index}.m4s"/>' for index in range(segments))
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" minBufferTime="PT2S" '
+        f'mediaPresentationDuration="PT{segments * 4}S" '
+        'profiles="urn:mpeg:dash:profile:isoff-main:2011"><Period>'
+        '<AdaptationSet mimeType="video/mp4" segmentAlignment="true">'
+        f'<Representation id="bench" bandwidth="{config["bitrate"]}" width="1280" height="720" '
+        'codecs="avc1.64001f,mp4a.40.2">'
+        '<SegmentList timescale="1" duration="4"><Initialization sourceURL="init.mp4"/>'
+        f'{segment_urls}</SegmentList></Representation></AdaptationSet></Period></MPD>'
+    )
+
+
+def _serve(config, port_queue, stop_event):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _MediaHandler)
+    server.daemon_threads = True
+    server.bench_config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port_queue.put(server.server_address[1])
+    stop_event.wait()
+    server.shutdown()
+
+
+class MediaServer:
+    """Máy chủ media giả lập chạy trong tiến trình riêng để không ảnh hưởng số đo CPU"""
+
+    def __init__(self, size, segment_size, latency=0.0, connection_rate=0):
+        """
+        Args:
+            size (int): Dung lượng media (byte)
+            segment_size (int): Dung lượng mỗi fragment HLS/DASH (byte)
+            latency (float): Độ trễ trước mỗi phản hồi (giây)
+            connection_rate (int): Tốc độ tối đa mỗi kết nối (byte/s), 0 là không giới hạn
+        """
+        self.config = {
+            'size': size,
+            'segment_size': segment_size,
+            'latency': latency,
+            'connection_rate': connection_rate,
+            'bitrate': max(1, segment_size * 8 // 4),
+        }
+        context = multiprocessing.get_context('spawn')
+        self._port_queue = context.Queue()
+        self._stop = context.Event()
+        self._process = context.Process(target=_serve, args=(self.config, self._port_queue, self._stop),
+                                        daemon=True)
+        self.port = None
+
+    def __enter__(self):
+        self._process.start()
+        self.port = self._port_queue.get(timeout=30)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+
+    def url_for(self, scenario):
+        """URL của một kịch bản: progressive, hls hoặc dash"""
+        paths = {
+            'progressive': '/progressive.mp4',
+            'hls': '/hls/master.m3u8',
+            'dash': '/dash/manifest.mpd',
+        }
+        return f"http://127.0.0.1:{self.port}{paths[scenario]}"
+
+
+# ----------------------------------------------------------------------
+# Chạy thử
+# ----------------------------------------------------------------------
+def _peak_rss():
+    """RSS đỉnh của tiến trình hiện tại (byte), None nếu không đo được"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux báo theo KB, macOS theo byte
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_trial(url, concurrency, buffer_size, retries, log_level=None):
+    """
+    Tải một URL một lần và đo hiệu năng (chạy trong tiến trình con)
+
+    Thông tin video được trích xuất trước khi bắt đầu đo để chỉ đo phần tải xuống.
+
+    Returns:
+        dict: bytes, seconds, throughput, cpu_seconds, peak_rss, ttfb
+    """
+    setup_logging(log_level or 'ERROR')
+    from src.core.downloader import YouTubeDownloader
+    from src.core.info_cache import InfoCache
+
+    work_dir = tempfile.mkdtemp(prefix='lappytube-bench-')
+    try:
+        downloader = YouTubeDownloader(info_cache=InfoCache(persist=False))
+        info = downloader.extract_info(url)
+        first_byte_at = []
+
+        def progress(percent, downloaded, total, speed):
+            if downloaded and not first_byte_at:
+                first_byte_at.append(time.perf_counter())
+
+        cpu_before = os.times()
+        started = time.perf_counter()
+        file_path = downloader.download(
+            url, work_dir, "video", "highest", progress,
+            concurrent_downloads=concurrency,
+            buffer_size=buffer_size,
+            retry_count=retries,
+            info=info,
+            format_override='best',
+            defer_postprocess=True,
+        )
+        seconds = time.perf_counter() - started
+        cpu_after = os.times()
+
+        size = os.path.getsize(file_path)
+        return {
+            'bytes': size,
+            'seconds': seconds,
+            'throughput': size / seconds if seconds > 0 else 0,
+            'cpu_seconds': (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system),
+            'peak_rss': _peak_rss(),
+            'ttfb': first_byte_at[0] - started if first_byte_at else None,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _median(values):
+    values = [value for value in values if value is not None]
+    return statistics.median(values) if values else None
+
+
+def run_benchmark(args, server):
+    """
+    Chạy tất cả tổ hợp kịch bản × số fragment × buffer
+
+    Returns:
+        list: Mỗi phần tử là kết quả trung vị của một tổ hợp
+    """
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for scenario in args.scenarios:
+        url = server.url_for(scenario)
+        for concurrency in args.concurrency:
+            for buffer_size in args.buffer_sizes:
+                trials = []
+                for _ in range(args.repeat):
+                    # Mỗi lần chạy một tiến trình mới để RSS đỉnh và CPU không cộng dồn
+                    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                        trials.append(pool.submit(run_trial, url, concurrency, buffer_size,
+                                                  args.retries, args.log_level).result())
+                result = {
+                    'scenario': scenario,
+                    'concurrency': concurrency,
+                    'buffer_size': buffer_size,
+                    'retries': args.retries,
+                    'repeat': args.repeat,
+                    'bytes': trials[0]['bytes'],
+                }
+                for metric in ('seconds', 'throughput', 'cpu_seconds', 'peak_rss', 'ttfb'):
+                    result[metric] = _median(trial[metric] for trial in trials)
+                results.append(result)
+                print(format_result(result), file=sys.stderr)
+    return results
+
+
+def format_result(result):
+    """Một dòng tóm tắt dễ đọc cho một tổ hợp"""
+    ttfb = f"{result['ttfb'] * 1000:.0f} ms" if result['ttfb'] is not None else "n/a"
+    rss = format_filesize(result['peak_rss']) if result['peak_rss'] else "n/a"
+    return (f"{result['scenario']:<12} fragments={result['concurrency']:<3} "
+            f"buffer={format_filesize(result['buffer_size']):<10} "
+            f"{format_filesize(result['throughput'])}/s  cpu={result['cpu_seconds']:.2f}s  "
+            f"rss={rss}  ttfb={ttfb}")
+
+
+def compare_results(current, baseline, max_regression):
+    """
+    So sánh thông lượng với một lần chạy trước
+
+    Args:
+        current (list): Kết quả hiện tại
+        baseline (list): Kết quả đã lưu
+        max_regression (float): Tỉ lệ giảm thông lượng tối đa chấp nhận được (0.1 = 10%)
+
+    Returns:
+        list: Các tổ hợp bị giảm quá ngưỡng
+    """
+    def key(result):
+        return result['scenario'], result['concurrency'], result['buffer_size']
+
+    previous = {key(result): result for result in baseline}
+    regressions = []
+    for result in current:
+        old = previous.get(key(result))
+        if not old or not old.get('throughput'):
+            continue
+        change = result['throughput'] / old['throughput'] - 1
+        print(f"{result['scenario']:<12} fragments={result['concurrency']:<3} "
+              f"buffer={format_filesize(result['buffer_size']):<10} thông lượng {change:+.1%}",
+              file=sys.stderr)
+        if change < -max_regression:
+            regressions.append(result)
+    return regressions
+
+
+def build_parser():
+    """Tạo bộ phân tích tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(
+        prog='lappytube-benchmark',
+        description='Đo thông lượng tải xuống trên máy chủ media cục bộ (progressive, HLS, DASH).'
+    )
+    parser.add_argument('--scenarios', type=parse_list(str), default=list(SCENARIOS),
+                        help='Các kịch bản, phân tách bằng dấu phẩy (mặc định: progressive,hls,dash)')
+    parser.add_argument('--concurrency', type=parse_list(int), default=[1, 4, 8, 16],
+                        help='Các giá trị concurrent_fragment_downloads (mặc định: 1,4,8,16)')
+    parser.add_argument('--buffer-sizes', type=parse_list(parse_size), default=[64 * 1024, 1024 ** 2, 16 * 1024 ** 2],
+                        help='Các kích thước buffer (mặc định: 64K,1M,16M)')
+    parser.add_argument('--retries', type=int, default=10, help='Số lần thử lại (mặc định: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='Số lần chạy mỗi tổ hợp, lấy trung vị (mặc định: %(default)s)')
+    parser.add_argument('--size', type=parse_size, default=64 * 1024 ** 2,
+                        help='Dung lượng media giả lập (mặc định: 64M)')
+    parser.add_argument('--segment-size', type=parse_size, default=1024 ** 2,
+                        help='Dung lượng mỗi fragment HLS/DASH (mặc định: 1M)')
+    parser.add_argument('--latency', type=float, default=20,
+                        help='Độ trễ máy chủ trước mỗi phản hồi (ms, mặc định: %(default)s)')
+    parser.add_argument('--connection-rate', type=parse_size, default=8 * 1024 ** 2,
+                        help='Tốc độ tối đa mỗi kết nối, 0 là không giới hạn (mặc định: 8M)')
+    parser.add_argument('-o', '--output', default='benchmark-results.json',
+                        help='File JSON lưu kết quả (mặc định: %(default)s)')
+    parser.add_argument('--compare', metavar='FILE', help='File kết quả trước đó để so sánh thông lượng')
+    parser.add_argument('--max-regression', type=float, default=10,
+                        help='Mức giảm thông lượng tối đa so với --compare (%%, mặc định: %(default)s)')
+    parser.add_argument('--log-level', default=None, help='Mức log của downloader trong tiến trình con')
+    return parser
+
+
+def main(argv=None):
+    """Điểm vào của benchmark"""
+    args = build_parser().parse_args(argv)
+    setup_logging(args.log_level)
+    unknown = [scenario for scenario in args.scenarios if scenario not in SCENARIOS]
+    if unknown:
+        print(f"Kịch bản không hợp lệ: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    import yt_dlp
+
+    # Đọc kết quả cũ trước khi chạy vì file đầu ra có thể trùng với file so sánh
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f).get('results', [])
+
+    with MediaServer(args.size, args.segment_size, args.latency / 1000, args.connection_rate) as server:
+        results = run_benchmark(args, server)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'yt_dlp': yt_dlp.version.__version__,
+        'server': server.config,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Đã lưu kết quả vào {args.output}", file=sys.stderr)
+
+    if baseline is not None and compare_results(results, baseline, args.max_regression / 100):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
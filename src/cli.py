@@ -0,0 +1,366 @@
+"""
+Điểm khởi chạy dòng lệnh (không giao diện) của LappyTube
+
+Dùng cho các máy chủ tải hàng loạt: đọc danh sách URL từ tham số, file hoặc stdin,
+tải song song qua DownloadQueue và ghi tiến trình ra stdout dạng JSON lines.
+Module này không import PyQt5.
+
+Ví dụ:
+    python -m src.cli -i urls.txt -o /data/videos -j 4
+    python -m src.cli --check -i urls.txt
+    cat urls.txt | python src/cli.py --type audio
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import threading
+
+# Thêm thư mục gốc vào đường dẫn để có thể import các module
+base_path = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+if base_path not in sys.path:
+    sys.path.insert(0, base_path)
+
+from src.core.config import Config
+from src.core.media_cache import MediaCache
+from src.core.downloader import YouTubeDownloader
+from src.core.analysis import ExtractionService
+from src.core.download_queue import DownloadQueue, JobState
+from src.core.playlist import PlaylistExpander, is_collection_url
+from src.core.progress import ProgressAggregator
+from src.core.journal import JobJournal
+from src.core.history import DownloadHistory
+from src.core.sync import ChannelSync
+from src.core.bandwidth import BandwidthManager, parse_bandwidth_schedule
+from src.core.speed import ThroughputMeter
+from src.utils.helpers import parse_size, parse_url_list, setup_logging
+
+# Mã thoát
+EXIT_OK = 0
+EXIT_PARTIAL_FAILURE = 1  # Một số video tải thất bại
+EXIT_USAGE = 2  # Tham số không hợp lệ hoặc không có URL nào
+EXIT_ALL_FAILED = 3  # Tất cả video đều thất bại
+EXIT_INTERRUPTED = 130  # Người dùng nhấn Ctrl+C
+
+
+def parse_schedule(value):
+    """Phân tích lịch băng thông, ví dụ 08:00-18:00=2M; 18:00-08:00=0"""
+    try:
+        return parse_bandwidth_schedule(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser(config):
+    """Tạo bộ phân tích tham số dòng lệnh với giá trị mặc định lấy từ Config"""
+    parser = argparse.ArgumentParser(
+        prog='lappytube-cli',
+        description='Tải video YouTube hàng loạt không cần giao diện (xuất tiến trình dạng JSON lines).'
+    )
+    parser.add_argument('urls', nargs='*', help='URL video, danh sách phát hoặc kênh')
+    parser.add_argument('-i', '--input', metavar='FILE',
+                        help='File chứa danh sách URL (mỗi dòng một URL, "-" để đọc từ stdin)')
+    parser.add_argument('-o', '--output', default=config.get('save_directory'),
+                        help='Thư mục lưu (mặc định: %(default)s)')
+    parser.add_argument('-t', '--type', dest='download_type', choices=('video', 'audio'), default='video',
+                        help='Loại tải xuống (mặc định: %(default)s)')
+    parser.add_argument('-q', '--quality', default=None,
+                        help='Chất lượng, ví dụ "highest", "720p", "192kbps (mp3)"')
+    parser.add_argument('-j', '--jobs', type=int, default=config.get('max_parallel_downloads', 3),
+                        help='Số video tải song song (mặc định: %(default)s)')
+    parser.add_argument('--fragments', type=int, default=8,
+                        help='Số fragment tải đồng thời cho mỗi video (mặc định: %(default)s)')
+    parser.add_argument('--buffer-size', type=parse_size, default=16 * 1024 * 1024,
+                        help='Kích thước buffer, ví dụ 16M (mặc định: 16M)')
+    parser.add_argument('--auto-tune', action='store_true',
+                        help='Tự điều chỉnh số fragment/kết nối và buffer theo thông lượng, ghi nhớ theo máy chủ '
+                             '(bỏ qua --fragments và --buffer-size)')
+    parser.add_argument('--no-stream-audio', dest='stream_audio', action='store_false',
+                        default=config.get('stream_audio', True),
+                        help='Với audio, tải hết file rồi mới chuyển sang mp3 thay vì chuyển ngay trong lúc tải')
+    parser.add_argument('--media-cache-size', type=parse_size,
+                        default=config.get('media_cache_size', 0) * 1024 * 1024 * 1024,
+                        help='Dung lượng bộ đệm các luồng đã tải để dùng lại, ví dụ 20G (0 là tắt)')
+    parser.add_argument('--media-cache-dir', default=config.get('media_cache_dir') or None,
+                        help='Thư mục bộ đệm media, có thể đặt trên ổ dùng chung (mặc định: ~/.lappytube/media)')
+    parser.add_argument('--priority', choices=('high', 'normal', 'low'), default=None,
+                        help='Mức ưu tiên trong hàng đợi (mặc định: normal với video lẻ, low với danh sách phát/kênh)')
+    parser.add_argument('--retries', type=int, default=10, help='Số lần thử lại (mặc định: %(default)s)')
+    parser.add_argument('--rate-limit', type=parse_size, default=0,
+                        help='Giới hạn tốc độ mỗi video, ví dụ 5M (mặc định: không giới hạn)')
+    parser.add_argument('--total-rate-limit', type=parse_size, default=0,
+                        help='Băng thông tổng chia cho các video đang tải, ví dụ 10M (mặc định: không giới hạn)')
+    parser.add_argument('--bandwidth-schedule', type=parse_schedule, default=None,
+                        help='Băng thông tổng theo giờ, ví dụ "08:00-18:00=2M; 18:00-08:00=0"')
+    parser.add_argument('--ffmpeg', default=None, help='Đường dẫn ffmpeg (mặc định: tự động phát hiện)')
+    parser.add_argument('--no-expand', action='store_true',
+                        help='Không mở rộng danh sách phát/kênh thành từng video')
+    parser.add_argument('--progress-interval', type=float, default=1.0,
+                        help='Khoảng thời gian giữa hai lần xuất tiến trình (giây, mặc định: %(default)s)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Tiếp tục các công việc bị gián đoạn được ghi trong journal')
+    parser.add_argument('--no-journal', action='store_true',
+                        help='Không ghi journal (không thể tiếp tục nếu bị gián đoạn)')
+    parser.add_argument('--sync', action='store_true',
+                        help='Đồng bộ tăng dần danh sách phát/kênh: chỉ liệt kê và tải video mới từ lần trước')
+    parser.add_argument('--check', action='store_true',
+                        help='Chỉ kiểm tra các URL (trích xuất thông tin song song), không tải xuống')
+    parser.add_argument('--check-workers', type=int, default=16,
+                        help='Số URL kiểm tra đồng thời (mặc định: %(default)s)')
+    parser.add_argument('--per-host', type=int, default=4,
+                        help='Số URL kiểm tra đồng thời tối đa trên mỗi máy chủ (mặc định: %(default)s)')
+    parser.add_argument('--redownload', action='store_true', default=not config.get('skip_downloaded', True),
+                        help='Tải lại cả các video đã có trong lịch sử tải xuống')
+    parser.add_argument('--metrics-file', metavar='FILE', default=None,
+                        help='Ghi số liệu thời gian từng giai đoạn ra file (JSON nếu đuôi .json, '
+                             'ngược lại Prometheus text), cập nhật định kỳ và khi kết thúc')
+    parser.add_argument('--metrics-interval', type=float, default=10.0,
+                        help='Khoảng thời gian giữa hai lần ghi file số liệu (giây, mặc định: %(default)s)')
+    parser.add_argument('--quiet', action='store_true', help='Chỉ xuất các sự kiện bắt đầu/kết thúc')
+    parser.add_argument('--log-level', default=None,
+                        help='Mức log ghi ra stderr: DEBUG, INFO, WARNING, ERROR (mặc định: WARNING)')
+    return parser
+
+
+def read_urls(args):
+    """
+    Gom URL từ tham số, file đầu vào và stdin
+
+    Returns:
+        list: Danh sách URL không trùng lặp
+    """
+    text = '\n'.join(args.urls)
+    if args.input == '-' or (not args.input and not args.urls and not sys.stdin.isatty()):
+        text += '\n' + sys.stdin.read()
+    elif args.input:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            text += '\n' + f.read()
+    return parse_url_list(text)
+
+
+class JsonLinesReporter:
+    """Ghi sự kiện của các công việc ra stream dạng JSON lines (an toàn đa luồng)"""
+
+    def __init__(self, stream, quiet=False):
+        self.stream = stream
+        self.quiet = quiet
+        self._lock = threading.Lock()
+        self._last_state = {}  # job id -> trạng thái đã báo
+        self.throughput = ThroughputMeter()  # thông lượng tổng của các công việc đang tải
+
+    def emit(self, event, **fields):
+        record = {'event': event, 'time': round(time.time(), 3)}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+    def on_jobs_event(self, jobs):
+        """Nhận danh sách công việc đã thay đổi từ ProgressAggregator"""
+        for job in jobs:
+            # Công việc tải tiếp từ phiên trước: phần đã có sẵn không tính vào thông lượng
+            baseline = None if job.metadata.get('resumed') else 0
+            if job.state == JobState.RUNNING:
+                self.throughput.update(job.id, job.downloaded, baseline)
+            elif job.is_finished:
+                self.throughput.finish(job.id, job.downloaded, baseline)
+            previous = self._last_state.get(job.id)
+            if previous != job.state:
+                self._last_state[job.id] = job.state
+                fields = {'job': job.id, 'url': job.url}
+                if job.state == JobState.RUNNING:
+                    fields['wait'] = round(job.wait_time, 3)
+                elif job.state == JobState.DONE:
+                    fields['file'] = job.file_path
+                    fields['elapsed'] = round((job.finished_at or time.time()) - (job.started_at or job.created_at), 3)
+                    fields['metrics'] = job.metrics.report()
+                elif job.state == JobState.FAILED:
+                    fields['error'] = job.error
+                    fields['metrics'] = job.metrics.report()
+                if not self.quiet or job.state != JobState.QUEUED:
+                    self.emit(job.state, **fields)
+            elif not self.quiet and job.state == JobState.RUNNING:
+                self.emit('progress', job=job.id, percent=job.percent, downloaded=job.downloaded,
+                          total=job.total, speed=int(job.speed or 0),
+                          eta=round(job.eta, 1) if job.eta is not None else None)
+        speed = self.throughput.sample()
+        if not self.quiet and any(job.state == JobState.RUNNING for job in jobs):
+            self.emit('throughput', speed=int(speed), bytes=self.throughput.total)
+
+
+def check_urls(args, urls, reporter):
+    """
+    Kiểm tra danh sách URL mà không tải xuống, xuất một sự kiện 'checked' cho mỗi URL ngay khi có kết quả
+
+    Returns:
+        int: Mã thoát
+    """
+    started_at = time.time()
+    downloader = YouTubeDownloader()
+    service = ExtractionService(downloader, max_workers=args.check_workers, per_host=args.per_host)
+    valid = invalid = 0
+    try:
+        for result in service.analyze(urls):
+            if result.ok:
+                valid += 1
+            else:
+                invalid += 1
+            reporter.emit('checked', elapsed=round(result.elapsed, 3), **result.summary())
+    except KeyboardInterrupt:
+        reporter.emit('interrupted')
+        return EXIT_INTERRUPTED
+    finally:
+        service.close()
+        downloader.sessions.close()
+    reporter.emit('summary', elapsed=round(time.time() - started_at, 3), valid=valid, invalid=invalid)
+    if invalid == 0:
+        return EXIT_OK
+    return EXIT_ALL_FAILED if valid == 0 else EXIT_PARTIAL_FAILURE
+
+
+def main(argv=None):
+    """Hàm chính của chế độ dòng lệnh, trả về mã thoát"""
+    config = Config()
+    parser = build_parser(config)
+    args = parser.parse_args(argv)
+    setup_logging(args.log_level)
+
+    # stdout chỉ dành cho JSON lines; mọi thông tin in ra khác (yt-dlp, debug) chuyển sang stderr
+    json_out = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        return run(args, JsonLinesReporter(json_out, args.quiet))
+    finally:
+        sys.stdout = json_out
+
+
+def run(args, reporter):
+    """
+    Tải (hoặc kiểm tra) các URL theo tham số đã phân tích
+
+    Returns:
+        int: Mã thoát
+    """
+    try:
+        urls = read_urls(args)
+    except OSError as e:
+        reporter.emit('error', error=f"Không thể đọc danh sách URL: {e}")
+        return EXIT_USAGE
+    if args.check:
+        if not urls:
+            reporter.emit('error', error="Không có URL nào để kiểm tra")
+            return EXIT_USAGE
+        return check_urls(args, urls, reporter)
+    journal = None if args.no_journal else JobJournal()
+    resumable = journal.interrupted() if journal is not None and args.resume else []
+    if not urls and not resumable:
+        reporter.emit('error', error="Không có URL nào để tải")
+        return EXIT_USAGE
+
+    save_path = os.path.abspath(os.path.expanduser(args.output))
+    os.makedirs(save_path, exist_ok=True)
+    quality = args.quality or ("highest" if args.download_type == "video" else "bestaudio")
+
+    media_cache = MediaCache(args.media_cache_dir, args.media_cache_size) if args.media_cache_size > 0 else None
+    downloader = YouTubeDownloader(
+        bandwidth=BandwidthManager(total_limit=args.total_rate_limit, schedule=args.bandwidth_schedule),
+        media_cache=media_cache
+    )
+    aggregator = ProgressAggregator(reporter.on_jobs_event, interval=args.progress_interval).start()
+    queue = DownloadQueue(downloader, max_parallel=args.jobs, listener=aggregator.on_job_event)
+    if journal is not None:
+        queue.add_listener(journal.on_job_event)
+    history = DownloadHistory()
+    queue.add_listener(history.on_job_event)
+    queue.add_listener(downloader.metrics.on_job_event)
+    if args.metrics_file:
+        downloader.metrics.start_export(args.metrics_file, args.metrics_interval)
+    options = {
+        'speed_limit': args.rate_limit,
+        'concurrent_downloads': args.fragments,
+        'buffer_size': args.buffer_size,
+        'retry_count': args.retries,
+        'ffmpeg_path': args.ffmpeg,
+        'auto_tune': args.auto_tune,
+        'stream_audio': args.stream_audio,
+    }
+
+    started_at = time.time()
+    expand_failures = 0
+    skipped = 0
+    syncer = ChannelSync(downloader, history=None if args.redownload else history) if args.sync else None
+    plans = []
+
+    def submit(url, priority='normal'):
+        # Tra lịch sử trước khi trích xuất để không tải lại video đã có trên đĩa
+        nonlocal skipped
+        if not args.redownload:
+            entry = history.find(url, args.download_type)
+            if entry is not None and entry.file_exists():
+                skipped += 1
+                reporter.emit('skipped', url=url, file=entry.file_path)
+                return
+        queue.submit(url, save_path, args.download_type, quality, priority=args.priority or priority, **options)
+
+    try:
+        if resumable:
+            journal.resume(queue, resumable)
+            resumed_urls = {entry.url for entry in resumable}
+            urls = [url for url in urls if url not in resumed_urls]
+        for url in urls:
+            if args.no_expand or not is_collection_url(url):
+                submit(url)
+                continue
+            # Danh sách phát: đưa từng video vào hàng đợi ngay khi được liệt kê
+            try:
+                if syncer is not None:
+                    plan = syncer.plan(url, args.download_type)
+                    plans.append(plan)
+                    reporter.emit('sync', url=url, new=len(plan.entries), known=plan.known)
+                    for entry in plan.entries:
+                        submit(entry['url'], 'low')
+                    continue
+                for entry in PlaylistExpander(downloader, resolve=False).iter_entries(url):
+                    if entry['url']:
+                        submit(entry['url'], 'low')
+            except Exception as e:
+                expand_failures += 1
+                reporter.emit('failed', url=url, error=f"Lỗi khi lấy danh sách phát: {e}")
+        queue.wait()
+    except KeyboardInterrupt:
+        # Tạm dừng thay vì hủy để journal giữ lại các công việc cho --resume
+        queue.pause_all()
+        queue.wait(timeout=30)
+        aggregator.stop()
+        reporter.emit('interrupted')
+        return EXIT_INTERRUPTED
+    finally:
+        downloader.sessions.close()
+        if args.metrics_file:
+            downloader.metrics.stop_export()
+            downloader.metrics.write(args.metrics_file)
+
+    aggregator.stop()
+    # Chỉ cập nhật mốc đồng bộ khi lượt chạy kết thúc bình thường; video lỗi sẽ được thử lại lần sau
+    failed_urls = {job.url for job in queue.jobs() if job.state in (JobState.FAILED, JobState.CANCELLED)}
+    for plan in plans:
+        syncer.commit(plan, [entry['url'] for entry in plan.entries if entry['url'] in failed_urls])
+    counts = queue.counts()
+    elapsed = time.time() - started_at
+    reporter.emit('summary', elapsed=round(elapsed, 3), skipped=skipped,
+                  throughput=int(reporter.throughput.total / elapsed) if elapsed > 0 else 0,
+                  queue_wait=queue.wait_stats(), phases=downloader.metrics.snapshot()['phases'], **counts)
+
+    failed = counts[JobState.FAILED] + counts[JobState.CANCELLED] + expand_failures
+    if failed == 0:
+        return EXIT_OK
+    if counts[JobState.DONE] == 0:
+        return EXIT_ALL_FAILED
+    return EXIT_PARTIAL_FAILURE
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Module phân tích hàng loạt URL: trích xuất thông tin nhiều video song song, giới hạn theo máy chủ
+"""
+
+import collections
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+
+from src.core.autotune import host_key
+from src.core.info_cache import normalize_video_key
+from src.core.thumbnails import thumbnail_url
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisResult:
+    """Kết quả phân tích một URL"""
+
+    __slots__ = ('url', 'info', 'error', 'elapsed')
+
+    def __init__(self, url, info=None, error=None, elapsed=0.0):
+        self.url = url
+        self.info = info  # Thông tin video từ yt-dlp (đã làm sạch), None nếu lỗi
+        self.error = error
+        self.elapsed = elapsed  # Thời gian trích xuất (giây), 0 nếu dùng chung kết quả đang chạy
+
+    @property
+    def ok(self):
+        """Trích xuất thành công"""
+        return self.error is None
+
+    def summary(self):
+        """
+        Tóm tắt dùng để hiển thị/xuất JSON
+
+        Returns:
+            dict: {'url', 'id', 'title', 'uploader', 'duration', 'thumbnail', 'error'}
+        """
+        info = self.info or {}
+        return {
+            'url': self.url,
+            'id': info.get('id'),
+            'title': info.get('title'),
+            'uploader': info.get('uploader') or info.get('channel'),
+            'duration': info.get('duration') or 0,
+            'thumbnail': thumbnail_url(info) if info else None,
+            'error': self.error,
+        }
+
+
+class ExtractionService:
+    """
+    Dịch vụ trích xuất thông tin video đồng thời cho danh sách URL lớn
+
+    Các lời gọi extract_info (chặn) chạy trên một thread pool. Mỗi máy chủ chỉ có tối đa
+    per_host lượt trích xuất cùng lúc; các máy chủ được phục vụ xoay vòng nên một danh sách
+    dài toàn YouTube không chặn các trang khác. URL trỏ tới cùng video (cùng khóa chuẩn hóa)
+    đang được trích xuất thì dùng chung kết quả thay vì gọi lại. Kết quả được trả về theo thứ
+    tự hoàn thành qua analyze(); thông tin cũng nằm sẵn trong bộ đệm của downloader để bước
+    tải xuống không phải trích xuất lại.
+    """
+
+    def __init__(self, downloader, max_workers=16, per_host=4):
+        """
+        Khởi tạo
+
+        Args:
+            downloader (YouTubeDownloader): Downloader dùng để trích xuất (có bộ đệm thông tin)
+            max_workers (int): Tổng số lượt trích xuất đồng thời
+            per_host (int): Số lượt trích xuất đồng thời tối đa cho mỗi máy chủ
+        """
+        self.downloader = downloader
+        self.max_workers = max(1, int(max_workers))
+        self.per_host = max(1, int(per_host))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._waiting = collections.OrderedDict()  # host -> deque các (khóa, url, future)
+        self._active = collections.Counter()  # host -> số lượt đang chạy
+        self._running = 0
+        self._inflight = {}  # khóa -> future chưa xong
+
+    def submit(self, url):
+        """
+        Đưa một URL vào hàng trích xuất
+
+        Returns:
+            concurrent.futures.Future: Kết quả là AnalysisResult (lỗi được ghi trong result.error)
+        """
+        key = normalize_video_key(url)
+        with self._lock:
+            future = self._inflight.get(key)
+            # Future đã bị hủy (lượt phân tích trước bị dừng) không còn cho kết quả, tạo lượt mới
+            if future is not None and not future.cancelled():
+                return future
+            future = concurrent.futures.Future()
+            self._inflight[key] = future
+            self._waiting.setdefault(host_key(url), collections.deque()).append((key, url, future))
+            tasks = self._dispatch()
+        self._start(tasks)
+        return future
+
+    def analyze(self, urls, should_stop=None):
+        """
+        Phân tích danh sách URL, trả về từng kết quả ngay khi xong
+
+        Args:
+            urls (iterable): Các URL cần phân tích (URL trùng lặp chỉ được trả về một lần)
+            should_stop (callable, optional): Trả về True để dừng; các URL chưa bắt đầu bị bỏ
+
+        Yields:
+            AnalysisResult: Kết quả theo thứ tự hoàn thành
+        """
+        done = queue.Queue()
+        pending = {}
+        for url in dict.fromkeys(urls):
+            future = self.submit(url)
+            pending.setdefault(future, []).append(url)
+        for future, future_urls in pending.items():
+            future.add_done_callback(lambda f, u=future_urls: done.put((f, u)))
+
+        remaining = sum(len(future_urls) for future_urls in pending.values())
+        while remaining:
+            if should_stop and should_stop():
+                with self._lock:
+                    for future in pending:
+                        future.cancel()
+                    self._forget_cancelled()
+                return
+            try:
+                future, future_urls = done.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            remaining -= len(future_urls)
+            if future.cancelled():
+                continue
+            result = future.result()
+            for url in future_urls:
+                if url == result.url:
+                    yield result
+                else:
+                    # URL khác của cùng video: dùng chung thông tin đã trích xuất
+                    yield AnalysisResult(url, result.info, result.error)
+
+    def stats(self):
+        """Số URL đang chạy/đang chờ, theo máy chủ"""
+        with self._lock:
+            return {
+                'running': self._running,
+                'waiting': sum(len(items) for items in self._waiting.values()),
+                'hosts': {host: self._active[host] for host in self._active if self._active[host]},
+            }
+
+    def close(self):
+        """Hủy các URL đang chờ và dừng thread pool"""
+        with self._lock:
+            for items in self._waiting.values():
+                for _, _, future in items:
+                    future.cancel()
+            self._waiting.clear()
+            self._forget_cancelled()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _dispatch(self):
+        """Chọn các URL được chạy tiếp theo, xoay vòng giữa các máy chủ (cần giữ self._lock)"""
+        tasks = []
+        progressed = True
+        while self._running < self.max_workers and progressed:
+            progressed = False
+            for host in list(self._waiting):
+                if self._running >= self.max_workers:
+                    break
+                items = self._waiting[host]
+                # Bỏ các URL đã bị hủy trước khi tới lượt
+                while items and items[0][2].cancelled():
+                    key, _, future = items.popleft()
+                    self._forget(key, future)
+                if not items:
+                    del self._waiting[host]
+                    continue
+                if self._active[host] >= self.per_host:
+                    continue
+                key, url, future = items.popleft()
+                if not future.set_running_or_notify_cancel():
+                    self._forget(key, future)
+                    continue
+                self._active[host] += 1
+                self._running += 1
+                tasks.append((host, key, url, future))
+                progressed = True
+                # Máy chủ vừa được phục vụ xuống cuối vòng
+                self._waiting.move_to_end(host)
+        return tasks
+
+    def _forget(self, key, future):
+        """Bỏ future khỏi danh sách đang trích xuất nếu khóa chưa thuộc về lượt mới hơn (cần giữ self._lock)"""
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def _forget_cancelled(self):
+        """Bỏ mọi future đã bị hủy khỏi danh sách đang trích xuất (cần giữ self._lock)"""
+        for key in [key for key, future in self._inflight.items() if future.cancelled()]:
+            del self._inflight[key]
+
+    def _start(self, tasks):
+        if not tasks:
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="extract")
+            executor = self._executor
+        for task in tasks:
+            executor.submit(self._run, *task)
+
+    def _run(self, host, key, url, future):
+        started = time.monotonic()
+        try:
+            result = AnalysisResult(url, self.downloader.extract_info(url), None, time.monotonic() - started)
+        except Exception as e:
+            logger.debug("Trích xuất %s thất bại: %s", url, e)
+            result = AnalysisResult(url, None, str(e), time.monotonic() - started)
+        with self._lock:
+            self._active[host] -= 1
+            if not self._active[host]:
+                del self._active[host]
+            self._running -= 1
+            self._forget(key, future)
+            tasks = self._dispatch()
+        future.set_result(result)
+        self._start(tasks)
@@ -0,0 +1,226 @@
+"""
+Module tự điều chỉnh số kết nối và kích thước buffer theo thông lượng đo được (AIMD)
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+
+from src.utils.helpers import get_app_data_dir
+
+logger = logging.getLogger(__name__)
+
+MIN_BUFFER_SIZE = 64 * 1024
+MAX_BUFFER_SIZE = 16 * 1024 * 1024
+# Tên miền có nhiều máy chủ con dùng chung hạ tầng (CDN đánh số như rr3---sn-abc.googlevideo.com,
+# m./music.youtube.com), được gộp về tên miền chính
+_SHARED_DOMAINS = ('googlevideo.com', 'youtube.com', 'ytimg.com', 'akamaized.net', 'cloudfront.net',
+                   'fbcdn.net', 'vimeocdn.com')
+
+
+def host_key(url):
+    """
+    Khóa máy chủ dùng để ghi nhớ cài đặt
+
+    Giữ nguyên tên máy chủ (bỏ "www."), trừ máy chủ con của các tên miền CDN đã biết (ví dụ
+    rr3---sn-abc.googlevideo.com) được gộp theo tên miền chính. Không gộp theo hai nhãn cuối vì
+    với tên miền như co.uk các trang khác nhau sẽ bị coi là một.
+
+    Args:
+        url (str): URL trang video hoặc URL file
+
+    Returns:
+        str: Tên máy chủ đã chuẩn hóa, rỗng nếu không xác định được
+    """
+    host = (urllib.parse.urlsplit(url or '').hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    for domain in _SHARED_DOMAINS:
+        if host.endswith('.' + domain):
+            return domain
+    return host
+
+
+def buffer_for_rate(rate_per_connection):
+    """Kích thước buffer (lũy thừa của 2) đủ cho khoảng 1/4 giây dữ liệu của một kết nối"""
+    target = max(MIN_BUFFER_SIZE, min(MAX_BUFFER_SIZE, int(rate_per_connection / 4)))
+    size = MIN_BUFFER_SIZE
+    while size * 2 <= target:
+        size *= 2
+    return size
+
+
+class AimdController:
+    """
+    Bộ điều khiển số kết nối của một lượt tải theo kiểu AIMD
+
+    Sau mỗi cửa sổ đo (window giây): nếu thông lượng tăng rõ rệt so với cửa sổ trước thì thêm
+    một kết nối (tăng cộng), nếu giảm mạnh (máy chủ bắt đầu giới hạn hoặc mạng nghẽn) thì giảm
+    một nửa (giảm nhân), còn lại thì giữ nguyên. Số kết nối cho thông lượng tốt nhất được ghi
+    nhớ cho máy chủ khi kết thúc.
+
+    Chỉ điều chỉnh sau khi engage() được gọi, tức là khi người tải thực sự đổi được số kết nối
+    trong lúc tải (tải theo đoạn). Với yt-dlp (HLS/DASH), số fragment đồng thời cố định từ lúc
+    bắt đầu: bộ điều khiển chỉ đo thông lượng và ghi nhớ đúng số kết nối đã dùng.
+    """
+
+    def __init__(self, tuner, host, initial, min_connections=1, max_connections=16, window=2.0):
+        self.tuner = tuner
+        self.host = host
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.window = window
+        self.target = max(min_connections, min(max_connections, int(initial)))
+        self.best_target = self.target
+        self.best_rate = 0.0
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._last_rate = None
+        self.adaptive = False
+
+    def engage(self):
+        """Người tải áp dụng target trong lúc tải: bắt đầu điều chỉnh"""
+        with self._lock:
+            self.adaptive = True
+
+    def fix(self, connections):
+        """
+        Phần còn lại của lượt tải chạy với số kết nối cố định (ví dụ chuyển sang yt-dlp):
+        ngừng điều chỉnh và chỉ đo thông lượng của số kết nối đó
+        """
+        with self._lock:
+            self.adaptive = False
+            self.target = self.best_target = max(self.min_connections, min(self.max_connections, int(connections)))
+            self.best_rate = 0.0
+            self._last_rate = None
+            self._window_start = time.monotonic()
+            self._window_bytes = 0
+
+    def observe(self, nbytes):
+        """
+        Ghi nhận số byte vừa nhận
+
+        Returns:
+            int: Số kết nối mong muốn hiện tại
+        """
+        with self._lock:
+            self._window_bytes += nbytes
+            now = time.monotonic()
+            elapsed = now - self._window_start
+            if elapsed < self.window:
+                return self.target
+            rate = self._window_bytes / elapsed
+            self._window_start = now
+            self._window_bytes = 0
+
+            if rate > self.best_rate:
+                self.best_rate = rate
+                self.best_target = self.target
+            if not self.adaptive:
+                return self.target
+            if self._last_rate is None or rate > self._last_rate * 1.05:
+                self.target = min(self.max_connections, self.target + 1)
+            elif rate < self._last_rate * 0.8:
+                self.target = max(self.min_connections, self.target // 2)
+            self._last_rate = rate
+            return self.target
+
+    def on_error(self):
+        """Lỗi kết nối/HTTP: giảm một nửa số kết nối"""
+        with self._lock:
+            if self.adaptive:
+                self.target = max(self.min_connections, self.target // 2)
+
+    def finish(self):
+        """Ghi nhớ cài đặt tốt nhất cho máy chủ"""
+        if self.best_rate > 0:
+            self.tuner.remember(self.host, self.best_target, self.best_rate)
+
+
+class AutoTuner:
+    """
+    Ghi nhớ số kết nối và kích thước buffer tốt nhất cho từng máy chủ
+
+    Dữ liệu lưu trong ~/.lappytube/autotune.json. Mỗi lượt tải bắt đầu từ cài đặt đã ghi nhớ
+    cho máy chủ (hoặc mặc định), được AimdController điều chỉnh trong lúc tải và cập nhật lại
+    khi kết thúc.
+    """
+
+    def __init__(self, path=None, min_connections=1, max_connections=16, default_connections=4, window=2.0):
+        """
+        Khởi tạo
+
+        Args:
+            path (str, optional): File lưu cài đặt, mặc định ~/.lappytube/autotune.json
+            min_connections (int): Số kết nối/fragment đồng thời nhỏ nhất
+            max_connections (int): Số kết nối/fragment đồng thời lớn nhất
+            default_connections (int): Số kết nối cho máy chủ chưa có dữ liệu
+            window (float): Độ dài mỗi cửa sổ đo thông lượng (giây)
+        """
+        self.path = path or os.path.join(get_app_data_dir(), 'autotune.json')
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.default_connections = default_connections
+        self.window = window
+        self._lock = threading.Lock()
+        self._hosts = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._hosts, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Không thể lưu cài đặt tự điều chỉnh: %s", e)
+
+    def recommend(self, host):
+        """
+        Cài đặt nên dùng khi bắt đầu tải từ một máy chủ
+
+        Returns:
+            dict: {'connections', 'buffer_size'}
+        """
+        with self._lock:
+            known = self._hosts.get(host)
+        if not known:
+            return {'connections': self.default_connections, 'buffer_size': 1024 * 1024}
+        return {'connections': known['connections'], 'buffer_size': known['buffer_size']}
+
+    def controller(self, host):
+        """Tạo bộ điều khiển AIMD cho một lượt tải, bắt đầu từ cài đặt đã ghi nhớ"""
+        return AimdController(self, host, self.recommend(host)['connections'],
+                              self.min_connections, self.max_connections, self.window)
+
+    def remember(self, host, connections, rate):
+        """
+        Ghi nhớ kết quả đo của một lượt tải
+
+        Args:
+            host (str): Máy chủ
+            connections (int): Số kết nối cho thông lượng tốt nhất
+            rate (float): Thông lượng tốt nhất đo được (byte/s)
+        """
+        if not host:
+            return
+        with self._lock:
+            self._hosts[host] = {
+                'connections': int(connections),
+                'buffer_size': buffer_for_rate(rate / max(1, connections)),
+                'rate': int(rate),
+                'updated_at': time.time(),
+            }
+            self._save()
+        logger.info("Tự điều chỉnh %s: %d kết nối, %.1f MB/s", host, connections, rate / 1024 / 1024)
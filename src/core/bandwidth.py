@@ -0,0 +1,229 @@
+"""
+Module quản lý băng thông chung cho tất cả các công việc tải xuống đang chạy
+"""
+
+import datetime
+import logging
+import re
+import threading
+import time
+
+from src.utils.helpers import parse_size
+
+logger = logging.getLogger(__name__)
+
+_RULE_RE = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(\S+)\s*$')
+
+
+def parse_bandwidth_schedule(text):
+    """
+    Phân tích lịch băng thông theo giờ trong ngày
+
+    Mỗi quy tắc có dạng "HH:MM-HH:MM=<giới hạn>", phân tách bằng dấu ";" hoặc xuống dòng,
+    ví dụ "08:00-18:00=2M; 18:00-08:00=0". Khoảng giờ có thể vắt qua nửa đêm; giới hạn 0
+    là không giới hạn.
+
+    Args:
+        text (str): Chuỗi lịch
+
+    Returns:
+        list: Danh sách (phút bắt đầu, phút kết thúc, giới hạn byte/s)
+
+    Raises:
+        ValueError: Nếu có quy tắc không hợp lệ
+    """
+    rules = []
+    for part in re.split(r'[;\n]', text or ''):
+        if not part.strip():
+            continue
+        match = _RULE_RE.match(part)
+        if not match:
+            raise ValueError(f"Quy tắc lịch băng thông không hợp lệ: {part.strip()}")
+        start_h, start_m, end_h, end_m = (int(match.group(i)) for i in range(1, 5))
+        start, end = start_h * 60 + start_m, end_h * 60 + end_m
+        # 24:00 là mốc cuối ngày, không có giờ nào sau đó
+        if start_m > 59 or end_m > 59 or start > 24 * 60 or end > 24 * 60:
+            raise ValueError(f"Giờ không hợp lệ: {part.strip()}")
+        try:
+            limit = parse_size(match.group(5))
+        except ValueError:
+            limit = -1
+        if limit < 0:
+            raise ValueError(f"Giới hạn băng thông không hợp lệ: {part.strip()}")
+        rules.append((start, end, limit))
+    return rules
+
+
+class _Slot:
+    """Trạng thái token bucket của một công việc"""
+
+    __slots__ = ('weight', 'cap', 'rate', 'tokens', 'updated_at')
+
+    def __init__(self, weight, cap):
+        self.weight = weight
+        self.cap = cap
+        self.rate = 0
+        self.tokens = 0.0
+        self.updated_at = time.monotonic()
+
+
+class BandwidthManager:
+    """
+    Chia một ngân sách băng thông tổng cho các công việc đang tải
+
+    Mỗi công việc đăng ký với một trọng số (ưu tiên) và giới hạn riêng tùy chọn. Ngân sách
+    được chia theo trọng số; phần thừa của công việc bị giới hạn riêng thấp hơn phần được
+    chia sẽ dồn cho các công việc khác. Việc chia lại diễn ra mỗi khi có công việc bắt đầu
+    hoặc kết thúc, khi đổi giới hạn, hoặc khi lịch theo giờ chuyển sang khung khác.
+
+    Giới hạn được áp dụng bằng cách cho luồng tải "ngủ" trong progress hook (throttle), nên
+    có hiệu lực với cả tải nhiều fragment song song của cùng một video.
+    """
+
+    def __init__(self, total_limit=0, schedule=None, burst=1.0):
+        """
+        Khởi tạo
+
+        Args:
+            total_limit (int): Ngân sách tổng (byte/s), 0 là không giới hạn
+            schedule (list, optional): Lịch theo giờ từ parse_bandwidth_schedule
+            burst (float): Số giây băng thông được phép dồn lại khi công việc tạm ngưng nhận dữ liệu
+        """
+        self.burst = max(0.1, float(burst))
+        self._lock = threading.Lock()
+        self._slots = {}  # key -> _Slot
+        self._total_limit = max(0, int(total_limit or 0))
+        self._schedule = list(schedule or [])
+        self._effective_limit = None
+
+    # ------------------------------------------------------------------
+    # Cấu hình
+    # ------------------------------------------------------------------
+    def set_limit(self, total_limit):
+        """Đặt ngân sách tổng mặc định (byte/s), 0 là không giới hạn"""
+        with self._lock:
+            self._total_limit = max(0, int(total_limit or 0))
+            self._rebalance()
+
+    def set_schedule(self, schedule):
+        """Đặt lịch băng thông theo giờ (danh sách từ parse_bandwidth_schedule)"""
+        with self._lock:
+            self._schedule = list(schedule or [])
+            self._rebalance()
+
+    def limit_at(self, when=None):
+        """
+        Ngân sách tổng có hiệu lực tại một thời điểm
+
+        Args:
+            when (datetime.datetime, optional): Thời điểm, mặc định là hiện tại
+
+        Returns:
+            int: Byte/s, 0 là không giới hạn
+        """
+        when = when or datetime.datetime.now()
+        minute = when.hour * 60 + when.minute
+        for start, end, limit in self._schedule:
+            if start <= end:
+                matched = start <= minute < end
+            else:
+                matched = minute >= start or minute < end
+            if matched:
+                return limit
+        return self._total_limit
+
+    # ------------------------------------------------------------------
+    # Đăng ký công việc
+    # ------------------------------------------------------------------
+    def register(self, key, weight=1.0, cap=0):
+        """
+        Đăng ký một công việc bắt đầu tải
+
+        Args:
+            key: Khóa định danh công việc
+            weight (float): Trọng số khi chia băng thông
+            cap (int): Giới hạn riêng của công việc (byte/s), 0 là không giới hạn
+        """
+        with self._lock:
+            self._slots[key] = _Slot(max(0.01, float(weight or 1.0)), max(0, int(cap or 0)))
+            self._rebalance()
+
+    def unregister(self, key):
+        """Hủy đăng ký công việc và chia lại băng thông cho các công việc còn lại"""
+        with self._lock:
+            if self._slots.pop(key, None) is not None:
+                self._rebalance()
+
+    def rate_of(self, key):
+        """Tốc độ đang được cấp cho công việc (byte/s), 0 là không giới hạn"""
+        with self._lock:
+            slot = self._slots.get(key)
+            return slot.rate if slot else 0
+
+    def allocations(self):
+        """
+        Phân bổ hiện tại
+
+        Returns:
+            dict: {key: byte/s}, 0 là không giới hạn
+        """
+        with self._lock:
+            return {key: slot.rate for key, slot in self._slots.items()}
+
+    def _rebalance(self):
+        """Chia ngân sách theo trọng số, có tính đến giới hạn riêng (water-filling)"""
+        limit = self.limit_at()
+        self._effective_limit = limit
+        if not limit:
+            for slot in self._slots.values():
+                slot.rate = slot.cap
+            return
+
+        remaining = float(limit)
+        pending = list(self._slots.values())
+        while pending:
+            total_weight = sum(slot.weight for slot in pending)
+            capped = [slot for slot in pending
+                      if slot.cap and slot.cap <= remaining * slot.weight / total_weight]
+            if not capped:
+                for slot in pending:
+                    slot.rate = max(1, int(remaining * slot.weight / total_weight))
+                break
+            for slot in capped:
+                slot.rate = slot.cap
+                remaining -= slot.cap
+                pending.remove(slot)
+
+    # ------------------------------------------------------------------
+    # Điều tiết
+    # ------------------------------------------------------------------
+    def throttle(self, key, nbytes):
+        """
+        Ghi nhận nbytes vừa nhận được và ngủ nếu công việc vượt phần băng thông được cấp
+
+        Được gọi từ progress hook trên luồng tải xuống.
+
+        Args:
+            key: Khóa công việc đã đăng ký
+            nbytes (int): Số byte nhận thêm kể từ lần gọi trước
+
+        Returns:
+            float: Thời gian đã ngủ (giây)
+        """
+        if nbytes <= 0:
+            return 0.0
+        with self._lock:
+            if self._schedule and self.limit_at() != self._effective_limit:
+                logger.info("Lịch băng thông chuyển sang giới hạn %s byte/s", self.limit_at())
+                self._rebalance()
+            slot = self._slots.get(key)
+            if slot is None or not slot.rate:
+                return 0.0
+            now = time.monotonic()
+            slot.tokens = min(slot.rate * self.burst, slot.tokens + (now - slot.updated_at) * slot.rate)
+            slot.updated_at = now
+            slot.tokens -= nbytes
+            delay = -slot.tokens / slot.rate if slot.tokens < 0 else 0
+        if delay > 0:
+            time.sleep(delay)
+        return delay
@@ -2,109 +2,276 @@
 Module quản lý cấu hình ứng dụng
 """
 
-import os
+import atexit
+import copy
 import json
+import logging
+import os
+import threading
 import time
 
+from src.utils.helpers import get_app_data_dir
+
+logger = logging.getLogger(__name__)
+
+# Lược đồ cấu hình: khóa -> (kiểu, giá trị mặc định). Giá trị đọc từ file hoặc truyền vào
+# set() được ép về đúng kiểu; khóa không có trong lược đồ vẫn được giữ nguyên.
+SCHEMA = {
+    'save_directory': (str, os.path.join(os.path.expanduser('~'), 'Downloads')),
+    'default_format': (str, 'mp4'),
+    'default_quality': (str, 'highest'),
+    'max_parallel_downloads': (int, 3),
+    'recent_downloads': (list, []),
+    'theme': (str, 'light'),
+    'concurrent_downloads': (int, 8),
+    'buffer_size': (int, 16),  # MB
+    'retry_count': (int, 10),
+    'auto_tune': (bool, True),
+    'stream_audio': (bool, True),
+    'media_cache_size': (int, 0),  # GB, 0 là tắt bộ đệm media
+    'media_cache_dir': (str, ''),  # Rỗng là ~/.lappytube/media
+    'total_bandwidth_limit': (float, 0.0),  # MB/s, 0 là không giới hạn
+    'bandwidth_schedule': (str, ''),
+    'skip_downloaded': (bool, True),
+    'show_notification': (bool, True),
+    'open_folder_after_download': (bool, False),
+    'save_last_path': (bool, True),
+    'last_save_path': (str, ''),
+    'auto_detect_ffmpeg': (bool, True),
+    'ffmpeg_path': (str, ''),
+    'speed_update_interval': (int, 1),
+}
+
+# Số mục tối đa trong danh sách tải xuống gần đây
+MAX_RECENT_DOWNLOADS = 10
+
+
+def _coerce(key, value):
+    """Ép giá trị về kiểu trong lược đồ, trả về giá trị mặc định nếu không ép được"""
+    if key not in SCHEMA:
+        return value
+    value_type, default = SCHEMA[key]
+    if isinstance(value, value_type) and not (value_type is int and isinstance(value, bool)):
+        return value
+    try:
+        if value_type is bool:
+            if isinstance(value, str):
+                return value.strip().lower() in ('1', 'true', 'yes', 'on')
+            return bool(value)
+        if value_type is list:
+            return list(value)
+        return value_type(value)
+    except (TypeError, ValueError):
+        logger.warning("Giá trị cấu hình không hợp lệ cho %s: %r, dùng mặc định", key, value)
+        return copy.deepcopy(default)
+
+
 class Config:
-    """Lớp quản lý cấu hình ứng dụng"""
-    
-    def __init__(self, config_file=None):
+    """
+    Lớp quản lý cấu hình ứng dụng
+
+    Giá trị được đọc/ghi trong bộ nhớ; các thay đổi được gom lại và ghi xuống đĩa tối đa
+    một lần mỗi flush_delay giây trên một luồng hẹn giờ. File được ghi nguyên tử (ghi file
+    tạm rồi đổi tên) nên không bị hỏng khi nhiều công việc cùng cập nhật hoặc ứng dụng tắt
+    giữa chừng. Các listener nhận (key, value) mỗi khi một giá trị thay đổi.
+    """
+
+    def __init__(self, config_file=None, flush_delay=1.0):
         """
         Khởi tạo đối tượng Config
-        
+
         Args:
-            config_file (str, optional): Đường dẫn đến file cấu hình
+            config_file (str, optional): Đường dẫn đến file cấu hình, mặc định ~/.lappytube/config.json
+            flush_delay (float): Thời gian gom thay đổi trước khi ghi xuống đĩa (giây)
         """
         if config_file is None:
             # Sử dụng thư mục mặc định cho cấu hình
-            app_data_dir = os.path.join(os.path.expanduser('~'), '.lappytube')
-            if not os.path.exists(app_data_dir):
-                os.makedirs(app_data_dir)
-            self.config_file = os.path.join(app_data_dir, 'config.json')
+            self.config_file = os.path.join(get_app_data_dir(), 'config.json')
         else:
             self.config_file = config_file
-        
+        self.flush_delay = flush_delay
+
         # Cấu hình mặc định
-        self.default_config = {
-            'save_directory': os.path.join(os.path.expanduser('~'), 'Downloads'),
-            'default_format': 'mp4',
-            'default_quality': 'highest',
-            'recent_downloads': [],
-            'theme': 'light'
-        }
-        
+        self.default_config = {key: copy.deepcopy(default) for key, (_, default) in SCHEMA.items()}
+
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._dirty = False
+        self._timer = None
+
         # Tải cấu hình
         self.config = self.load_config()
-    
+        atexit.register(self.flush)
+
+    # ------------------------------------------------------------------
+    # Đọc
+    # ------------------------------------------------------------------
     def load_config(self):
         """
-        Tải cấu hình từ file
-        
+        Tải cấu hình từ file, bổ sung giá trị mặc định cho các khóa còn thiếu
+
         Returns:
             dict: Cấu hình đã tải
         """
+        config = copy.deepcopy(self.default_config)
         if os.path.exists(self.config_file):
             try:
                 with open(self.config_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
+                    stored = json.load(f)
+                if isinstance(stored, dict):
+                    for key, value in stored.items():
+                        config[key] = _coerce(key, value)
+            except (json.JSONDecodeError, IOError) as e:
                 # Nếu có lỗi, sử dụng cấu hình mặc định
-                return self.default_config.copy()
-        else:
-            # Nếu file không tồn tại, sử dụng cấu hình mặc định
-            return self.default_config.copy()
-    
-    def save_config(self):
-        """Lưu cấu hình hiện tại vào file"""
-        try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=4)
-            return True
-        except IOError:
-            return False
-    
+                logger.warning("Không thể đọc file cấu hình %s: %s", self.config_file, e)
+        return config
+
     def get(self, key, default=None):
         """
         Lấy giá trị cấu hình
-        
+
         Args:
             key (str): Khóa cấu hình
             default: Giá trị mặc định nếu khóa không tồn tại
-            
+
         Returns:
-            Giá trị cấu hình
+            Giá trị cấu hình (bản sao đối với list/dict)
         """
-        return self.config.get(key, default)
-    
+        with self._lock:
+            if key not in self.config:
+                return default
+            return copy.deepcopy(self.config[key])
+
+    # ------------------------------------------------------------------
+    # Ghi
+    # ------------------------------------------------------------------
     def set(self, key, value):
         """
-        Đặt giá trị cấu hình
-        
+        Đặt giá trị cấu hình (ghi xuống đĩa sau flush_delay giây)
+
         Args:
             key (str): Khóa cấu hình
             value: Giá trị cấu hình
-            
+
         Returns:
-            bool: True nếu lưu thành công, False nếu có lỗi
+            bool: True nếu giá trị được chấp nhận
         """
-        self.config[key] = value
-        return self.save_config()
-    
+        return self.update({key: value})
+
+    def update(self, values):
+        """
+        Đặt nhiều giá trị cùng lúc, chỉ lên lịch ghi một lần
+
+        Args:
+            values (dict): {khóa: giá trị}
+
+        Returns:
+            bool: True nếu các giá trị được chấp nhận
+        """
+        changed = []
+        with self._lock:
+            for key, value in values.items():
+                value = _coerce(key, value)
+                if self.config.get(key) != value:
+                    self.config[key] = copy.deepcopy(value)
+                    changed.append((key, value))
+            if changed:
+                self._schedule_flush()
+        for key, value in changed:
+            self._notify(key, value)
+        return True
+
     def add_recent_download(self, url, title):
         """
         Thêm một URL vào danh sách tải xuống gần đây
-        
+
         Args:
             url (str): URL video
             title (str): Tiêu đề video
-            
+
+        Returns:
+            bool: True nếu giá trị được chấp nhận
+        """
+        with self._lock:
+            recent = [item for item in self.config.get('recent_downloads', []) if item.get('url') != url]
+            # Thêm vào đầu danh sách và giới hạn số lượng
+            recent.insert(0, {'url': url, 'title': title, 'date': time.strftime('%Y-%m-%d %H:%M:%S')})
+            return self.set('recent_downloads', recent[:MAX_RECENT_DOWNLOADS])
+
+    def _schedule_flush(self):
+        self._dirty = True
+        if self.flush_delay <= 0:
+            self._timer = None
+            threading.Thread(target=self.flush, daemon=True).start()
+            return
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """
+        Ghi ngay các thay đổi đang chờ xuống đĩa
+
         Returns:
-            bool: True nếu lưu thành công, False nếu có lỗi
+            bool: True nếu lưu thành công (hoặc không có gì để lưu), False nếu có lỗi
         """
-        recent = self.config.get('recent_downloads', [])
-        # Thêm vào đầu danh sách và giới hạn số lượng
-        recent.insert(0, {'url': url, 'title': title, 'date': time.strftime('%Y-%m-%d %H:%M:%S')})
-        recent = recent[:10]  # Giữ tối đa 10 mục
-        self.config['recent_downloads'] = recent
-        return self.save_config() 
\ No newline at end of file
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return True
+            data = json.dumps(self.config, indent=4, ensure_ascii=False)
+            tmp_path = f"{self.config_file}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.config_file) or '.', exist_ok=True)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.config_file)
+                self._dirty = False
+                return True
+            except (IOError, OSError) as e:
+                logger.error("Không thể lưu cấu hình: %s", e)
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                return False
+
+    def save_config(self):
+        """Lưu cấu hình hiện tại vào file ngay lập tức"""
+        with self._lock:
+            self._dirty = True
+        return self.flush()
+
+    def close(self):
+        """Ghi các thay đổi còn chờ và bỏ đăng ký ghi khi thoát"""
+        atexit.unregister(self.flush)
+        return self.flush()
+
+    # ------------------------------------------------------------------
+    # Listener
+    # ------------------------------------------------------------------
+    def add_listener(self, listener):
+        """Đăng ký hàm nhận (key, value) khi cấu hình thay đổi"""
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Hủy đăng ký hàm nhận thông báo"""
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _notify(self, key, value):
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(key, copy.deepcopy(value))
+            except Exception:
+                logger.exception("Lỗi trong listener của cấu hình")
@@ -0,0 +1,621 @@
+"""
+Module quản lý hàng đợi tải xuống nhiều video song song
+"""
+
+import collections
+import itertools
+import logging
+import threading
+import time
+
+from src.core.metrics import JobMetrics
+from src.core.speed import estimate_eta
+
+logger = logging.getLogger(__name__)
+
+
+class JobState:
+    """Các trạng thái của một công việc tải xuống"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    POSTPROCESSING = 'postprocessing'
+    PAUSED = 'paused'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    # Các trạng thái đã kết thúc, không còn chiếm chỗ trong hàng đợi
+    FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobPriority:
+    """Các mức ưu tiên của công việc, số nhỏ hơn được chạy trước"""
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+    ALL = (HIGH, NORMAL, LOW)
+    NAMES = {HIGH: 'high', NORMAL: 'normal', LOW: 'low'}
+
+    @classmethod
+    def parse(cls, value):
+        """Chuyển tên ('high', 'normal', 'low') hoặc số thành mức ưu tiên"""
+        if isinstance(value, str):
+            for priority, name in cls.NAMES.items():
+                if name == value.strip().lower():
+                    return priority
+            raise ValueError(f"Mức ưu tiên không hợp lệ: {value}")
+        return max(cls.HIGH, min(cls.LOW, int(value)))
+
+
+class DownloadJob:
+    """Thông tin và trạng thái của một công việc tải xuống"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, url, save_path, download_type="video", quality="highest", options=None, metadata=None,
+                 priority=JobPriority.NORMAL):
+        """
+        Khởi tạo công việc tải xuống
+
+        Args:
+            url (str): URL video
+            save_path (str): Thư mục lưu
+            download_type (str): "video" hoặc "audio"
+            quality (str): Chất lượng đã chọn
+            options (dict, optional): Các tham số bổ sung truyền cho YouTubeDownloader.download
+                (speed_limit, concurrent_downloads, buffer_size, retry_count, ffmpeg_path)
+            metadata (dict, optional): Dữ liệu kèm theo cho các thành phần khác (ví dụ journal_id)
+            priority (int): Mức ưu tiên (JobPriority)
+        """
+        self.id = next(DownloadJob._ids)
+        self.url = url
+        self.save_path = save_path
+        self.download_type = download_type
+        self.quality = quality
+        self.options = dict(options or {})
+        self.metadata = dict(metadata or {})
+        self.priority = JobPriority.parse(priority)
+
+        self.state = JobState.QUEUED
+        self.percent = 0
+        self.downloaded = 0
+        self.total = 0
+        self.speed = 0  # byte/giây
+        self.eta = None  # số giây còn lại ước lượng, None nếu chưa biết
+        self.file_path = None
+        self.error = None
+        # Chuỗi định dạng yt-dlp và các file đang tải (được báo qua event_callback)
+        self.format_str = None
+        self.output_files = []
+
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Thời điểm vào hàng đợi (dùng để nâng mức ưu tiên theo thời gian chờ; được giữ nguyên khi
+        # bị tạm dừng nhường chỗ), lúc bắt đầu lượt chờ hiện tại và tổng thời gian đã chờ (giây)
+        self.queued_at = self.created_at
+        self.waiting_since = self.created_at
+        self.wait_time = 0.0
+        self.preemptions = 0  # Số lần bị tạm dừng nhường chỗ cho công việc ưu tiên hơn
+        self.run_priority = self.priority  # Mức ưu tiên (đã tính thời gian chờ) khi được chạy
+        # Thời gian từng giai đoạn (trích xuất, tải, ghép, hậu xử lý...) và các bộ đếm
+        self.metrics = JobMetrics()
+
+        # Yêu cầu dừng từ bên ngoài: None, 'pause' hoặc 'cancel'
+        self._stop_request = None
+
+    @property
+    def is_finished(self):
+        """Công việc đã kết thúc (thành công, lỗi hoặc bị hủy)"""
+        return self.state in JobState.FINISHED
+
+    def __repr__(self):
+        return f"<DownloadJob #{self.id} {self.state} {self.url}>"
+
+
+class DownloadQueue:
+    """
+    Hàng đợi tải xuống với số luồng chạy song song có giới hạn
+
+    Mỗi công việc được chạy trên một luồng riêng thông qua YouTubeDownloader.download,
+    số luồng chạy đồng thời không vượt quá max_parallel. Mọi thay đổi trạng thái và tiến
+    trình được báo cho các listener dưới dạng listener(job); listener được gọi từ luồng tải
+    xuống nên phía giao diện phải tự chuyển về luồng chính (ví dụ qua pyqtSignal).
+
+    Khi pipeline_postprocess bật, bước chuyển sang mp4/mp3 được đưa vào pool hậu xử lý của
+    downloader (trạng thái POSTPROCESSING) và chỗ tải xuống được giải phóng ngay cho công việc
+    kế tiếp.
+
+    Công việc chờ theo từng mức ưu tiên (mỗi mức một hàng FIFO). Mỗi aging_interval giây chờ
+    nâng mức ưu tiên hiệu lực lên một bậc nên công việc mức thấp không bị bỏ đói. Khi hết chỗ
+    và có công việc chờ ưu tiên hơn một công việc đang chạy, công việc đang chạy kém ưu tiên
+    nhất bị tạm dừng và đưa lại đầu hàng của mức mình; lần chạy sau tải tiếp từ file .part.
+    """
+
+    def __init__(self, downloader, max_parallel=3, listener=None, pipeline_postprocess=True,
+                 aging_interval=120.0, preempt=True):
+        """
+        Khởi tạo hàng đợi
+
+        Args:
+            downloader (YouTubeDownloader): Đối tượng thực hiện tải xuống
+            max_parallel (int): Số công việc chạy đồng thời tối đa
+            listener (callable, optional): Hàm nhận thông báo cập nhật công việc
+            pipeline_postprocess (bool): Hậu xử lý trên pool riêng thay vì trên luồng tải xuống
+            aging_interval (float): Số giây chờ để mức ưu tiên hiệu lực tăng một bậc
+            preempt (bool): Cho phép tạm dừng công việc kém ưu tiên để chạy công việc ưu tiên hơn
+        """
+        self.downloader = downloader
+        self.max_parallel = max(1, int(max_parallel))
+        self.pipeline_postprocess = pipeline_postprocess
+        self.aging_interval = max(1.0, float(aging_interval))
+        self.preempt = preempt
+        self._listeners = [listener] if listener else []
+
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._jobs = collections.OrderedDict()  # id -> DownloadJob
+        self._pending = {priority: collections.deque() for priority in JobPriority.ALL}
+        self._running = {}  # id -> threading.Thread
+        self._postprocessing = set()  # id các công việc đang chờ/đang hậu xử lý
+        # Thời gian chờ (giây) của các công việc vừa được chạy, theo mức ưu tiên
+        self._wait_samples = {priority: collections.deque(maxlen=500) for priority in JobPriority.ALL}
+
+    # ------------------------------------------------------------------
+    # Listener
+    # ------------------------------------------------------------------
+    def add_listener(self, listener):
+        """Đăng ký hàm nhận thông báo cập nhật công việc"""
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Hủy đăng ký hàm nhận thông báo"""
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _notify(self, job):
+        for listener in list(self._listeners):
+            try:
+                listener(job)
+            except Exception:
+                logger.exception("Lỗi trong listener của hàng đợi")
+
+    # ------------------------------------------------------------------
+    # Thêm công việc
+    # ------------------------------------------------------------------
+    def submit(self, url, save_path, download_type="video", quality="highest", metadata=None,
+               priority=JobPriority.NORMAL, **options):
+        """
+        Thêm một URL vào hàng đợi
+
+        Args:
+            url (str): URL video
+            save_path (str): Thư mục lưu
+            download_type (str): "video" hoặc "audio"
+            quality (str): Chất lượng đã chọn
+            metadata (dict, optional): Dữ liệu kèm theo công việc
+            priority (int|str): Mức ưu tiên (JobPriority hoặc 'high'/'normal'/'low')
+            **options: Các tham số bổ sung cho YouTubeDownloader.download
+
+        Returns:
+            DownloadJob: Công việc vừa được tạo
+        """
+        job = DownloadJob(url, save_path, download_type, quality, options, metadata, priority)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._enqueue(job)
+        self._notify(job)
+        self._schedule()
+        return job
+
+    def submit_many(self, urls, save_path, download_type="video", quality="highest", priority=JobPriority.NORMAL,
+                    **options):
+        """
+        Thêm nhiều URL vào hàng đợi cùng lúc
+
+        Returns:
+            list: Danh sách DownloadJob theo thứ tự URL
+        """
+        return [self.submit(url, save_path, download_type, quality, priority=priority, **options) for url in urls]
+
+    # ------------------------------------------------------------------
+    # Truy vấn
+    # ------------------------------------------------------------------
+    def get(self, job_id):
+        """Lấy công việc theo id, trả về None nếu không có"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        """Danh sách tất cả công việc theo thứ tự thêm vào"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def counts(self):
+        """
+        Đếm số công việc theo trạng thái
+
+        Returns:
+            dict: {trạng thái: số lượng}
+        """
+        result = {state: 0 for state in (JobState.QUEUED, JobState.RUNNING, JobState.POSTPROCESSING,
+                                         JobState.PAUSED, JobState.DONE, JobState.FAILED,
+                                         JobState.CANCELLED)}
+        with self._lock:
+            for job in self._jobs.values():
+                result[job.state] += 1
+        return result
+
+    def is_idle(self):
+        """Không còn công việc nào đang chạy hoặc đang chờ"""
+        with self._lock:
+            return not self._running and not self._postprocessing and not self._has_pending()
+
+    def wait_stats(self):
+        """
+        Thống kê thời gian chờ trong hàng đợi theo mức ưu tiên
+
+        Returns:
+            dict: {tên mức: {'waiting', 'oldest_wait', 'started', 'avg_wait', 'p95_wait', 'max_wait'}},
+                thời gian tính bằng giây; các giá trị *_wait tính trên các công việc vừa được chạy
+        """
+        now = time.time()
+        result = {}
+        with self._lock:
+            for priority in JobPriority.ALL:
+                waiting = [job for job in self._jobs.values()
+                           if job.state == JobState.QUEUED and job.priority == priority]
+                samples = sorted(self._wait_samples[priority])
+                result[JobPriority.NAMES[priority]] = {
+                    'waiting': len(waiting),
+                    'oldest_wait': round(max((now - job.waiting_since for job in waiting), default=0.0), 3),
+                    'started': len(samples),
+                    'avg_wait': round(sum(samples) / len(samples), 3) if samples else 0.0,
+                    'p95_wait': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3) if samples else 0.0,
+                    'max_wait': round(samples[-1], 3) if samples else 0.0,
+                }
+        return result
+
+    def wait(self, timeout=None):
+        """
+        Chờ cho đến khi hàng đợi rảnh
+
+        Args:
+            timeout (float, optional): Thời gian chờ tối đa tính bằng giây
+
+        Returns:
+            bool: True nếu hàng đợi đã rảnh, False nếu hết thời gian chờ
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while not self.is_idle():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def clear_finished(self):
+        """Xóa các công việc đã kết thúc khỏi danh sách"""
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.is_finished]:
+                del self._jobs[job_id]
+
+    # ------------------------------------------------------------------
+    # Điều khiển
+    # ------------------------------------------------------------------
+    def set_max_parallel(self, max_parallel):
+        """Thay đổi số công việc chạy đồng thời tối đa"""
+        with self._lock:
+            self.max_parallel = max(1, int(max_parallel))
+        self._schedule()
+
+    def pause(self, job_id):
+        """
+        Tạm dừng công việc; công việc đang chạy sẽ dừng ở lần cập nhật tiến trình kế tiếp
+
+        Returns:
+            bool: True nếu yêu cầu được chấp nhận
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            if job.state == JobState.RUNNING:
+                job._stop_request = 'pause'
+                return True
+            if job.state != JobState.QUEUED:
+                return False
+            job.state = JobState.PAUSED
+        self._notify(job)
+        return True
+
+    def resume(self, job_id):
+        """
+        Đưa công việc đã tạm dừng hoặc bị lỗi trở lại hàng đợi
+
+        Returns:
+            bool: True nếu công việc được đưa lại vào hàng đợi
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state not in (JobState.PAUSED, JobState.FAILED):
+                return False
+            job.state = JobState.QUEUED
+            job.error = None
+            job._stop_request = None
+            # Công việc tạm dừng lúc đang chờ có thể còn nằm trong hàng cũ: bỏ đi để không bị đếm hai lần
+            for pending in self._pending.values():
+                try:
+                    pending.remove(job)
+                except ValueError:
+                    pass
+            self._enqueue(job)
+        self._notify(job)
+        self._schedule()
+        return True
+
+    def set_priority(self, job_id, priority):
+        """
+        Đổi mức ưu tiên của công việc (công việc đang chờ được chuyển sang hàng của mức mới)
+
+        Returns:
+            bool: True nếu công việc tồn tại và chưa kết thúc
+        """
+        priority = JobPriority.parse(priority)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.is_finished:
+                return False
+            if job.priority == priority:
+                return True
+            if job.state == JobState.QUEUED:
+                try:
+                    self._pending[job.priority].remove(job)
+                except ValueError:
+                    pass
+                job.priority = priority
+                # Vẫn giữ thời điểm vào hàng để không mất phần thời gian đã chờ: chèn theo queued_at
+                pending = self._pending[priority]
+                index = len(pending)
+                while index > 0 and pending[index - 1].queued_at > job.queued_at:
+                    index -= 1
+                pending.insert(index, job)
+            else:
+                job.priority = priority
+        self._notify(job)
+        self._schedule()
+        return True
+
+    def cancel(self, job_id):
+        """
+        Hủy công việc
+
+        Returns:
+            bool: True nếu yêu cầu được chấp nhận
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.is_finished:
+                return False
+            if job.state in (JobState.RUNNING, JobState.POSTPROCESSING):
+                job._stop_request = 'cancel'
+                return True
+            job.state = JobState.CANCELLED
+            job.finished_at = time.time()
+            self._changed.notify_all()
+        self._notify(job)
+        return True
+
+    def cancel_all(self):
+        """Hủy tất cả công việc chưa kết thúc"""
+        for job in self.jobs():
+            self.cancel(job.id)
+
+    def pause_all(self):
+        """
+        Tạm dừng tất cả công việc đang chạy và đang chờ (khi tắt ứng dụng)
+
+        Khác với cancel_all, công việc tạm dừng vẫn được journal giữ lại để lần sau tải tiếp.
+        Công việc đang hậu xử lý không tạm dừng được và vẫn chạy cho tới khi xong.
+        """
+        for job in self.jobs():
+            self.pause(job.id)
+
+    # ------------------------------------------------------------------
+    # Thực thi
+    # ------------------------------------------------------------------
+    def _enqueue(self, job, front=False, keep_age=False):
+        """
+        Đưa công việc vào hàng của mức ưu tiên (cần giữ self._lock)
+
+        Args:
+            front (bool): Đưa lên đầu hàng
+            keep_age (bool): Giữ queued_at cũ để không mất phần ưu tiên đã tích lũy do chờ
+        """
+        job.waiting_since = time.time()
+        if not keep_age:
+            job.queued_at = job.waiting_since
+        if front:
+            self._pending[job.priority].appendleft(job)
+        else:
+            self._pending[job.priority].append(job)
+
+    def _head(self, priority):
+        """Công việc đang chờ lâu nhất của một mức, bỏ các mục đã chạy/hủy/đổi mức (cần giữ self._lock)"""
+        pending = self._pending[priority]
+        while pending and (pending[0].state != JobState.QUEUED or pending[0].priority != priority):
+            pending.popleft()
+        return pending[0] if pending else None
+
+    def _has_pending(self):
+        return any(self._head(priority) is not None for priority in JobPriority.ALL)
+
+    def _effective_priority(self, job, now):
+        """Mức ưu tiên sau khi tính thời gian chờ: mỗi aging_interval giây nâng một bậc"""
+        return max(JobPriority.HIGH, job.priority - int((now - job.queued_at) // self.aging_interval))
+
+    def _next_job(self, now):
+        """
+        Công việc nên chạy tiếp theo (cần giữ self._lock)
+
+        So sánh đầu hàng của các mức theo mức ưu tiên hiệu lực, cùng mức thì công việc vào hàng
+        trước được chạy trước.
+        """
+        heads = [job for job in (self._head(priority) for priority in JobPriority.ALL) if job is not None]
+        return min(heads, key=lambda job: (self._effective_priority(job, now), job.queued_at), default=None)
+
+    def _preempt(self):
+        """
+        Tạm dừng các công việc đang chạy kém ưu tiên hơn công việc đang chờ (cần giữ self._lock)
+
+        Công việc đang chạy chỉ bị thay thế bởi công việc có mức ưu tiên gốc cao hơn mức mà nó
+        được chạy (kể cả phần nâng do thời gian chờ), nên công việc đã chờ lâu không bị đẩy ra
+        ngay sau khi bắt đầu.
+        """
+        running = [self._jobs[job_id] for job_id in self._running if job_id in self._jobs]
+        victims = sorted((job for job in running if job._stop_request is None),
+                         key=lambda job: (job.run_priority, job.started_at or 0), reverse=True)
+        # Chỗ sắp được giải phóng bởi các công việc đã được yêu cầu nhường
+        freeing = sum(1 for job in running if job._stop_request == 'preempt')
+        for priority in JobPriority.ALL:
+            for job in self._pending[priority]:
+                if job.state != JobState.QUEUED or job.priority != priority:
+                    continue
+                if freeing:
+                    freeing -= 1
+                    continue
+                if not victims or victims[0].run_priority <= priority:
+                    return
+                victim = victims.pop(0)
+                victim._stop_request = 'preempt'
+                logger.info("Tạm dừng công việc #%d để chạy công việc ưu tiên hơn #%d", victim.id, job.id)
+
+    def _schedule(self):
+        """Khởi chạy các công việc đang chờ cho đến khi đủ số luồng cho phép"""
+        started = []
+        with self._lock:
+            now = time.time()
+            while len(self._running) < self.max_parallel:
+                job = self._next_job(now)
+                if job is None:
+                    break
+                self._pending[job.priority].popleft()
+                job.state = JobState.RUNNING
+                job.started_at = now
+                job.run_priority = self._effective_priority(job, now)
+                waited = now - job.waiting_since
+                job.wait_time += waited
+                self._wait_samples[job.priority].append(waited)
+                thread = threading.Thread(target=self._run, args=(job,),
+                                          name=f"download-job-{job.id}", daemon=True)
+                self._running[job.id] = thread
+                started.append((job, thread))
+            if self.preempt and len(self._running) >= self.max_parallel:
+                self._preempt()
+            if not self._running and not self._has_pending():
+                self._changed.notify_all()
+        for job, thread in started:
+            self._notify(job)
+            thread.start()
+
+    def _run(self, job):
+        def progress_callback(percent, downloaded, total, speed):
+            # Trả về False để yêu cầu downloader dừng lại
+            if job._stop_request:
+                return False
+            job.percent = percent
+            if downloaded or total:
+                job.downloaded = downloaded
+                job.total = total
+            job.speed = speed
+            job.eta = estimate_eta(job.total - job.downloaded, speed) if job.total else None
+            self._notify(job)
+            return True
+
+        def event_callback(event, data):
+            if event == 'info':
+                job.metadata.update({
+                    'video_id': data['id'],
+                    'extractor': data['extractor'],
+                    'title': data['title'] or job.metadata.get('title'),
+                    'uploader': data['uploader'],
+                })
+            elif event == 'format':
+                job.format_str = data['format']
+            elif event == 'file':
+                job.output_files.append(data['filename'])
+            else:
+                return
+            self._notify(job)
+
+        try:
+            job.file_path = self.downloader.download(
+                job.url,
+                job.save_path,
+                job.download_type,
+                job.quality,
+                progress_callback,
+                event_callback=event_callback,
+                defer_postprocess=self.pipeline_postprocess,
+                metrics=job.metrics,
+                **job.options
+            )
+            state = JobState.POSTPROCESSING if self.pipeline_postprocess else JobState.DONE
+            error = None
+        except Exception as e:
+            state, error = JobState.FAILED, str(e)
+
+        self._finish(job, state, error)
+        if state == JobState.POSTPROCESSING and job.state == JobState.POSTPROCESSING:
+            future = self.downloader.submit_postprocess(
+                job.file_path, job.download_type, job.quality, job.options.get('ffmpeg_path'),
+                should_stop=lambda: job._stop_request == 'cancel',
+                metrics=job.metrics
+            )
+            future.add_done_callback(lambda f: self._postprocess_done(job, f))
+        self._schedule()
+
+    def _postprocess_done(self, job, future):
+        try:
+            job.file_path = future.result()
+            state, error = JobState.DONE, None
+        except Exception as e:
+            state, error = JobState.FAILED, str(e)
+        self._finish(job, state, error)
+        self._schedule()
+
+    def _finish(self, job, state, error):
+        """Ghi nhận kết quả của một bước (tải xuống hoặc hậu xử lý) và báo cho listener"""
+        with self._lock:
+            request = job._stop_request
+            job._stop_request = None
+            if request == 'pause':
+                state, error = JobState.PAUSED, None
+            elif request == 'cancel':
+                state, error = JobState.CANCELLED, None
+            elif request == 'preempt' and state == JobState.FAILED:
+                # Nhường chỗ: chờ lại ở đầu hàng của mức mình, lần sau tải tiếp từ file .part
+                state, error = JobState.QUEUED, None
+                job.preemptions += 1
+                self._enqueue(job, front=True, keep_age=True)
+            job.state = state
+            job.error = error
+            job.speed = 0
+            job.eta = None
+            if state in (JobState.DONE, JobState.POSTPROCESSING):
+                job.percent = 100
+            if state in JobState.FINISHED:
+                job.finished_at = time.time()
+            self._running.pop(job.id, None)
+            if state == JobState.POSTPROCESSING:
+                self._postprocessing.add(job.id)
+            else:
+                self._postprocessing.discard(job.id)
+            self._changed.notify_all()
+
+        self._notify(job)
@@ -1,330 +1,618 @@
 import os
-import yt_dlp
-import sys
-import subprocess
+import copy
+import logging
+
+from src.core.info_cache import InfoCache
+from src.core.formats import FormatRequest, parse_formats, select_formats, build_quality_options
+from src.core.postprocess import PostProcessor, find_ffmpeg
+from src.core.bandwidth import BandwidthManager
+from src.core.ytdlp_loader import load_yt_dlp
+from src.core.sessions import YoutubeDLPool
+from src.core.autotune import AutoTuner, host_key
+from src.core.segmented import SegmentedDownloader, SegmentedDownloadError, RangeNotSupported, is_segmentable
+from src.core.streaming import StreamingAudioExtractor, StreamingError, is_streamable
+from src.core.media_cache import is_elementary
+from src.core.metrics import JobMetrics, MetricsRegistry
+from src.core.speed import SpeedEstimator
+from src.core.thumbnails import thumbnail_url
+
+logger = logging.getLogger(__name__)
+# Thông báo của yt-dlp được chuyển vào logging thay vì in ra stdout
+ytdlp_logger = logging.getLogger(__name__ + '.yt_dlp')
+
+
+class _RetryCountingLogger:
+    """Logger cho yt-dlp: chuyển tiếp vào ytdlp_logger và đếm các lần yt-dlp thử lại"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def _count(self, msg):
+        if 'Retrying' in msg:
+            self.metrics.count('retries')
+
+    def debug(self, msg):
+        self._count(msg)
+        ytdlp_logger.debug(msg)
+
+    def info(self, msg):
+        ytdlp_logger.info(msg)
+
+    def warning(self, msg):
+        self._count(msg)
+        ytdlp_logger.warning(msg)
+
+    def error(self, msg):
+        ytdlp_logger.error(msg)
+
 
 class YouTubeDownloader:
     """Lớp xử lý tải xuống video từ YouTube"""
     
-    def get_video_info(self, url):
+    def __init__(self, info_cache=None, postprocessor=None, bandwidth=None, sessions=None, segmented=None,
+                 autotuner=None, streaming=None, media_cache=None, metrics=None):
+        """
+        Khởi tạo downloader
+        
+        Args:
+            info_cache (InfoCache, optional): Bộ đệm thông tin video dùng chung
+            postprocessor (PostProcessor, optional): Pool hậu xử lý ffmpeg dùng chung
+            bandwidth (BandwidthManager, optional): Bộ chia băng thông chung cho mọi lượt tải
+            sessions (YoutubeDLPool, optional): Kho phiên YoutubeDL dùng lại giữa các lần gọi
+            segmented (SegmentedDownloader, optional): Bộ tải nhiều kết nối cho định dạng một file
+            autotuner (AutoTuner, optional): Nơi ghi nhớ số kết nối/buffer tốt nhất theo máy chủ
+            streaming (StreamingAudioExtractor, optional): Bộ tách audio trực tiếp trong lúc tải
+            media_cache (MediaCache, optional): Bộ đệm các luồng đã tải để dùng lại, None để tắt
+            metrics (MetricsRegistry, optional): Nơi gom thời gian từng giai đoạn của mọi lượt tải
+        """
+        self.info_cache = info_cache if info_cache is not None else InfoCache()
+        self.postprocessor = postprocessor if postprocessor is not None else PostProcessor()
+        self.bandwidth = bandwidth if bandwidth is not None else BandwidthManager()
+        self.sessions = sessions if sessions is not None else YoutubeDLPool()
+        self.segmented = segmented if segmented is not None else SegmentedDownloader()
+        self.autotuner = autotuner if autotuner is not None else AutoTuner()
+        self.streaming = streaming if streaming is not None else StreamingAudioExtractor()
+        self.media_cache = media_cache
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+    
+    def extract_info(self, url):
+        """
+        Lấy thông tin đầy đủ (chưa chọn định dạng) của video, có sử dụng bộ đệm
+        
+        Args:
+            url (str): URL của video
+            
+        Returns:
+            dict: Thông tin video từ yt-dlp đã được làm sạch
+        """
+        return self._extract_info(url)[0]
+    
+    def _extract_info(self, url):
+        """Trả về (info, from_cache)"""
+        info = self.info_cache.get(url)
+        if info is not None:
+            return info, True
+        
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'logger': ytdlp_logger,
+            'skip_download': True,
+            'format': 'best',
+        }
+        
+        with self.sessions.session(ydl_opts) as ydl:
+            info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+        
+        self.info_cache.put(url, info)
+        return info, False
+    
+    def get_video_info(self, url, metrics=None):
         """
         Lấy thông tin video từ URL
         
         Args:
             url (str): URL của video YouTube
+            metrics (JobMetrics, optional): Nơi ghi thời gian các giai đoạn 'extract', 'parse_formats'
             
         Returns:
-            dict: Thông tin video bao gồm tiêu đề, tác giả, thời lượng và danh sách chất lượng
+            dict: Thông tin video bao gồm tiêu đề, tác giả, thời lượng, URL ảnh thu nhỏ, danh sách
+                định dạng (MediaFormat) và các lựa chọn chất lượng (QualityOption)
         """
+        metrics = (metrics if metrics is not None else JobMetrics()).bind(self.metrics)
         try:
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'skip_download': True,
-                'format': 'best',
-                'listformats': True,
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-            
-            # Lấy danh sách chất lượng có sẵn
-            qualities = []
-            audio_qualities = []
+            with metrics.span('extract'):
+                info, from_cache = self._extract_info(url)
+            if from_cache:
+                metrics.count('info_cache_hits')
             
-            # Danh sách các độ phân giải phổ biến để kiểm tra
-            common_resolutions = [144, 240, 360, 480, 720, 1080, 1440, 2160, 4320]
-            available_resolutions = set()
+            # Giữ định dạng ở dạng có cấu trúc, giao diện chỉ hiển thị nhãn của từng lựa chọn
+            with metrics.span('parse_formats'):
+                formats = parse_formats(info)
+                options = build_quality_options(formats, info.get('duration'))
             
-            # In ra tất cả các định dạng để kiểm tra
-            print("Tất cả các định dạng có sẵn:")
-            for format in info.get('formats', []):
-                format_id = format.get('format_id', '')
-                ext = format.get('ext', '')
-                vcodec = format.get('vcodec', 'none')
-                acodec = format.get('acodec', 'none')
-                height = format.get('height')
-                
-                print(f"ID: {format_id}, Ext: {ext}, Height: {height}, VCodec: {vcodec}, ACodec: {acodec}")
-                
-                # Kiểm tra nếu là video (có thể chỉ có video hoặc video+audio)
-                if vcodec != 'none' and vcodec != 'images':
-                    if height:
-                        available_resolutions.add(height)
-                        if acodec != 'none':
-                            qualities.append(f"{height}p ({ext})")
-                        else:
-                            qualities.append(f"{height}p (video only, {ext})")
-                # Kiểm tra nếu chỉ là audio
-                elif acodec != 'none' and (vcodec == 'none' or vcodec == 'images'):
-                    abr = format.get('abr')
-                    if abr:
-                        audio_qualities.append(f"{abr}kbps ({ext})")
-            
-            # Thêm các độ phân giải phổ biến vào danh sách nếu có sẵn
-            for res in common_resolutions:
-                if res in available_resolutions:
-                    qualities.append(f"{res}p (best)")
-            
-            # Thêm tùy chọn MP3 cho audio
-            if len(audio_qualities) > 0:
-                # Lấy bitrate cao nhất từ các định dạng audio có sẵn
-                max_bitrate = 0
-                for quality in audio_qualities:
-                    try:
-                        bitrate = float(quality.split('kbps')[0])
-                        max_bitrate = max(max_bitrate, bitrate)
-                    except:
-                        pass
-                
-                # Thêm các tùy chọn MP3 với các bitrate phổ biến
-                mp3_bitrates = [64, 128, 192, 256, 320]
-                for bitrate in mp3_bitrates:
-                    if bitrate <= max_bitrate or max_bitrate == 0:
-                        audio_qualities.append(f"{bitrate}kbps (mp3)")
-            
-            # Loại bỏ các phần tử trùng lặp
-            qualities = list(set(qualities))
-            audio_qualities = list(set(audio_qualities))
-            
-            # Sắp xếp theo độ phân giải
-            def get_resolution(quality_str):
-                try:
-                    if 'p' in quality_str:
-                        return float(quality_str.split('p')[0])
-                    return 0
-                except:
-                    return 0
-            
-            def get_bitrate(quality_str):
-                try:
-                    if 'kbps' in quality_str:
-                        return float(quality_str.split('kbps')[0])
-                    return 0
-                except:
-                    return 0
-            
-            qualities.sort(key=get_resolution)
-            audio_qualities.sort(key=get_bitrate)
-            
-            print("Danh sách chất lượng sau khi xử lý:")
-            for q in qualities:
-                print(f"- {q}")
-            for q in audio_qualities:
-                print(f"- {q}")
-            
-            # Kết hợp danh sách chất lượng, đảm bảo audio được đánh dấu rõ ràng
-            all_qualities = qualities + audio_qualities
+            logger.debug("Các định dạng có sẵn: %s", formats)
+            logger.debug("Các lựa chọn chất lượng: %s", [option.key for option in options])
+            logger.debug("Thời gian phân tích %s: %s", url, metrics.report()['phases'])
             
             return {
+                'url': url,
                 'title': info.get('title', 'Unknown'),
                 'author': info.get('uploader', 'Unknown'),
                 'length': info.get('duration', 0),
-                'qualities': all_qualities
+                'thumbnail': thumbnail_url(info),
+                'formats': formats,
+                'options': options
             }
             
         except Exception as e:
             raise Exception(f"Lỗi khi lấy thông tin video: {str(e)}")
     
     def download(self, url, save_path, download_type="video", quality="highest", progress_callback=None, 
-                 speed_limit=0, concurrent_downloads=8, buffer_size=16*1024*1024, retry_count=10, ffmpeg_path=None):
+                 speed_limit=0, concurrent_downloads=8, buffer_size=16*1024*1024, retry_count=10, ffmpeg_path=None,
+                 info=None, format_override=None, event_callback=None, defer_postprocess=False,
+                 bandwidth_weight=1.0, auto_tune=False, stream_audio=True, metrics=None):
+        """
+        Tải xuống video hoặc audio
+        
+        Args:
+            url (str): URL của video
+            save_path (str): Thư mục lưu
+            download_type (str): "video" hoặc "audio"
+            quality (str): Chất lượng đã chọn
+            progress_callback (callable, optional): Hàm nhận (percent, downloaded, total, speed),
+                trả về False để dừng tải xuống
+            speed_limit (int): Giới hạn tốc độ riêng (byte/s), 0 là không giới hạn; ngân sách
+                tổng do self.bandwidth quản lý
+            concurrent_downloads (int): Số fragment tải đồng thời (hoặc số kết nối Range với
+                định dạng một file)
+            buffer_size (int): Kích thước buffer (byte)
+            retry_count (int): Số lần thử lại
+            ffmpeg_path (str, optional): Đường dẫn ffmpeg, None để tự động phát hiện
+            info (dict, optional): Thông tin video đã lấy trước đó (từ extract_info),
+                dùng để tránh phải trích xuất lại
+            format_override (str, optional): Chuỗi định dạng yt-dlp dùng thay cho chuỗi được chọn
+                từ quality (ví dụ khi tiếp tục một công việc đã ghi trong journal)
+            event_callback (callable, optional): Hàm nhận (event, data) cho các sự kiện
+                'info' ({'id', 'extractor', 'title', 'uploader'}), 'format' ({'format'})
+                và 'file' ({'filename', 'tmpfilename'})
+            defer_postprocess (bool): Không chuyển sang mp4/mp3 mà trả về file vừa tải để
+                người gọi tự đưa vào pool hậu xử lý (xem submit_postprocess)
+            bandwidth_weight (float): Trọng số khi chia băng thông tổng với các lượt tải khác
+            auto_tune (bool): Bỏ qua concurrent_downloads/buffer_size, dùng cài đặt đã ghi nhớ cho
+                máy chủ và điều chỉnh số kết nối theo thông lượng đo được
+            stream_audio (bool): Với audio, chuyển sang mp3 ngay trong lúc tải khi định dạng cho
+                phép (không tạo file trung gian và không cần bước hậu xử lý)
+            metrics (JobMetrics, optional): Nơi ghi thời gian từng giai đoạn ('extract',
+                'select_format', 'resolve', 'cache_restore', 'stream_audio', 'segmented', 'download',
+                'merge', 'cache_store', 'postprocess') và các bộ đếm ('bytes', 'retries',
+                'throttle_seconds', ...); luôn được gom vào self.metrics
+            
+        Returns:
+            str: Đường dẫn file đã tải
+        """
+        bandwidth_key = object()
+        controller = None
+        metrics = (metrics if metrics is not None else JobMetrics()).bind(self.metrics)
         try:
-            # Xác định đường dẫn đến ffmpeg
-            if ffmpeg_path is None:
-                if getattr(sys, 'frozen', False):
-                    # Nếu ứng dụng đã được đóng gói bằng PyInstaller
-                    base_path = sys._MEIPASS
-                else:
-                    # Nếu đang chạy từ mã nguồn
-                    base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
-                
-                ffmpeg_path = os.path.join(base_path, 'assets', 'bin', 'ffmpeg.exe')
-                
-                # Kiểm tra xem ffmpeg có tồn tại không
-                ffmpeg_exists = os.path.exists(ffmpeg_path)
-                if not ffmpeg_exists:
-                    print(f"Cảnh báo: Không tìm thấy ffmpeg tại {ffmpeg_path}")
-                    # Thử tìm ffmpeg trong PATH
-                    import shutil
-                    ffmpeg_in_path = shutil.which('ffmpeg')
-                    if ffmpeg_in_path:
-                        ffmpeg_path = ffmpeg_in_path
-                        ffmpeg_exists = True
-                        print(f"Đã tìm thấy ffmpeg trong PATH: {ffmpeg_path}")
+            # Dùng thông tin đã có hoặc lấy từ bộ đệm, chỉ trích xuất qua mạng khi cần
+            if info is None:
+                with metrics.span('extract'):
+                    info, info_from_cache = self._extract_info(url)
+                if info_from_cache:
+                    metrics.count('info_cache_hits')
             else:
-                ffmpeg_exists = os.path.exists(ffmpeg_path)
+                info_from_cache = True
+            if event_callback:
+                event_callback('info', {
+                    'id': info.get('id'),
+                    'extractor': info.get('extractor_key') or info.get('extractor'),
+                    'title': info.get('title'),
+                    'uploader': info.get('uploader') or info.get('channel'),
+                })
             
-            # Thêm tùy chọn để chỉ định định dạng đầu ra là mp4
-            if download_type == "audio":
-                # Nếu chỉ tải audio, sử dụng định dạng mp3
-                ext = 'mp3'
-                format_str = 'bestaudio/best'
-                
-                # Xác định bitrate cho MP3 nếu được chỉ định
-                audio_quality = '192'  # Mặc định
-                if 'kbps' in quality and 'mp3' in quality:
-                    try:
-                        # Trích xuất bitrate từ chuỗi chất lượng (ví dụ: "192kbps (mp3)")
-                        audio_quality = quality.split('kbps')[0].strip()
-                    except:
-                        pass
-                
-                postprocessors = [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': audio_quality,
-                }]
+            # Xác định đường dẫn đến ffmpeg (assets/bin hoặc PATH)
+            ffmpeg_path = find_ffmpeg(ffmpeg_path)
+            ffmpeg_exists = ffmpeg_path is not None
+            
+            # Chọn chính xác cặp format ID từ dữ liệu có cấu trúc để yt-dlp không phải chọn lại.
+            # Khi tiếp tục từ journal thì dùng đúng chuỗi định dạng đã chọn trước đó để yt-dlp
+            # tải tiếp từ file .part
+            request = FormatRequest.from_quality(quality, download_type)
+            if format_override:
+                format_str = format_override
             else:
-                # Nếu tải video, sử dụng định dạng mp4
-                ext = 'mp4'
-                
-                if quality == "highest":
-                    if ffmpeg_exists:
-                        # Chỉ định rõ ràng muốn mp4 cho video chất lượng cao
-                        format_str = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
-                    else:
-                        # Fallback nếu không có ffmpeg, chọn định dạng muxed cao nhất
-                        ydl_opts_info = {'quiet': True, 'no_warnings': True, 'skip_download': True}
-                        with yt_dlp.YoutubeDL(ydl_opts_info) as ydl:
-                            info = ydl.extract_info(url, download=False)
-                        muxed_formats = [(f.get('height'), f.get('format_id')) for f in info.get('formats', []) 
-                                        if f.get('vcodec') != 'none' and f.get('acodec') != 'none']
-                        muxed_formats.sort(reverse=True)
-                        if muxed_formats:
-                            _, format_str = muxed_formats[0]
-                        else:
-                            raise Exception("Không tìm thấy định dạng muxed.")
+                with metrics.span('select_format'):
+                    selection = select_formats(parse_formats(info), request, can_merge=ffmpeg_exists,
+                                               duration=info.get('duration'))
+                if selection is not None:
+                    format_str = selection.format_spec
+                elif download_type == "audio":
+                    format_str = 'bestaudio/best'
+                elif info.get('formats') and not ffmpeg_exists:
+                    raise Exception("Không tìm thấy định dạng muxed.")
                 else:
-                    resolution = quality.split('p')[0] if 'p' in quality else '360'
-                    if ffmpeg_exists:
-                        # Chỉ định rõ ràng muốn mp4 cho video với độ phân giải cụ thể
-                        format_str = f'bestvideo[height<={resolution}][ext=mp4]+bestaudio[ext=m4a]/best[height<={resolution}][ext=mp4]/best'
-                    else:
-                        # Fallback nếu không có ffmpeg, chọn định dạng muxed gần nhất
-                        ydl_opts_info = {'quiet': True, 'no_warnings': True, 'skip_download': True}
-                        with yt_dlp.YoutubeDL(ydl_opts_info) as ydl:
-                            info = ydl.extract_info(url, download=False)
-                        muxed_formats = [(f.get('height'), f.get('format_id')) for f in info.get('formats', []) 
-                                        if f.get('vcodec') != 'none' and f.get('acodec') != 'none']
-                        muxed_formats.sort(reverse=True)
-                        selected_format = None
-                        for height, fmt in muxed_formats:
-                            if height <= int(resolution):
-                                selected_format = fmt
-                                break
-                        if selected_format:
-                            format_str = selected_format
-                        else:
-                            _, format_str = muxed_formats[0] if muxed_formats else '18'
+                    # Extractor không trả về danh sách định dạng: để yt-dlp tự chọn
+                    height = f'[height<={request.max_height}]' if request.max_height else ''
+                    format_str = f'bestvideo{height}[ext=mp4]+bestaudio[ext=m4a]/best{height}[ext=mp4]/best'
+            
+            if event_callback:
+                event_callback('format', {'format': format_str})
 
-                # Thêm postprocessor để chuyển đổi sang mp4 nếu cần
-                postprocessors = [{
-                    'key': 'FFmpegVideoConvertor',
-                    'preferedformat': 'mp4',
-                }]
+            # Tự điều chỉnh: bắt đầu từ cài đặt tốt nhất đã ghi nhớ cho máy chủ này
+            if auto_tune:
+                host = host_key(info.get('webpage_url') or url)
+                controller = self.autotuner.controller(host)
+                concurrent_downloads = controller.target
+                buffer_size = self.autotuner.recommend(host)['buffer_size']
 
             # Cấu hình yt-dlp
             ydl_opts = {
                 'format': format_str,
                 'outtmpl': os.path.join(save_path, '%(title)s.%(ext)s'),
-                'quiet': False,
+                'quiet': True,
                 'no_warnings': False,
-                'postprocessors': postprocessors,
+                'noprogress': True,  # Tiến trình được báo qua progress_hooks
+                'logger': _RetryCountingLogger(metrics),
                 'buffersize': buffer_size,
                 'concurrent_fragment_downloads': concurrent_downloads,
                 'retries': retry_count,
                 'fragment_retries': retry_count,
                 'file_access_retries': retry_count,
                 'extractor_retries': retry_count,
+                'continuedl': True,  # Tải tiếp từ file .part nếu có (dùng khi tiếp tục từ journal)
             }
             
-            # Thêm giới hạn tốc độ nếu được chỉ định
-            if speed_limit > 0:
-                ydl_opts['ratelimit'] = speed_limit
-
             # Nếu có ffmpeg, sử dụng nó
             if ffmpeg_exists:
                 ydl_opts['ffmpeg_location'] = ffmpeg_path
+            # Giữ lại các luồng đơn sau khi ghép để đưa vào bộ đệm media
+            if self.media_cache is not None:
+                ydl_opts['keepvideo'] = True
 
-            # Thêm callback tiến trình với thông tin chi tiết hơn
-            if progress_callback:
-                # Thêm biến để lưu trữ tổng kích thước đã biết
-                total_size = 0
-
-                def my_hook(d):
-                    if d['status'] == 'downloading':
-                        nonlocal total_size
-                        # Lấy thông tin về tổng kích thước và đã tải
-                        downloaded = d.get('downloaded_bytes', 0)
-                        total = d.get('total_bytes', 0)
-                        
-                        # Nếu không có total_bytes, thử dùng total_bytes_estimate
-                        if total == 0:
-                            total = d.get('total_bytes_estimate', 0)
-                        
-                        # Lưu tổng kích thước đã biết để sử dụng cho các lần gọi tiếp theo
-                        # Chỉ cập nhật nếu giá trị mới lớn hơn giá trị đã lưu
-                        if total > 0:
-                            if total_size == 0 or (total > total_size and total_size > 0):
-                                total_size = total
-                            else:
-                                # Sử dụng giá trị đã lưu nếu giá trị mới nhỏ hơn
-                                total = total_size
-                        
-                        # Tính phần trăm
-                        if total > 0:
-                            # Đảm bảo phần trăm được tính chính xác dựa trên dung lượng đã tải và tổng dung lượng
-                            percent = min(int(downloaded * 100 / total), 100)  # Đảm bảo không vượt quá 100%
-                            print(f"Tính phần trăm: {downloaded}/{total} = {percent}%")
-                        else:
-                            # Nếu không có thông tin về tổng kích thước, dùng _percent_str
-                            p = d.get('_percent_str', '0%')
-                            p = p.replace('%', '')
-                            try:
-                                percent = int(float(p))
-                            except:
-                                percent = 0
-                        
-                        # Truyền thông tin chi tiết về tiến trình
-                        speed = d.get('speed', 0)
-                        # In ra để debug
-                        print(f"Raw speed from yt-dlp: {speed}")
-                        # Đảm bảo tốc độ là hợp lý và không phải None
-                        if speed is None:
-                            speed = 0
-                        elif speed > 100 * 1024 * 1024:  # > 100MB/s
-                            # Có thể là lỗi đơn vị, điều chỉnh lại
-                            speed = speed / 1024  # Chuyển về KB/s
-                        
-                        # Gọi callback và kiểm tra kết quả
-                        # Nếu callback trả về False, dừng tải xuống
-                        if progress_callback(percent, downloaded, total, speed) is False:
-                            raise Exception("Đã hủy tải xuống")
-                        
-                    elif d['status'] == 'finished':
-                        # Khi tải xong, gửi thông báo 100%
-                        progress_callback(100, 0, 0, 0)
+            # Thêm callback tiến trình với thông tin chi tiết hơn (hook cũng dùng để điều tiết băng thông)
+            # Thêm biến để lưu trữ tổng kích thước đã biết
+            total_size = 0
+            reported_files = set()
+            received_bytes = {}  # filename -> số byte đã tính vào băng thông
+            # Tốc độ tính từ số byte thực nhận của mọi file (luồng hình rồi luồng âm thanh)
+            estimator = SpeedEstimator()
+
+            def my_hook(d):
+                # Báo tên file đích (và file .part) một lần cho mỗi file
+                filename = d.get('filename')
+                if event_callback and filename and filename not in reported_files:
+                    reported_files.add(filename)
+                    event_callback('file', {'filename': filename, 'tmpfilename': d.get('tmpfilename')})
                 
-                ydl_opts['progress_hooks'] = [my_hook]
+                # Ngủ nếu lượt tải vượt phần băng thông được cấp
+                if d['status'] == 'downloading':
+                    downloaded_now = d.get('downloaded_bytes') or 0
+                    previous = received_bytes.get(filename, 0)
+                    if downloaded_now > previous:
+                        received_bytes[filename] = downloaded_now
+                        metrics.count('bytes', downloaded_now - previous)
+                        estimator.add(downloaded_now - previous)
+                        if controller is not None:
+                            controller.observe(downloaded_now - previous)
+                        delay = self.bandwidth.throttle(bandwidth_key, downloaded_now - previous)
+                        if delay:
+                            metrics.count('throttle_seconds', delay)
+                
+                if not progress_callback:
+                    return
+                
+                if d['status'] == 'downloading':
+                    nonlocal total_size
+                    # Lấy thông tin về tổng kích thước và đã tải
+                    downloaded = d.get('downloaded_bytes', 0)
+                    total = d.get('total_bytes', 0)
+                    
+                    # Nếu không có total_bytes, thử dùng total_bytes_estimate
+                    if total == 0:
+                        total = d.get('total_bytes_estimate', 0)
+                    
+                    # Lưu tổng kích thước đã biết để sử dụng cho các lần gọi tiếp theo
+                    # Chỉ cập nhật nếu giá trị mới lớn hơn giá trị đã lưu
+                    if total > 0:
+                        if total_size == 0 or (total > total_size and total_size > 0):
+                            total_size = total
+                        else:
+                            # Sử dụng giá trị đã lưu nếu giá trị mới nhỏ hơn
+                            total = total_size
+                    
+                    # Tính phần trăm
+                    if total > 0:
+                        # Đảm bảo phần trăm được tính chính xác dựa trên dung lượng đã tải và tổng dung lượng
+                        percent = min(int(downloaded * 100 / total), 100)  # Đảm bảo không vượt quá 100%
+                    else:
+                        # Nếu không có thông tin về tổng kích thước, dùng _percent_str
+                        p = d.get('_percent_str', '0%')
+                        p = p.replace('%', '')
+                        try:
+                            percent = int(float(p))
+                        except:
+                            percent = 0
+                    
+                    # Truyền thông tin chi tiết về tiến trình (tốc độ tính bằng byte/giây)
+                    speed = estimator.speed()
+                    
+                    # Gọi callback và kiểm tra kết quả
+                    # Nếu callback trả về False, dừng tải xuống
+                    if progress_callback(percent, downloaded, total, speed) is False:
+                        raise Exception("Đã hủy tải xuống")
+                    
+                elif d['status'] == 'finished':
+                    # Khi tải xong, gửi thông báo 100%
+                    progress_callback(100, 0, 0, 0)
+            
+            ydl_opts['progress_hooks'] = [my_hook]
+
+            def pp_hook(d):
+                # Ghép/sửa file do yt-dlp chạy ngay sau khi tải, tách khỏi thời gian tải
+                phase = 'merge' if d.get('postprocessor') == 'Merger' else 'fixup'
+                if d['status'] == 'started':
+                    metrics.begin(phase)
+                elif d['status'] == 'finished':
+                    metrics.end(phase)
 
-            # Tải xuống
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                file_path = ydl.prepare_filename(info)
+            ydl_opts['postprocessor_hooks'] = [pp_hook]
 
-            # Chuyển đổi sang mp4 nếu cần
-            if ffmpeg_exists and download_type == "video" and not file_path.lower().endswith('.mp4'):
-                file_path = self.convert_to_mp4(file_path, ffmpeg_path)
+            # Tải xuống từ thông tin đã trích xuất, không cần gọi extract_info lần nữa
+            self.bandwidth.register(bandwidth_key, bandwidth_weight, speed_limit)
+            streamed = False
+            resolved = None
+            with self.sessions.session(ydl_opts) as ydl:
+                try:
+                    # Chọn định dạng mà không tải để biết URL, header và tên file đích
+                    with metrics.span('resolve'):
+                        resolved = ydl.process_ie_result(copy.deepcopy(info), download=False)
+                        cache_video_id, cache_streams = self._cache_plan(ydl, info, resolved)
+                    # Mọi luồng đã có trong bộ đệm: đặt sẵn vào đúng tên file, yt-dlp sẽ bỏ qua
+                    # bước tải và chỉ ghép
+                    with metrics.span('cache_restore'):
+                        cache_hit = self._restore_streams(cache_video_id, cache_streams)
+                    if cache_hit:
+                        metrics.count('media_cache_hits')
+                    file_path = None
+                    if not cache_hit and download_type == "audio" and stream_audio and ffmpeg_exists:
+                        copy_to = cache_streams[0][2] if cache_streams else None
+                        if copy_to and copy_to.lower().endswith('.mp3'):
+                            # Nguồn đã là mp3: file kết quả chính là luồng gốc
+                            copy_to = None
+                        with metrics.span('stream_audio'):
+                            file_path = self._stream_audio(ydl, resolved, request.audio_bitrate, ffmpeg_path,
+                                                           retry_count, my_hook, copy_to, metrics)
+                        streamed = file_path is not None
+                        if streamed and cache_streams:
+                            with metrics.span('cache_store'):
+                                if copy_to:
+                                    self._store_streams(cache_video_id, cache_streams, move=True)
+                                else:
+                                    self._store_streams(cache_video_id, [cache_streams[0][:2] + (file_path,)],
+                                                        move=False)
+                    if file_path is None and not cache_hit:
+                        with metrics.span('segmented'):
+                            file_path = self._download_segmented(ydl, resolved, concurrent_downloads, retry_count,
+                                                                 my_hook, controller, metrics)
+                        if file_path is not None and cache_streams:
+                            with metrics.span('cache_store'):
+                                self._store_streams(cache_video_id, cache_streams, move=False)
+                    if file_path is None:
+                        with metrics.span('download'):
+                            info = ydl.process_ie_result(copy.deepcopy(info), download=True)
+                except (load_yt_dlp().utils.DownloadError, SegmentedDownloadError) as e:
+                    # URL định dạng đã ký trong bộ đệm có thể đã hết hạn, trích xuất lại một lần
+                    if not info_from_cache or '403' not in str(e):
+                        raise
+                    self.info_cache.invalidate(url)
+                    metrics.count('retries')
+                    if resolved is not None:
+                        # yt-dlp tải lại từ đầu, bỏ phần tải theo đoạn dở dang
+                        self.segmented.discard_partial(ydl.prepare_filename(resolved))
+                    if controller is not None:
+                        # yt-dlp tải lại với số fragment đã cố định trong ydl_opts
+                        controller.fix(concurrent_downloads)
+                    with metrics.span('download'):
+                        info = ydl.extract_info(url, download=True)
+                    file_path = None
+                    cache_hit = False
+                if file_path is None:
+                    # Đường dẫn thực tế sau khi ghép (phần mở rộng có thể khác với tên dự kiến)
+                    requested = info.get('requested_downloads') or [{}]
+                    file_path = requested[0].get('filepath') or ydl.prepare_filename(info)
+                    if self.media_cache is not None:
+                        merged = requested[0].get('requested_formats')
+                        with metrics.span('cache_store'):
+                            if merged:
+                                # Các luồng đơn được giữ lại nhờ keepvideo: chuyển vào bộ đệm (hoặc xóa)
+                                self._store_streams(
+                                    None if cache_hit else cache_video_id,
+                                    [(f.get('format_id'), f.get('ext'), f.get('filepath')) for f in merged],
+                                    move=True)
+                            elif cache_streams and not cache_hit:
+                                self._store_streams(cache_video_id, [cache_streams[0][:2] + (file_path,)],
+                                                    move=False)
 
-            return file_path
+            # Chuyển sang mp4/mp3 được tách thành bước riêng, chạy trên pool hậu xử lý
+            if streamed or defer_postprocess or not ffmpeg_exists:
+                return file_path
+            return self.postprocess(file_path, download_type, quality, ffmpeg_path, metrics=metrics)
 
         except Exception as e:
             raise Exception(f"Lỗi khi tải xuống video: {str(e)}")
+        finally:
+            self.bandwidth.unregister(bandwidth_key)
+            if controller is not None:
+                controller.finish()
+
+    def _cache_plan(self, ydl, info, resolved):
+        """
+        Các luồng đơn của định dạng đã chọn có thể lấy từ/đưa vào bộ đệm media
+
+        Returns:
+            tuple: (ID video trong bộ đệm, danh sách (format_id, ext, đường dẫn yt-dlp sẽ tải tới)),
+                danh sách rỗng nếu bộ đệm tắt hoặc định dạng không phải các luồng đơn
+        """
+        if self.media_cache is None or not info.get('id'):
+            return None, []
+        formats = resolved.get('requested_formats') or [resolved]
+        if not all(fmt.get('format_id') and is_elementary(fmt) for fmt in formats):
+            return None, []
+        video_id = f"{info.get('extractor_key') or info.get('extractor')}:{info['id']}"
+        target = ydl.prepare_filename(resolved)
+        if resolved.get('requested_formats'):
+            # Tên file tạm của từng luồng trước khi ghép, giống cách yt-dlp đặt tên
+            stem = os.path.splitext(target)[0]
+            paths = [f"{stem}.f{fmt['format_id']}.{fmt.get('ext')}" for fmt in formats]
+        else:
+            paths = [target]
+        return video_id, [(fmt['format_id'], fmt.get('ext'), path) for fmt, path in zip(formats, paths)]
+
+    def _restore_streams(self, video_id, streams):
+        """Đặt các luồng từ bộ đệm vào thư mục đích nếu có đủ, trả về True nếu không cần tải"""
+        if not streams or not all(self.media_cache.has(video_id, format_id) for format_id, _, _ in streams):
+            return False
+        return all(self.media_cache.materialize(video_id, format_id, path) for format_id, _, path in streams)
+
+    def _store_streams(self, video_id, streams, move):
+        """
+        Đưa các luồng vừa tải vào bộ đệm media
+
+        Args:
+            video_id (str): ID video trong bộ đệm, None để chỉ dọn các file được giữ lại
+            streams (list): Các (format_id, ext, đường dẫn file)
+            move (bool): Chuyển file vào bộ đệm (file chỉ là bản tạm) thay vì liên kết
+        """
+        for format_id, ext, path in streams:
+            if not path or not os.path.exists(path):
+                continue
+            stored = None
+            if video_id and format_id:
+                try:
+                    stored = self.media_cache.put(video_id, format_id, path, ext, move=move)
+                except OSError as e:
+                    logger.warning("Không thể lưu luồng %s vào bộ đệm: %s", format_id, e)
+            if move and stored is None and os.path.exists(path):
+                os.remove(path)
+
+    def _stream_audio(self, ydl, resolved, bitrate, ffmpeg_path, retries, progress_hook, copy_to=None, metrics=None):
+        """
+        Tải định dạng audio và chuyển sang mp3 ngay trong lúc tải
+
+        Thay cho việc tải toàn bộ file rồi mới chạy ffmpeg một lượt nữa: file mp3 xong gần như
+        cùng lúc với lượt tải. Chỉ áp dụng cho file đơn qua http(s) có container đọc tuần tự được.
+        Khi có copy_to, luồng gốc đồng thời được ghi ra file đó (để đưa vào bộ đệm media).
+
+        Returns:
+            str: Đường dẫn file mp3, hoặc None nếu cần tải và hậu xử lý như bình thường
+        """
+        if not is_streamable(resolved):
+            return None
+        output_file = os.path.splitext(ydl.prepare_filename(resolved))[0] + '.mp3'
+        try:
+            return self.streaming.extract(resolved, output_file, ffmpeg_path, bitrate or 192, retries, progress_hook,
+                                          copy_to, on_retry=self._retry_counter(metrics))
+        except StreamingError as e:
+            logger.warning("Không tách audio trực tiếp được, tải file rồi chuyển đổi: %s", e)
+            return None
+
+    def _download_segmented(self, ydl, resolved, connections, retries, progress_hook, controller=None,
+                            metrics=None):
+        """
+        Tải định dạng một file (progressive) qua nhiều kết nối HTTP Range
 
+        yt-dlp tải các file này qua một kết nối duy nhất, vốn thường bị máy chủ giới hạn tốc độ
+        theo từng kết nối. Định dạng cần ghép (video+audio) hoặc phân mảnh (HLS/DASH) vẫn do
+        yt-dlp tải với concurrent_fragment_downloads. Khi có controller, số kết nối được điều
+        chỉnh ngay trong lúc tải.
+
+        Args:
+            resolved (dict): Thông tin video sau khi chọn định dạng (process_ie_result download=False)
+
+        Returns:
+            str: Đường dẫn file đã tải, hoặc None nếu cần tải bằng yt-dlp
+        """
+        if controller is not None:
+            connections = controller.max_connections
+        path = ydl.prepare_filename(resolved)
+        if connections <= 1 or not is_segmentable(resolved, self.segmented.min_size):
+            # Lần trước có thể đã tải theo đoạn dở dang (cấu hình khác), yt-dlp không dùng lại được
+            self.segmented.discard_partial(path)
+            return None
+        try:
+            return self.segmented.download(resolved['url'], path, headers=resolved.get('http_headers'),
+                                           connections=connections, retries=retries,
+                                           progress_hook=progress_hook, controller=controller,
+                                           on_retry=self._retry_counter(metrics))
+        except RangeNotSupported as e:
+            logger.debug("Không tải theo đoạn được, dùng yt-dlp: %s", e)
+            self.segmented.discard_partial(path)
+            return None
+
+    @staticmethod
+    def _retry_counter(metrics):
+        if metrics is None:
+            return None
+        return lambda: metrics.count('retries')
+
+    def postprocess(self, file_path, download_type="video", quality="highest", ffmpeg_path=None,
+                    should_stop=None, metrics=None):
+        """
+        Chuyển file vừa tải sang mp4 (video) hoặc mp3 (audio) ngay trên luồng hiện tại
+        
+        Args:
+            file_path (str): File vừa tải về
+            download_type (str): "video" hoặc "audio"
+            quality (str): Chất lượng đã chọn (dùng để lấy bitrate mp3)
+            ffmpeg_path (str, optional): Đường dẫn ffmpeg
+            should_stop (callable, optional): Trả về True để dừng giữa chừng
+            metrics (JobMetrics, optional): Nơi ghi thời gian giai đoạn 'postprocess'
+            
+        Returns:
+            str: Đường dẫn file kết quả
+        """
+        request = FormatRequest.from_quality(quality, download_type)
+        metrics = (metrics if metrics is not None else JobMetrics()).bind(self.metrics)
+        try:
+            with metrics.span('postprocess'):
+                return self.postprocessor.process(file_path, download_type, request.audio_bitrate,
+                                                  ffmpeg_path, should_stop)
+        except Exception as e:
+            raise Exception(f"Lỗi khi hậu xử lý file: {str(e)}")
+    
+    def submit_postprocess(self, file_path, download_type="video", quality="highest", ffmpeg_path=None,
+                           should_stop=None, metrics=None):
+        """
+        Đưa file vừa tải vào pool hậu xử lý, không chặn luồng tải xuống
+        
+        Args:
+            metrics (JobMetrics, optional): Nơi ghi thời gian chờ pool ('postprocess_wait') và
+                thời gian chạy ('postprocess')
+        
+        Returns:
+            concurrent.futures.Future: Kết quả là đường dẫn file cuối cùng
+        """
+        metrics = (metrics if metrics is not None else JobMetrics()).bind(self.metrics)
+
+        def on_start():
+            metrics.end('postprocess_wait')
+            metrics.begin('postprocess')
+
+        metrics.begin('postprocess_wait')
+        future = self.postprocessor.submit(file_path, download_type,
+                                           FormatRequest.from_quality(quality, download_type).audio_bitrate,
+                                           ffmpeg_path, should_stop, on_start)
+        # Hủy trước khi tới lượt thì chỉ còn giai đoạn chờ đang mở
+        future.add_done_callback(lambda f: metrics.end('postprocess') or metrics.end('postprocess_wait'))
+        return future
+    
     def convert_to_mp4(self, input_file, ffmpeg_path):
         """
         Chuyển đổi file video sang định dạng mp4
         
+        Chỉ mã hóa lại các luồng mà mp4 không chứa được, các luồng còn lại được chép thẳng.
+        
         Args:
             input_file (str): Đường dẫn đến file đầu vào
             ffmpeg_path (str): Đường dẫn đến ffmpeg
@@ -333,29 +621,7 @@ class YouTubeDownloader:
             str: Đường dẫn đến file mp4 đã chuyển đổi
         """
         try:
-            # Tạo tên file đầu ra
-            output_file = os.path.splitext(input_file)[0] + '.mp4'
-            
-            # Nếu file đầu vào đã là mp4, không cần chuyển đổi
-            if input_file.lower().endswith('.mp4'):
-                return input_file
-            
-            # Chạy lệnh ffmpeg để chuyển đổi
-            subprocess.run([
-                ffmpeg_path,
-                '-i', input_file,  # File đầu vào
-                '-c:v', 'copy',    # Giữ nguyên codec video
-                '-c:a', 'aac',     # Chuyển đổi audio sang AAC (phù hợp với MP4)
-                '-strict', 'experimental',
-                output_file        # File đầu ra
-            ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            
-            # Xóa file gốc sau khi chuyển đổi thành công
-            if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-                os.remove(input_file)
-                return output_file
-            else:
-                return input_file
+            return self.postprocessor.process(input_file, "video", ffmpeg_path=ffmpeg_path)
         except Exception as e:
-            print(f"Lỗi khi chuyển đổi sang MP4: {e}")
-            return input_file
\ No newline at end of file
+            logger.error("Lỗi khi chuyển đổi sang MP4: %s", e)
+            return input_file
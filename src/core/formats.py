@@ -0,0 +1,413 @@
+"""
+Module mô hình định dạng và bộ chọn định dạng tải xuống
+
+Thay vì chuyển định dạng thành chuỗi hiển thị rồi phân tích ngược lại, các định dạng của
+yt-dlp được giữ dưới dạng MediaFormat; bộ chọn xếp hạng theo độ phân giải, codec, bitrate,
+dung lượng và trả về đúng cặp format ID ("137+140") để yt-dlp tải mà không phải chọn lại.
+"""
+
+import re
+
+# Độ phân giải phổ biến dùng cho danh sách phát (chưa biết định dạng của từng video)
+COMMON_RESOLUTIONS = (360, 480, 720, 1080, 1440, 2160)
+# Các mức bitrate MP3 cho chế độ tải audio
+MP3_BITRATES = (64, 128, 192, 256, 320)
+
+# Tiền tố khóa chất lượng trỏ tới định dạng chính xác
+FORMAT_KEY_PREFIX = 'format:'
+# Codec khi yt-dlp không cho biết (ví dụ link file trực tiếp, extractor generic): có thể có luồng đó
+UNKNOWN_CODEC = 'unknown'
+
+
+def _number(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _codec_name(codec):
+    # 'none' nghĩa là không có luồng; thiếu trường nghĩa là chưa biết, không phải không có
+    if codec in ('none', 'images'):
+        return None
+    if not codec:
+        return UNKNOWN_CODEC
+    return codec.split('.')[0].lower()
+
+
+class MediaFormat:
+    """Một định dạng (stream) của video theo dữ liệu của yt-dlp"""
+
+    __slots__ = ('format_id', 'ext', 'vcodec', 'acodec', 'width', 'height', 'fps',
+                 'tbr', 'vbr', 'abr', 'filesize', 'protocol', 'format_note')
+
+    def __init__(self, format_id, ext=None, vcodec=None, acodec=None, width=None, height=None, fps=None,
+                 tbr=None, vbr=None, abr=None, filesize=None, protocol=None, format_note=None):
+        self.format_id = format_id
+        self.ext = ext
+        self.vcodec = vcodec
+        self.acodec = acodec
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.tbr = tbr
+        self.vbr = vbr
+        self.abr = abr
+        self.filesize = filesize
+        self.protocol = protocol
+        self.format_note = format_note
+
+    @classmethod
+    def from_info(cls, fmt):
+        """
+        Tạo MediaFormat từ một phần tử trong info['formats'] của yt-dlp
+
+        Args:
+            fmt (dict): Định dạng của yt-dlp
+
+        Returns:
+            MediaFormat
+        """
+        height = fmt.get('height')
+        return cls(
+            format_id=str(fmt.get('format_id', '')),
+            ext=fmt.get('ext'),
+            vcodec=_codec_name(fmt.get('vcodec')),
+            acodec=_codec_name(fmt.get('acodec')),
+            width=fmt.get('width'),
+            height=int(height) if height else None,
+            fps=_number(fmt.get('fps')),
+            tbr=_number(fmt.get('tbr')),
+            vbr=_number(fmt.get('vbr')),
+            abr=_number(fmt.get('abr')),
+            filesize=fmt.get('filesize') or fmt.get('filesize_approx'),
+            protocol=fmt.get('protocol'),
+            format_note=fmt.get('format_note'),
+        )
+
+    @property
+    def has_video(self):
+        return self.vcodec is not None
+
+    @property
+    def has_audio(self):
+        return self.acodec is not None
+
+    @property
+    def is_muxed(self):
+        """Định dạng có cả hình và tiếng (không cần ffmpeg để ghép)"""
+        return self.has_video and self.has_audio
+
+    @property
+    def audio_bitrate(self):
+        return self.abr or (self.tbr if not self.has_video else None) or 0
+
+    def estimated_size(self, duration=None):
+        """
+        Dung lượng ước tính (byte)
+
+        Args:
+            duration (float, optional): Thời lượng video, dùng khi yt-dlp không có filesize
+
+        Returns:
+            int: Số byte, hoặc None nếu không ước tính được
+        """
+        if self.filesize:
+            return int(self.filesize)
+        bitrate = self.tbr or ((self.vbr or 0) + (self.abr or 0))
+        if bitrate and duration:
+            return int(bitrate * 1000 / 8 * duration)
+        return None
+
+    def __repr__(self):
+        return (f"<MediaFormat {self.format_id} {self.ext} {self.height}p "
+                f"v={self.vcodec} a={self.acodec}>")
+
+
+def parse_formats(info):
+    """
+    Chuyển info['formats'] của yt-dlp thành danh sách MediaFormat (bỏ định dạng storyboard)
+
+    Args:
+        info (dict): Thông tin video
+
+    Returns:
+        list: Danh sách MediaFormat
+    """
+    formats = []
+    for fmt in info.get('formats') or []:
+        media_format = MediaFormat.from_info(fmt)
+        if media_format.format_id and (media_format.has_video or media_format.has_audio):
+            formats.append(media_format)
+    return formats
+
+
+class FormatRequest:
+    """Các ràng buộc khi chọn định dạng"""
+
+    __slots__ = ('download_type', 'max_height', 'vcodec', 'prefer_ext', 'max_filesize', 'max_tbr',
+                 'audio_bitrate', 'format_spec')
+
+    def __init__(self, download_type="video", max_height=None, vcodec=None, prefer_ext='mp4',
+                 max_filesize=None, max_tbr=None, audio_bitrate=None, format_spec=None):
+        """
+        Args:
+            download_type (str): "video" hoặc "audio"
+            max_height (int, optional): Độ phân giải tối đa
+            vcodec (str, optional): Tiền tố codec video yêu cầu (ví dụ "avc1", "vp9")
+            prefer_ext (str): Container ưu tiên cho video ("mp4" để tránh phải chuyển đổi)
+            max_filesize (int, optional): Dung lượng tối đa (byte)
+            max_tbr (float, optional): Bitrate tổng tối đa (kbps)
+            audio_bitrate (int, optional): Bitrate MP3 đầu ra khi tải audio
+            format_spec (str, optional): Định dạng chính xác, ví dụ "137+140"
+        """
+        self.download_type = download_type
+        self.max_height = max_height
+        self.vcodec = vcodec
+        self.prefer_ext = prefer_ext
+        self.max_filesize = max_filesize
+        self.max_tbr = max_tbr
+        self.audio_bitrate = audio_bitrate
+        self.format_spec = format_spec
+
+    @classmethod
+    def from_quality(cls, quality, download_type="video"):
+        """
+        Phân tích chuỗi chất lượng thành FormatRequest
+
+        Hỗ trợ: "highest"/"best"/"bestaudio", "720p" hoặc "720p (...)", "192kbps (mp3)"
+        và "format:<spec>" (định dạng chính xác do bộ chọn tạo ra).
+
+        Args:
+            quality (str): Chuỗi chất lượng
+            download_type (str): "video" hoặc "audio"
+
+        Returns:
+            FormatRequest
+        """
+        request = cls(download_type=download_type)
+        quality = (quality or '').strip()
+        if quality.startswith(FORMAT_KEY_PREFIX):
+            request.format_spec = quality[len(FORMAT_KEY_PREFIX):]
+            return request
+        match = re.match(r'^(\d+(?:\.\d+)?)\s*kbps', quality)
+        if match:
+            if 'mp3' in quality:
+                request.audio_bitrate = int(float(match.group(1)))
+            return request
+        match = re.match(r'^(\d+)p', quality)
+        if match:
+            request.max_height = int(match.group(1))
+        return request
+
+
+class FormatSelection:
+    """Kết quả chọn định dạng: một định dạng muxed hoặc cặp video + audio"""
+
+    __slots__ = ('video', 'audio')
+
+    def __init__(self, video=None, audio=None):
+        self.video = video
+        self.audio = audio
+
+    @property
+    def formats(self):
+        return [f for f in (self.video, self.audio) if f is not None]
+
+    @property
+    def format_spec(self):
+        """Chuỗi format ID cho yt-dlp, ví dụ "137+140" hoặc "22" """
+        return '+'.join(f.format_id for f in self.formats)
+
+    @property
+    def height(self):
+        return self.video.height if self.video else None
+
+    def estimated_size(self, duration=None):
+        sizes = [f.estimated_size(duration) for f in self.formats]
+        return None if None in sizes else sum(sizes)
+
+    def __repr__(self):
+        return f"<FormatSelection {self.format_spec}>"
+
+
+def _video_rank(fmt, request):
+    return (
+        fmt.ext == request.prefer_ext,
+        fmt.height or 0,
+        fmt.fps or 0,
+        fmt.vbr or fmt.tbr or 0,
+    )
+
+
+def _audio_rank(fmt, prefer_ext=None):
+    return (
+        prefer_ext is not None and fmt.ext == prefer_ext,
+        fmt.audio_bitrate,
+    )
+
+
+def _matches(fmt, request, duration):
+    if request.max_height and fmt.height and fmt.height > request.max_height:
+        return False
+    if request.vcodec and fmt.has_video and not (fmt.vcodec or '').startswith(request.vcodec):
+        return False
+    if request.max_tbr and fmt.tbr and fmt.tbr > request.max_tbr:
+        return False
+    if request.max_filesize:
+        size = fmt.estimated_size(duration)
+        if size and size > request.max_filesize:
+            return False
+    return True
+
+
+def select_formats(formats, request, can_merge=True, duration=None):
+    """
+    Chọn định dạng tốt nhất thỏa mãn các ràng buộc
+
+    Args:
+        formats (list): Danh sách MediaFormat
+        request (FormatRequest): Các ràng buộc
+        can_merge (bool): Có ffmpeg để ghép video + audio hay không
+        duration (float, optional): Thời lượng video để ước tính dung lượng
+
+    Returns:
+        FormatSelection: Định dạng đã chọn, hoặc None nếu không có định dạng phù hợp
+    """
+    by_id = {f.format_id: f for f in formats}
+
+    # Định dạng chính xác do người dùng chọn từ danh sách
+    if request.format_spec:
+        chosen = [by_id.get(format_id) for format_id in request.format_spec.split('+')]
+        if all(chosen):
+            video = next((f for f in chosen if f.has_video), None)
+            audio = next((f for f in chosen if not f.has_video), None)
+            if video is None:
+                return FormatSelection(audio=chosen[0])
+            if len(chosen) == 1 or can_merge:
+                return FormatSelection(video, audio)
+            # Không ghép được: chuyển thành yêu cầu theo độ phân giải của định dạng video
+            fallback = FormatRequest(request.download_type, max_height=video.height)
+            return select_formats(formats, fallback, can_merge, duration)
+        request = FormatRequest(request.download_type)
+
+    audio_only = [f for f in formats if f.has_audio and not f.has_video]
+
+    if request.download_type == "audio":
+        candidates = audio_only or [f for f in formats if f.has_audio]
+        candidates = [f for f in candidates if _matches(f, request, duration)] or candidates
+        if not candidates:
+            return None
+        return FormatSelection(audio=max(candidates, key=_audio_rank))
+
+    if can_merge:
+        videos = [f for f in formats if f.has_video and not f.has_audio and _matches(f, request, duration)]
+        if videos and audio_only:
+            # Ưu tiên audio cùng họ container (m4a cho mp4) để ghép không cần chuyển đổi
+            audio_ext = 'm4a' if request.prefer_ext == 'mp4' else None
+            audio = max(audio_only, key=lambda f: _audio_rank(f, audio_ext))
+            for video in sorted(videos, key=lambda f: _video_rank(f, request), reverse=True):
+                selection = FormatSelection(video, audio)
+                size = selection.estimated_size(duration)
+                if not request.max_filesize or size is None or size <= request.max_filesize:
+                    return selection
+
+    # Không có ffmpeg hoặc không có stream tách rời: dùng định dạng muxed tốt nhất
+    muxed = [f for f in formats if f.is_muxed and _matches(f, request, duration)]
+    if not muxed and request.max_height:
+        # Không có định dạng nào thấp hơn giới hạn, lấy định dạng muxed thấp nhất
+        muxed = sorted((f for f in formats if f.is_muxed), key=lambda f: f.height or 0)[:1]
+    if not muxed:
+        return None
+    return FormatSelection(max(muxed, key=lambda f: _video_rank(f, request)))
+
+
+class QualityOption:
+    """Một dòng trong danh sách chất lượng của giao diện"""
+
+    __slots__ = ('kind', 'key', 'label', 'height', 'bitrate')
+
+    def __init__(self, kind, key, label, height=None, bitrate=None):
+        """
+        Args:
+            kind (str): "video" hoặc "audio"
+            key (str): Chuỗi chất lượng truyền cho YouTubeDownloader.download
+            label (str): Nhãn hiển thị
+            height (int, optional): Độ phân giải
+            bitrate (int, optional): Bitrate audio (kbps)
+        """
+        self.kind = kind
+        self.key = key
+        self.label = label
+        self.height = height
+        self.bitrate = bitrate
+
+    def __repr__(self):
+        return f"<QualityOption {self.kind} {self.key!r}>"
+
+
+def _size_label(size):
+    if not size:
+        return ''
+    if size >= 1024 ** 3:
+        return f"~{size / 1024 ** 3:.1f} GB"
+    return f"~{size / 1024 ** 2:.0f} MB"
+
+
+def build_quality_options(formats, duration=None):
+    """
+    Tạo các lựa chọn chất lượng cho giao diện từ danh sách định dạng
+
+    Mỗi độ phân giải có một dòng trỏ tới cặp định dạng tốt nhất ở độ phân giải đó;
+    audio có các mức MP3 (không vượt bitrate gốc) và từng định dạng audio gốc.
+
+    Args:
+        formats (list): Danh sách MediaFormat
+        duration (float, optional): Thời lượng video để ước tính dung lượng
+
+    Returns:
+        list: Danh sách QualityOption, video theo độ phân giải tăng dần rồi đến audio
+    """
+    options = []
+    heights = sorted({f.height for f in formats if f.has_video and f.height})
+    for height in heights:
+        at_height = [f for f in formats if f.has_video and f.height == height]
+        request = FormatRequest("video", max_height=height)
+        selection = select_formats(at_height + [f for f in formats if not f.has_video], request,
+                                   duration=duration)
+        if selection is None:
+            continue
+        video = selection.video
+        details = [video.vcodec if video.vcodec != UNKNOWN_CODEC else '', video.ext or '']
+        size = _size_label(selection.estimated_size(duration))
+        if size:
+            details.append(size)
+        fps = f"{int(video.fps)}" if video.fps and video.fps > 30 else ''
+        label = f"{height}p{fps} ({', '.join(d for d in details if d)})"
+        options.append(QualityOption("video", FORMAT_KEY_PREFIX + selection.format_spec, label, height=height))
+
+    audio_formats = sorted((f for f in formats if f.has_audio and not f.has_video), key=lambda f: f.audio_bitrate)
+    max_bitrate = max((f.audio_bitrate for f in audio_formats), default=0)
+    for bitrate in MP3_BITRATES:
+        if bitrate <= max_bitrate or max_bitrate == 0:
+            options.append(QualityOption("audio", f"{bitrate}kbps (mp3)", f"{bitrate}kbps (mp3)", bitrate=bitrate))
+    for fmt in audio_formats:
+        if fmt.audio_bitrate:
+            label = f"{fmt.audio_bitrate:.0f}kbps ({', '.join(d for d in (fmt.ext, fmt.acodec) if d and d != UNKNOWN_CODEC)})"
+            options.append(QualityOption("audio", FORMAT_KEY_PREFIX + fmt.format_id, label,
+                                         bitrate=int(fmt.audio_bitrate)))
+    return options
+
+
+def generic_quality_options():
+    """
+    Các lựa chọn chất lượng chung khi chưa biết định dạng cụ thể (ví dụ danh sách phát)
+
+    Returns:
+        list: Danh sách QualityOption
+    """
+    options = [QualityOption("video", f"{height}p", f"{height}p (best)", height=height)
+               for height in COMMON_RESOLUTIONS]
+    options += [QualityOption("audio", f"{bitrate}kbps (mp3)", f"{bitrate}kbps (mp3)", bitrate=bitrate)
+                for bitrate in MP3_BITRATES]
+    return options
@@ -0,0 +1,268 @@
+"""
+Module lưu lịch sử tải xuống (SQLite) với tìm kiếm toàn văn và kiểm tra video đã tải
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from src.core.download_queue import JobState
+from src.utils.helpers import get_app_data_dir, extract_video_id
+
+logger = logging.getLogger(__name__)
+
+# Mỗi video chỉ có một dòng cho mỗi loại tải xuống; khóa là ID video YouTube, hoặc URL với các trang khác.
+# Các chỉ mục giúp tra cứu theo ID/URL/tiêu đề/ngày/đường dẫn trong O(log n)
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    video_id TEXT,
+    extractor TEXT,
+    url TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    uploader TEXT NOT NULL DEFAULT '',
+    download_type TEXT NOT NULL,
+    quality TEXT,
+    format_str TEXT,
+    file_path TEXT,
+    filesize INTEGER NOT NULL DEFAULT 0,
+    downloaded_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_downloads_key ON downloads(key, download_type);
+CREATE INDEX IF NOT EXISTS idx_downloads_video_id ON downloads(video_id);
+CREATE INDEX IF NOT EXISTS idx_downloads_url ON downloads(url);
+CREATE INDEX IF NOT EXISTS idx_downloads_title ON downloads(title);
+CREATE INDEX IF NOT EXISTS idx_downloads_date ON downloads(downloaded_at);
+CREATE INDEX IF NOT EXISTS idx_downloads_file ON downloads(file_path);
+"""
+
+# Bảng FTS5 dùng chung nội dung với bảng downloads, được đồng bộ bằng trigger
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS downloads_fts USING fts5(
+    title, uploader, url, file_path, content='downloads', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS downloads_ai AFTER INSERT ON downloads BEGIN
+    INSERT INTO downloads_fts(rowid, title, uploader, url, file_path)
+    VALUES (new.id, new.title, new.uploader, new.url, new.file_path);
+END;
+CREATE TRIGGER IF NOT EXISTS downloads_ad AFTER DELETE ON downloads BEGIN
+    INSERT INTO downloads_fts(downloads_fts, rowid, title, uploader, url, file_path)
+    VALUES ('delete', old.id, old.title, old.uploader, old.url, old.file_path);
+END;
+CREATE TRIGGER IF NOT EXISTS downloads_au AFTER UPDATE ON downloads BEGIN
+    INSERT INTO downloads_fts(downloads_fts, rowid, title, uploader, url, file_path)
+    VALUES ('delete', old.id, old.title, old.uploader, old.url, old.file_path);
+    INSERT INTO downloads_fts(rowid, title, uploader, url, file_path)
+    VALUES (new.id, new.title, new.uploader, new.url, new.file_path);
+END;
+"""
+
+
+def _history_key(url):
+    """Khóa của một video trong lịch sử, chỉ tính từ URL để tra được trước khi trích xuất"""
+    return extract_video_id(url) or url
+
+
+class HistoryEntry:
+    """Một video đã tải trong lịch sử"""
+
+    __slots__ = ('id', 'video_id', 'extractor', 'url', 'title', 'uploader', 'download_type', 'quality',
+                 'format_str', 'file_path', 'filesize', 'downloaded_at')
+
+    def __init__(self, row):
+        for name in self.__slots__:
+            setattr(self, name, row[name])
+
+    def file_exists(self):
+        """File đã tải còn trên đĩa hay không"""
+        return bool(self.file_path) and os.path.exists(self.file_path)
+
+
+class DownloadHistory:
+    """
+    Lịch sử tải xuống lưu trong SQLite (~/.lappytube/history.db)
+
+    Được đăng ký làm listener của DownloadQueue và ghi lại mỗi công việc hoàn tất. Việc kiểm tra
+    "đã tải chưa" chỉ cần URL (ID video YouTube được lấy trực tiếp từ URL) và tra qua chỉ mục,
+    nên có thể gọi trước khi trích xuất thông tin qua mạng. Tìm kiếm dùng FTS5 nếu bản SQLite
+    hỗ trợ, nếu không thì quay về LIKE.
+    """
+
+    def __init__(self, db_path=None):
+        """
+        Khởi tạo lịch sử
+
+        Args:
+            db_path (str, optional): Đường dẫn file SQLite, mặc định ~/.lappytube/history.db
+        """
+        self.db_path = db_path or os.path.join(get_app_data_dir(), 'history.db')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        try:
+            with self._conn:
+                self._conn.executescript(_FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError as e:
+            logger.info("SQLite không hỗ trợ FTS5, tìm kiếm lịch sử dùng LIKE: %s", e)
+            self.has_fts = False
+
+    def close(self):
+        """Đóng kết nối cơ sở dữ liệu"""
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Ghi
+    # ------------------------------------------------------------------
+    def on_job_event(self, job):
+        """Listener cho DownloadQueue: ghi lại công việc vừa hoàn tất"""
+        if job.state != JobState.DONE or not job.file_path:
+            return
+        try:
+            self.record(
+                job.url, job.file_path, job.download_type,
+                video_id=job.metadata.get('video_id'),
+                extractor=job.metadata.get('extractor'),
+                title=job.metadata.get('title'),
+                uploader=job.metadata.get('uploader'),
+                quality=job.quality,
+                format_str=job.format_str,
+            )
+        except sqlite3.Error as e:
+            logger.warning("Không thể ghi lịch sử tải xuống (%s): %s", job.url, e)
+
+    def record(self, url, file_path, download_type="video", video_id=None, extractor=None, title=None,
+               uploader=None, quality=None, format_str=None):
+        """
+        Ghi (hoặc cập nhật) một video đã tải
+
+        Args:
+            url (str): URL video
+            file_path (str): Đường dẫn file đã tải
+            download_type (str): "video" hoặc "audio"
+            video_id (str, optional): ID video do extractor trả về
+            extractor (str, optional): Tên extractor của yt-dlp
+            title (str, optional): Tiêu đề, mặc định lấy từ tên file
+            uploader (str, optional): Kênh/người đăng
+            quality (str, optional): Chất lượng đã chọn
+            format_str (str, optional): Chuỗi định dạng yt-dlp đã dùng
+
+        Returns:
+            int: ID của dòng trong lịch sử
+        """
+        video_id = video_id or extract_video_id(url)
+        if not title:
+            title = os.path.splitext(os.path.basename(file_path or ''))[0]
+        try:
+            filesize = os.path.getsize(file_path)
+        except (OSError, TypeError):
+            filesize = 0
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO downloads (key, video_id, extractor, url, title, uploader, download_type, "
+                    "quality, format_str, file_path, filesize, downloaded_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key, download_type) DO UPDATE SET video_id=excluded.video_id, "
+                    "extractor=excluded.extractor, url=excluded.url, title=excluded.title, "
+                    "uploader=excluded.uploader, quality=excluded.quality, format_str=excluded.format_str, "
+                    "file_path=excluded.file_path, filesize=excluded.filesize, "
+                    "downloaded_at=excluded.downloaded_at",
+                    (_history_key(url), video_id, extractor, url, title or url, uploader or '',
+                     download_type, quality, format_str, file_path, filesize, time.time())
+                )
+                row = self._conn.execute(
+                    "SELECT id FROM downloads WHERE key=? AND download_type=?",
+                    (_history_key(url), download_type)
+                ).fetchone()
+        return row['id']
+
+    def remove(self, entry_id):
+        """Xóa một video khỏi lịch sử"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM downloads WHERE id=?", (entry_id,))
+
+    # ------------------------------------------------------------------
+    # Đọc
+    # ------------------------------------------------------------------
+    def find(self, url, download_type="video"):
+        """
+        Tìm video trong lịch sử theo URL/ID (tra chỉ mục, không truy cập mạng)
+
+        Args:
+            url (str): URL video
+            download_type (str): "video" hoặc "audio"
+
+        Returns:
+            HistoryEntry: Dòng lịch sử, hoặc None nếu chưa tải
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM downloads WHERE key=? AND download_type=?",
+                (_history_key(url), download_type)
+            ).fetchone()
+        return HistoryEntry(row) if row is not None else None
+
+    def is_downloaded(self, url, download_type="video", require_file=True):
+        """
+        Kiểm tra video đã được tải hay chưa
+
+        Args:
+            url (str): URL video
+            download_type (str): "video" hoặc "audio"
+            require_file (bool): Chỉ coi là đã tải nếu file vẫn còn trên đĩa
+
+        Returns:
+            bool: True nếu có thể bỏ qua video này
+        """
+        entry = self.find(url, download_type)
+        return entry is not None and (not require_file or entry.file_exists())
+
+    def search(self, query, limit=200):
+        """
+        Tìm kiếm theo tiêu đề, kênh, URL hoặc đường dẫn file
+
+        Mỗi từ trong truy vấn được so khớp theo tiền tố, các từ phải cùng xuất hiện.
+
+        Args:
+            query (str): Chuỗi tìm kiếm, rỗng để lấy các video mới nhất
+            limit (int): Số kết quả tối đa
+
+        Returns:
+            list: Danh sách HistoryEntry (phù hợp nhất hoặc mới nhất trước)
+        """
+        terms = re.findall(r'\w+', query or '')
+        with self._lock:
+            if not terms:
+                rows = self._conn.execute(
+                    "SELECT * FROM downloads ORDER BY downloaded_at DESC LIMIT ?", (limit,)
+                ).fetchall()
+            elif self.has_fts:
+                match = ' '.join(f'"{term}"*' for term in terms)
+                rows = self._conn.execute(
+                    "SELECT downloads.* FROM downloads_fts JOIN downloads ON downloads.id = downloads_fts.rowid "
+                    "WHERE downloads_fts MATCH ? ORDER BY downloads_fts.rank LIMIT ?", (match, limit)
+                ).fetchall()
+            else:
+                clauses = ' AND '.join(["(title LIKE ? OR uploader LIKE ? OR url LIKE ? OR file_path LIKE ?)"]
+                                       * len(terms))
+                params = [f'%{term}%' for term in terms for _ in range(4)]
+                rows = self._conn.execute(
+                    f"SELECT * FROM downloads WHERE {clauses} ORDER BY downloaded_at DESC LIMIT ?",
+                    params + [limit]
+                ).fetchall()
+        return [HistoryEntry(row) for row in rows]
+
+    def count(self):
+        """Số video trong lịch sử"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
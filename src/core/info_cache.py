@@ -0,0 +1,259 @@
+"""
+Module lưu đệm thông tin video (kết quả extract_info của yt-dlp)
+"""
+
+import collections
+import copy
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qs
+
+from src.utils.helpers import extract_video_id, get_app_data_dir
+
+logger = logging.getLogger(__name__)
+
+# Thời điểm hết hạn của URL định dạng đã ký (googlevideo: ?expire=... hoặc /expire/.../)
+_EXPIRE_RE = re.compile(r'[?&/]expire[=/](\d+)')
+
+
+def normalize_video_key(url):
+    """
+    Chuẩn hóa URL thành khóa lưu đệm
+
+    Các URL YouTube khác nhau của cùng một video (watch, youtu.be, shorts, embed...)
+    được đưa về cùng khóa "youtube:<id>". Các URL khác được bỏ fragment và chuẩn hóa host.
+
+    Args:
+        url (str): URL video
+
+    Returns:
+        str: Khóa lưu đệm
+    """
+    url = (url or '').strip()
+    video_id = extract_video_id(url)
+    if video_id:
+        return f"youtube:{video_id}"
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'),
+                       parts.query, ''))
+
+
+def signed_url_expiry(info):
+    """
+    Tìm thời điểm hết hạn sớm nhất của các URL định dạng trong thông tin video
+
+    Args:
+        info (dict): Thông tin video từ yt-dlp
+
+    Returns:
+        float: Unix timestamp, hoặc None nếu các URL không có thời hạn
+    """
+    expiry = None
+    for fmt in info.get('formats') or []:
+        url = fmt.get('url') or ''
+        match = _EXPIRE_RE.search(url)
+        if not match:
+            # Một số URL chỉ có thời hạn trong tham số truy vấn dạng khác
+            values = parse_qs(urlsplit(url).query).get('expire')
+            if not values or not values[0].isdigit():
+                continue
+            value = int(values[0])
+        else:
+            value = int(match.group(1))
+        expiry = value if expiry is None else min(expiry, value)
+    return expiry
+
+
+class InfoCache:
+    """
+    Bộ đệm hai tầng cho thông tin video: LRU trong bộ nhớ và các file JSON trên đĩa
+
+    Mỗi mục có thời hạn là giá trị nhỏ hơn giữa default_ttl và thời điểm hết hạn của
+    các URL định dạng đã ký (trừ đi khoảng an toàn), vì sau thời điểm đó yt-dlp không
+    thể tải bằng thông tin cũ nữa.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=128, default_ttl=3 * 3600, expiry_margin=10 * 60,
+                 persist=True):
+        """
+        Khởi tạo bộ đệm
+
+        Args:
+            cache_dir (str, optional): Thư mục lưu đệm trên đĩa, mặc định ~/.lappytube/info_cache
+            max_entries (int): Số mục tối đa giữ trong bộ nhớ
+            default_ttl (int): Thời gian sống mặc định (giây)
+            expiry_margin (int): Khoảng an toàn trước khi URL đã ký hết hạn (giây)
+            persist (bool): Có lưu xuống đĩa hay không
+        """
+        self.persist = persist
+        self.cache_dir = None
+        if persist:
+            self.cache_dir = cache_dir or get_app_data_dir('info_cache')
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_entries = max(1, int(max_entries))
+        self.default_ttl = default_ttl
+        self.expiry_margin = expiry_margin
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # key -> (expires_at, info)
+        self.hits = 0
+        self.misses = 0
+
+    def _path_for(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _expires_at(self, info, now):
+        expires_at = now + self.default_ttl
+        signed_expiry = signed_url_expiry(info)
+        if signed_expiry is not None:
+            expires_at = min(expires_at, signed_expiry - self.expiry_margin)
+        return expires_at
+
+    def get(self, url):
+        """
+        Lấy thông tin video còn hạn từ bộ đệm
+
+        Args:
+            url (str): URL video
+
+        Returns:
+            dict: Bản sao thông tin video, hoặc None nếu không có/đã hết hạn
+        """
+        key = normalize_video_key(url)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, info = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(info)
+                del self._entries[key]
+
+        entry = self._load_from_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self._remember(key, entry)
+            self.hits += 1
+        return copy.deepcopy(entry[1])
+
+    def put(self, url, info):
+        """
+        Lưu thông tin video vào bộ đệm
+
+        Chỉ lưu kết quả của một video đơn lẻ; danh sách phát không được lưu.
+
+        Args:
+            url (str): URL video
+            info (dict): Thông tin video đã được làm sạch (JSON-serializable)
+        """
+        if not info or info.get('_type', 'video') != 'video':
+            return
+        now = time.time()
+        expires_at = self._expires_at(info, now)
+        if expires_at <= now:
+            return
+        key = normalize_video_key(url)
+        info = copy.deepcopy(info)
+        with self._lock:
+            self._remember(key, (expires_at, info))
+        self._save_to_disk(key, expires_at, info)
+
+    def invalidate(self, url):
+        """Xóa thông tin của một video khỏi bộ đệm"""
+        key = normalize_video_key(url)
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.persist:
+            try:
+                os.remove(self._path_for(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Xóa toàn bộ bộ đệm"""
+        with self._lock:
+            self._entries.clear()
+        if self.persist:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+
+    def prune(self):
+        """
+        Xóa các mục đã hết hạn trên đĩa
+
+        Returns:
+            int: Số file đã xóa
+        """
+        if not self.persist:
+            return 0
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    expires_at = json.load(f).get('expires_at', 0)
+            except (OSError, ValueError):
+                expires_at = 0
+            if expires_at <= now:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load_from_disk(self, key, now):
+        if not self.persist:
+            return None
+        path = self._path_for(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('key') != key or data.get('expires_at', 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return data['expires_at'], data['info']
+
+    def _save_to_disk(self, key, expires_at, info):
+        if not self.persist:
+            return
+        path = self._path_for(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'expires_at': expires_at, 'info': info}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Không thể lưu đệm thông tin video: %s", e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
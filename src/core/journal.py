@@ -0,0 +1,246 @@
+"""
+Module ghi nhật ký (journal) các công việc tải xuống để có thể tiếp tục sau khi bị gián đoạn
+"""
+
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from src.core.download_queue import JobPriority, JobState
+from src.core.segmented import PART_SUFFIX, RANGES_SUFFIX, partial_progress
+from src.utils.helpers import get_app_data_dir
+
+logger = logging.getLogger(__name__)
+
+# Các trạng thái được coi là bị gián đoạn (ứng dụng tắt, tạm dừng hoặc lỗi giữa chừng; khi tắt,
+# hàng đợi tạm dừng các công việc còn lại). Công việc tắt khi đang hậu xử lý sẽ được yt-dlp nhận ra
+# file đã tải và chỉ chạy lại bước cuối. Công việc lỗi cũng được đề nghị thử lại (hoặc bỏ đi), để
+# journal không giữ chúng mãi. Công việc người dùng đã hủy bị xóa khỏi journal như công việc hoàn tất
+INTERRUPTED_STATES = (JobState.QUEUED, JobState.RUNNING, JobState.POSTPROCESSING, JobState.PAUSED,
+                      JobState.FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    save_path TEXT NOT NULL,
+    download_type TEXT NOT NULL,
+    quality TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 1,
+    options TEXT NOT NULL DEFAULT '{}',
+    format_str TEXT,
+    output_files TEXT NOT NULL DEFAULT '[]',
+    state TEXT NOT NULL,
+    downloaded INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state);
+"""
+
+
+class JournalEntry:
+    """Một công việc đã ghi trong journal"""
+
+    __slots__ = ('id', 'url', 'save_path', 'download_type', 'quality', 'priority', 'options', 'format_str',
+                 'output_files', 'state', 'downloaded', 'total', 'error', 'created_at', 'updated_at')
+
+    def __init__(self, row):
+        for name in self.__slots__:
+            setattr(self, name, row[name])
+        self.options = json.loads(self.options or '{}')
+        self.output_files = json.loads(self.output_files or '[]')
+
+    def partial_files(self):
+        """
+        Tìm các file tải dở mà yt-dlp (.part, .ytdl) hoặc bộ tải theo đoạn (.segpart, .segpart.ranges)
+        để lại cho công việc này
+
+        Returns:
+            list: Danh sách đường dẫn file tồn tại
+        """
+        found = set()
+        for filename in self.output_files:
+            stem = glob.escape(os.path.splitext(filename)[0])
+            for pattern in (f"{stem}*.part", f"{stem}*.ytdl", f"{stem}*.part-Frag*", f"{stem}*{PART_SUFFIX}",
+                            f"{stem}*{RANGES_SUFFIX}"):
+                found.update(glob.glob(pattern))
+        return sorted(found)
+
+    def partial_bytes(self):
+        """Tổng số byte đã tải trong các file tải dở"""
+        total = 0
+        for path in self.partial_files():
+            if path.endswith(RANGES_SUFFIX):
+                continue
+            if path.endswith(PART_SUFFIX):
+                # File tải theo đoạn được cấp phát trước đủ kích thước
+                total += partial_progress(path)
+                continue
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+
+class JobJournal:
+    """
+    Journal SQLite lưu URL, chuỗi định dạng, đường dẫn đầu ra và trạng thái của từng công việc
+
+    Được đăng ký làm listener của DownloadQueue. Thay đổi trạng thái/định dạng/file được ghi
+    ngay, còn số byte đã tải chỉ được ghi tối đa mỗi progress_interval giây để tránh ghi đĩa
+    liên tục. Công việc hoàn tất hoặc bị hủy được xóa khỏi journal.
+    """
+
+    def __init__(self, db_path=None, progress_interval=5.0):
+        """
+        Khởi tạo journal
+
+        Args:
+            db_path (str, optional): Đường dẫn file SQLite, mặc định ~/.lappytube/jobs.db
+            progress_interval (float): Khoảng thời gian tối thiểu giữa hai lần ghi tiến trình (giây)
+        """
+        self.db_path = db_path or os.path.join(get_app_data_dir(), 'jobs.db')
+        self.progress_interval = progress_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            # Journal tạo từ phiên bản cũ chưa có cột priority
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if 'priority' not in columns:
+                self._conn.execute(
+                    f"ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT {JobPriority.NORMAL}")
+        self._seen = {}  # job id -> (trạng thái, format_str, số file, mức ưu tiên, thời điểm ghi tiến trình)
+
+    def close(self):
+        """Đóng kết nối cơ sở dữ liệu"""
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Ghi
+    # ------------------------------------------------------------------
+    def on_job_event(self, job):
+        """Listener cho DownloadQueue"""
+        journal_id = job.metadata.get('journal_id')
+        if journal_id is None:
+            journal_id = self._insert(job)
+            job.metadata['journal_id'] = journal_id
+
+        now = time.monotonic()
+        previous = self._seen.get(job.id)
+        key = (job.state, job.format_str, len(job.output_files), job.priority)
+        if previous is not None and previous[:4] == key and now - previous[4] < self.progress_interval:
+            return
+        self._seen[job.id] = key + (now,)
+
+        if job.state in (JobState.DONE, JobState.CANCELLED):
+            self.remove(journal_id)
+            self._seen.pop(job.id, None)
+            return
+
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE jobs SET state=?, priority=?, format_str=COALESCE(?, format_str), output_files=?, "
+                    "downloaded=?, total=?, error=?, updated_at=? WHERE id=?",
+                    (job.state, job.priority, job.format_str, json.dumps(job.output_files, ensure_ascii=False),
+                     int(job.downloaded or 0), int(job.total or 0), job.error, time.time(), journal_id)
+                )
+
+    def _insert(self, job):
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT INTO jobs (url, save_path, download_type, quality, priority, options, format_str, "
+                    "state, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job.url, job.save_path, job.download_type, job.quality, job.priority,
+                     json.dumps(self._serializable_options(job.options)), job.format_str,
+                     job.state, now, now)
+                )
+                return cursor.lastrowid
+
+    @staticmethod
+    def _serializable_options(options):
+        # Không lưu các tham số không ghi được ra JSON (ví dụ info đã trích xuất)
+        return {key: value for key, value in options.items()
+                if key != 'info' and isinstance(value, (str, int, float, bool, type(None)))}
+
+    def remove(self, journal_id):
+        """Xóa một công việc khỏi journal"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM jobs WHERE id=?", (journal_id,))
+
+    # ------------------------------------------------------------------
+    # Đọc và tiếp tục
+    # ------------------------------------------------------------------
+    def interrupted(self):
+        """
+        Danh sách công việc bị gián đoạn từ các lần chạy trước
+
+        Returns:
+            list: Danh sách JournalEntry theo thứ tự thêm vào
+        """
+        placeholders = ','.join('?' * len(INTERRUPTED_STATES))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE state IN ({placeholders}) ORDER BY id", INTERRUPTED_STATES
+            ).fetchall()
+        return [JournalEntry(row) for row in rows]
+
+    def resume(self, queue, entries=None):
+        """
+        Đưa các công việc bị gián đoạn trở lại hàng đợi
+
+        Chuỗi định dạng đã ghi được dùng lại (format_override) để yt-dlp chọn đúng các định dạng
+        cũ và tiếp tục từ các file .part còn trên đĩa; công việc giữ mức ưu tiên đã ghi.
+
+        Args:
+            queue (DownloadQueue): Hàng đợi tải xuống
+            entries (list, optional): Các JournalEntry cần tiếp tục, mặc định là tất cả
+
+        Returns:
+            list: Các DownloadJob đã được thêm vào hàng đợi
+        """
+        if entries is None:
+            entries = self.interrupted()
+        jobs = []
+        for entry in entries:
+            options = dict(entry.options)
+            if entry.format_str:
+                options['format_override'] = entry.format_str
+            jobs.append(queue.submit(entry.url, entry.save_path, entry.download_type, entry.quality,
+                                     metadata={'journal_id': entry.id, 'resumed': True},
+                                     priority=entry.priority, **options))
+        return jobs
+
+    def discard(self, entries=None, delete_partial_files=False):
+        """
+        Bỏ các công việc bị gián đoạn khỏi journal
+
+        Args:
+            entries (list, optional): Các JournalEntry cần bỏ, mặc định là tất cả
+            delete_partial_files (bool): Có xóa luôn các file tải dở hay không
+        """
+        if entries is None:
+            entries = self.interrupted()
+        for entry in entries:
+            if delete_partial_files:
+                for path in entry.partial_files():
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        logger.warning("Không thể xóa file tải dở %s: %s", path, e)
+            self.remove(entry.id)
@@ -0,0 +1,247 @@
+"""
+Module bộ đệm media cục bộ: lưu các luồng đơn (chỉ video hoặc chỉ audio) đã tải theo ID video + ID định dạng
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+from src.utils.helpers import get_app_data_dir
+
+logger = logging.getLogger(__name__)
+
+# ioctl FICLONE của Linux (btrfs, xfs, ...): tạo bản sao copy-on-write không tốn thêm dung lượng
+_FICLONE = 0x40049409
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS streams (
+    key TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    format_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_streams_last_used ON streams(last_used);
+"""
+
+
+def stream_key(video_id, format_id):
+    """Khóa của một luồng trong bộ đệm"""
+    return f"{video_id}|{format_id}"
+
+
+def is_elementary(fmt):
+    """Định dạng chỉ có video hoặc chỉ có audio (luồng đơn dùng lại được khi ghép)"""
+    return (fmt.get('vcodec') == 'none') != (fmt.get('acodec') == 'none')
+
+
+def _reflink(source, target):
+    """Sao chép copy-on-write (chỉ Linux, cùng hệ thống file hỗ trợ reflink)"""
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl
+    try:
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        return True
+    except OSError:
+        try:
+            os.remove(target)
+        except OSError:
+            pass
+        return False
+
+
+def link_or_copy(source, target):
+    """
+    Đặt một bản của source tại target mà tốn ít I/O nhất
+
+    Thử reflink (copy-on-write), rồi hard link, cuối cùng mới sao chép nội dung.
+
+    Returns:
+        str: Cách đã dùng: 'reflink', 'hardlink' hoặc 'copy'
+    """
+    temp = f"{target}.{os.getpid()}.tmp"
+    try:
+        if _reflink(source, temp):
+            method = 'reflink'
+        else:
+            try:
+                os.link(source, temp)
+                method = 'hardlink'
+            except OSError:
+                shutil.copyfile(source, temp)
+                method = 'copy'
+        os.replace(temp, target)
+        return method
+    finally:
+        if os.path.exists(temp):
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+
+
+class MediaCache:
+    """
+    Bộ đệm các luồng media đã tải, dùng chung giữa các lượt tải (và giữa nhiều người nếu đặt
+    thư mục trên ổ dùng chung)
+
+    Mỗi luồng được đánh địa chỉ theo ID video + ID định dạng, nên tải cùng video ở chất lượng
+    khác hoặc vào thư mục khác sẽ dùng lại các luồng đã có thay vì tải lại qua mạng. File được
+    đưa ra thư mục đích bằng reflink/hard link khi có thể. Tổng dung lượng bị giới hạn bởi
+    max_size; khi vượt quá, các luồng lâu không dùng nhất bị xóa trước (LRU). Chỉ mục lưu
+    trong SQLite (index.db trong thư mục bộ đệm).
+    """
+
+    def __init__(self, root=None, max_size=10 * 1024 * 1024 * 1024):
+        """
+        Khởi tạo
+
+        Args:
+            root (str, optional): Thư mục bộ đệm, mặc định ~/.lappytube/media
+            max_size (int): Dung lượng tối đa (byte)
+        """
+        self.root = root or get_app_data_dir('media')
+        os.makedirs(self.root, exist_ok=True)
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.root, 'index.db'), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        """Đóng kết nối cơ sở dữ liệu"""
+        with self._lock:
+            self._conn.close()
+
+    def _path_for(self, key, ext):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest[:2], f"{digest}.{ext or 'bin'}")
+
+    def get(self, video_id, format_id):
+        """
+        Tìm luồng trong bộ đệm và đánh dấu vừa được dùng
+
+        Returns:
+            str: Đường dẫn file trong bộ đệm, hoặc None nếu chưa có
+        """
+        key = stream_key(video_id, format_id)
+        with self._lock:
+            row = self._conn.execute("SELECT path, size FROM streams WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            try:
+                valid = os.path.getsize(row['path']) == row['size']
+            except OSError:
+                valid = False
+            with self._conn:
+                if not valid:
+                    # File bị xóa/hỏng bên ngoài: bỏ khỏi chỉ mục
+                    self._conn.execute("DELETE FROM streams WHERE key=?", (key,))
+                    return None
+                self._conn.execute("UPDATE streams SET last_used=? WHERE key=?", (time.time(), key))
+            return row['path']
+
+    def has(self, video_id, format_id):
+        """Luồng đã có trong bộ đệm hay chưa"""
+        return self.get(video_id, format_id) is not None
+
+    def put(self, video_id, format_id, path, ext=None, move=False):
+        """
+        Đưa một luồng vừa tải vào bộ đệm
+
+        Args:
+            video_id (str): ID video (kèm extractor để không trùng giữa các trang)
+            format_id (str): ID định dạng của yt-dlp
+            path (str): File vừa tải
+            ext (str, optional): Phần mở rộng, mặc định lấy từ path
+            move (bool): Chuyển file vào bộ đệm thay vì liên kết/sao chép
+
+        Returns:
+            str: Đường dẫn trong bộ đệm, hoặc None nếu file lớn hơn dung lượng cho phép
+        """
+        size = os.path.getsize(path)
+        if self.max_size <= 0 or size > self.max_size:
+            return None
+        key = stream_key(video_id, format_id)
+        target = self._path_for(key, ext or os.path.splitext(path)[1].lstrip('.'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if move:
+            try:
+                os.replace(path, target)
+            except OSError:
+                # Khác ổ đĩa
+                shutil.copyfile(path, target)
+                os.remove(path)
+        else:
+            link_or_copy(path, target)
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO streams (key, video_id, format_id, path, size, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, video_id, str(format_id), target, size, now, now)
+                )
+            self._evict(keep=key)
+        logger.debug("Đã lưu luồng %s vào bộ đệm (%d byte)", key, size)
+        return target
+
+    def materialize(self, video_id, format_id, target):
+        """
+        Đặt luồng trong bộ đệm tại target (reflink/hard link, sao chép nếu khác ổ)
+
+        Returns:
+            bool: True nếu luồng có trong bộ đệm và đã được đặt tại target
+        """
+        path = self.get(video_id, format_id)
+        if path is None:
+            return False
+        try:
+            method = link_or_copy(path, target)
+        except OSError as e:
+            logger.warning("Không thể lấy luồng %s từ bộ đệm: %s", stream_key(video_id, format_id), e)
+            return False
+        logger.info("Dùng lại luồng %s từ bộ đệm (%s)", stream_key(video_id, format_id), method)
+        return True
+
+    def size(self):
+        """Tổng dung lượng các luồng trong bộ đệm (byte)"""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM streams").fetchone()[0]
+
+    def set_max_size(self, max_size):
+        """Đổi dung lượng tối đa, xóa bớt ngay nếu đang vượt"""
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def _evict(self, keep=None):
+        """Xóa các luồng lâu không dùng nhất cho tới khi không vượt max_size (cần giữ self._lock)"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM streams").fetchone()[0]
+        if total <= self.max_size:
+            return
+        rows = self._conn.execute("SELECT key, path, size FROM streams ORDER BY last_used").fetchall()
+        with self._conn:
+            for row in rows:
+                if total <= self.max_size:
+                    break
+                if row['key'] == keep:
+                    continue
+                try:
+                    os.remove(row['path'])
+                except OSError:
+                    pass
+                self._conn.execute("DELETE FROM streams WHERE key=?", (row['key'],))
+                total -= row['size']
+                logger.debug("Xóa luồng %s khỏi bộ đệm", row['key'])
@@ -0,0 +1,292 @@
+"""
+Module đo thời gian từng giai đoạn tải xuống và xuất số liệu (Prometheus text hoặc JSON)
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from src.utils.helpers import format_filesize
+
+logger = logging.getLogger(__name__)
+
+# Các giai đoạn truyền dữ liệu qua mạng, dùng để tính thông lượng của một công việc
+NETWORK_PHASES = ('download', 'segmented', 'stream_audio')
+
+
+class JobMetrics:
+    """
+    Số liệu của một công việc: thời gian từng giai đoạn và các bộ đếm
+
+    Giai đoạn được đo bằng span() hoặc begin()/end(). Các span lồng nhau chỉ tính thời gian
+    riêng (không gồm span con) cho giai đoạn cha, ví dụ 'download' không gồm 'merge' do yt-dlp
+    chạy bên trong. Một giai đoạn chạy nhiều lần thì thời gian được cộng dồn. Khi gắn với
+    MetricsRegistry (bind), mỗi span và bộ đếm cũng được cộng vào số liệu tổng.
+    """
+
+    def __init__(self, registry=None):
+        """
+        Khởi tạo
+
+        Args:
+            registry (MetricsRegistry, optional): Nơi gom số liệu của mọi công việc
+        """
+        self.registry = registry
+        self.phases = {}  # tên giai đoạn -> số giây (thời gian riêng)
+        self.counters = {}  # tên -> giá trị
+        self._stack = []  # các [tên, thời điểm bắt đầu, thời gian của span con]
+        self._lock = threading.Lock()
+
+    def bind(self, registry):
+        """Gắn với registry nếu chưa gắn"""
+        if self.registry is None:
+            self.registry = registry
+        return self
+
+    def begin(self, name):
+        """Bắt đầu một giai đoạn"""
+        with self._lock:
+            self._stack.append([name, time.monotonic(), 0.0])
+
+    def end(self, name):
+        """
+        Kết thúc giai đoạn gần nhất có tên name (các span con còn mở cũng được đóng)
+
+        Returns:
+            float: Thời gian riêng của giai đoạn (giây), None nếu giai đoạn chưa bắt đầu
+        """
+        now = time.monotonic()
+        closed = []
+        with self._lock:
+            if not any(frame[0] == name for frame in self._stack):
+                return None
+            while True:
+                frame_name, started, children = self._stack.pop()
+                elapsed = now - started
+                own = max(0.0, elapsed - children)
+                self.phases[frame_name] = self.phases.get(frame_name, 0.0) + own
+                if self._stack:
+                    self._stack[-1][2] += elapsed
+                closed.append((frame_name, own))
+                if frame_name == name:
+                    break
+        if self.registry is not None:
+            for frame_name, own in closed:
+                self.registry.observe(frame_name, own)
+        return closed[-1][1]
+
+    def span(self, name):
+        """Context manager đo một giai đoạn, vẫn ghi nhận khi có ngoại lệ"""
+        return _Span(self, name)
+
+    def count(self, name, value=1):
+        """Cộng vào một bộ đếm (ví dụ 'bytes', 'retries')"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        if self.registry is not None:
+            self.registry.inc(name, value)
+
+    def report(self):
+        """
+        Báo cáo của công việc
+
+        Returns:
+            dict: {'phases': {giai đoạn: giây}, 'counters': {...}, 'total': tổng số giây,
+                'throughput': byte/giây trong các giai đoạn mạng (0 nếu chưa có)}
+        """
+        with self._lock:
+            phases = {name: round(seconds, 3) for name, seconds in self.phases.items()}
+            counters = dict(self.counters)
+            network = sum(self.phases.get(name, 0.0) for name in NETWORK_PHASES)
+        return {
+            'phases': phases,
+            'counters': counters,
+            'total': round(sum(phases.values()), 3),
+            'throughput': int(counters.get('bytes', 0) / network) if network > 0 else 0,
+        }
+
+
+def format_report(report):
+    """
+    Một dòng tóm tắt báo cáo của công việc, giai đoạn lâu nhất đứng trước
+
+    Args:
+        report (dict): Kết quả của JobMetrics.report()
+
+    Returns:
+        str: Ví dụ "download 12.40s · merge 1.10s · extract 0.85s | 5.20 MB/s, 2 lần thử lại"
+    """
+    phases = sorted(report['phases'].items(), key=lambda item: item[1], reverse=True)
+    text = ' · '.join(f"{name} {seconds:.2f}s" for name, seconds in phases if seconds >= 0.01) or "chưa có số liệu"
+    extras = []
+    if report['throughput']:
+        extras.append(f"{format_filesize(report['throughput'])}/s")
+    retries = report['counters'].get('retries', 0)
+    if retries:
+        extras.append(f"{retries} lần thử lại")
+    throttled = report['counters'].get('throttle_seconds', 0)
+    if throttled >= 0.01:
+        extras.append(f"giới hạn băng thông {throttled:.1f}s")
+    return f"{text} | {', '.join(extras)}" if extras else text
+
+
+class _Span:
+    __slots__ = ('metrics', 'name')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.metrics.begin(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.end(self.name)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Số liệu tổng hợp của mọi công việc trong tiến trình
+
+    Với mỗi giai đoạn: số lần, tổng và lớn nhất của thời gian; các bộ đếm cộng dồn; số công
+    việc kết thúc theo trạng thái. Dùng làm listener của DownloadQueue (on_job_event) để đếm
+    công việc và thời gian chờ trong hàng đợi. Có thể xuất dạng Prometheus text (để node
+    exporter textfile collector đọc) hoặc JSON, ghi nguyên tử ra file.
+    """
+
+    def __init__(self, prefix='lappytube'):
+        """
+        Khởi tạo
+
+        Args:
+            prefix (str): Tiền tố tên các metric Prometheus
+        """
+        self.prefix = prefix
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._phases = {}  # tên -> [số lần, tổng giây, lớn nhất]
+        self._counters = {}
+        self._jobs = {}  # trạng thái -> số công việc
+        self._recorded = set()  # id công việc đã đếm
+        self._export_stop = None
+        self._export_thread = None
+
+    def observe(self, phase, seconds):
+        """Ghi nhận một lần chạy của giai đoạn"""
+        with self._lock:
+            stat = self._phases.setdefault(phase, [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] = max(stat[2], seconds)
+
+    def inc(self, name, value=1):
+        """Cộng vào bộ đếm"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def on_job_event(self, job):
+        """Listener cho DownloadQueue: đếm công việc đã kết thúc và thời gian chờ của chúng"""
+        if not job.is_finished:
+            return
+        with self._lock:
+            if job.id in self._recorded:
+                return
+            self._recorded.add(job.id)
+            self._jobs[job.state] = self._jobs.get(job.state, 0) + 1
+        if job.wait_time:
+            self.observe('queue_wait', job.wait_time)
+
+    def snapshot(self):
+        """
+        Số liệu hiện tại
+
+        Returns:
+            dict: {'uptime', 'phases': {giai đoạn: {'count', 'sum', 'max', 'avg'}}, 'counters', 'jobs'}
+        """
+        with self._lock:
+            phases = {
+                name: {'count': count, 'sum': round(total, 3), 'max': round(peak, 3),
+                       'avg': round(total / count, 3) if count else 0.0}
+                for name, (count, total, peak) in sorted(self._phases.items())
+            }
+            return {
+                'uptime': round(time.time() - self.started_at, 3),
+                'phases': phases,
+                'counters': dict(sorted(self._counters.items())),
+                'jobs': dict(sorted(self._jobs.items())),
+            }
+
+    def render_prometheus(self):
+        """Số liệu dạng Prometheus text exposition"""
+        data = self.snapshot()
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_phase_seconds Thời gian theo giai đoạn tải xuống",
+            f"# TYPE {p}_phase_seconds summary",
+        ]
+        for name, stat in data['phases'].items():
+            lines.append(f'{p}_phase_seconds_sum{{phase="{name}"}} {stat["sum"]}')
+            lines.append(f'{p}_phase_seconds_count{{phase="{name}"}} {stat["count"]}')
+        lines.append(f"# TYPE {p}_phase_seconds_max gauge")
+        for name, stat in data['phases'].items():
+            lines.append(f'{p}_phase_seconds_max{{phase="{name}"}} {stat["max"]}')
+        for name, value in data['counters'].items():
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            lines.append(f"{p}_{name}_total {value}")
+        lines.append(f"# TYPE {p}_jobs_total counter")
+        for state, value in data['jobs'].items():
+            lines.append(f'{p}_jobs_total{{state="{state}"}} {value}')
+        lines.append(f"# TYPE {p}_uptime_seconds gauge")
+        lines.append(f"{p}_uptime_seconds {data['uptime']}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Ghi số liệu ra file (JSON nếu phần mở rộng là .json, ngược lại Prometheus text)
+
+        Returns:
+            bool: True nếu ghi thành công
+        """
+        if path.lower().endswith('.json'):
+            data = json.dumps(self.snapshot(), indent=2, ensure_ascii=False)
+        else:
+            data = self.render_prometheus()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            return True
+        except OSError as e:
+            logger.warning("Không thể ghi file số liệu %s: %s", path, e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+    def start_export(self, path, interval=10.0):
+        """Ghi số liệu ra path định kỳ trên một luồng nền (tới khi gọi stop_export)"""
+        self.stop_export()
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                self.write(path)
+
+        self._export_stop = stop
+        self._export_thread = threading.Thread(target=loop, name="metrics-export", daemon=True)
+        self._export_thread.start()
+
+    def stop_export(self):
+        """Dừng luồng ghi định kỳ"""
+        if self._export_stop is not None:
+            self._export_stop.set()
+            self._export_thread.join()
+        self._export_stop = None
+        self._export_thread = None
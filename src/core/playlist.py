@@ -0,0 +1,179 @@
+"""
+Module mở rộng danh sách phát / kênh thành danh sách video
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from src.core.thumbnails import thumbnail_url
+
+
+# Các dạng URL YouTube trỏ tới danh sách phát hoặc kênh
+_COLLECTION_URL_RE = re.compile(
+    r'youtube\.com/(?:playlist\?|@[^/?#]+|channel/|c/|user/)'
+    r'|[?&]list=(?!RD|UL)[0-9A-Za-z_-]+'
+)
+
+# Giới hạn độ sâu khi danh sách phát chứa danh sách phát khác (ví dụ các tab của kênh)
+_MAX_NESTING = 2
+
+
+def is_collection_url(url):
+    """
+    Kiểm tra URL có phải danh sách phát/kênh hay không
+
+    URL dạng watch?v=...&list=... vẫn được coi là danh sách phát, trừ các danh sách
+    tự động (mix "RD..."), vốn là vô hạn.
+
+    Args:
+        url (str): URL cần kiểm tra
+
+    Returns:
+        bool: True nếu là danh sách phát hoặc kênh
+    """
+    return bool(_COLLECTION_URL_RE.search(url or ''))
+
+
+def _entry_url(entry):
+    url = entry.get('webpage_url') or entry.get('url') or ''
+    if url and not re.match(r'^https?://', url) and entry.get('ie_key') == 'Youtube':
+        url = f"https://www.youtube.com/watch?v={url}"
+    return url
+
+
+class PlaylistExpander:
+    """
+    Liệt kê video của danh sách phát/kênh ở chế độ flat và lấy thông tin chi tiết song song
+
+    Danh sách được liệt kê dần theo từng trang (yt-dlp trả về generator khi process=False)
+    nên các video đầu tiên được báo ngay mà không cần chờ liệt kê xong. Thông tin định dạng
+    của từng video được lấy trong một thread pool có giới hạn qua YouTubeDownloader.extract_info,
+    kết quả nằm sẵn trong bộ đệm để bước tải xuống không phải trích xuất lại.
+    """
+
+    def __init__(self, downloader, max_workers=4, resolve=True):
+        """
+        Khởi tạo
+
+        Args:
+            downloader (YouTubeDownloader): Downloader dùng để lấy thông tin chi tiết
+            max_workers (int): Số luồng lấy thông tin chi tiết đồng thời
+            resolve (bool): Có lấy thông tin định dạng của từng video hay không
+        """
+        self.downloader = downloader
+        self.max_workers = max(1, int(max_workers))
+        self.resolve = resolve
+        self.flat_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'skip_download': True,
+            'extract_flat': 'in_playlist',
+            'lazy_playlist': True,
+        }
+
+    def iter_entries(self, url, should_stop=None):
+        """
+        Liệt kê các video của danh sách phát/kênh (chế độ flat, không lấy định dạng)
+
+        Args:
+            url (str): URL danh sách phát hoặc kênh
+            should_stop (callable, optional): Trả về True để dừng liệt kê
+
+        Yields:
+            dict: {'index', 'id', 'url', 'title', 'duration', 'uploader', 'playlist_title', 'thumbnail'}
+        """
+        with self.downloader.sessions.session(self.flat_opts) as ydl:
+            result = self._resolve_url_result(ydl, ydl.extract_info(url, download=False, process=False))
+            index = 0
+            for entry in self._walk(ydl, result, result.get('title'), 0):
+                if should_stop and should_stop():
+                    return
+                index += 1
+                entry['index'] = index
+                yield entry
+
+    def _resolve_url_result(self, ydl, result):
+        # Kết quả dạng 'url' (ví dụ URL kênh chuyển hướng tới tab Videos) cần trích xuất tiếp
+        while result and result.get('_type') in ('url', 'url_transparent'):
+            result = ydl.extract_info(result['url'], download=False, process=False,
+                                      ie_key=result.get('ie_key'))
+        return result or {}
+
+    def _walk(self, ydl, result, playlist_title, depth):
+        if result.get('_type') not in ('playlist', 'multi_video'):
+            # Bản thân URL là một video đơn
+            if result.get('id'):
+                yield self._make_entry(result, playlist_title)
+            return
+
+        for entry in result.get('entries') or []:
+            if not entry:
+                continue
+            entry_type = entry.get('_type', 'video')
+            is_nested = entry_type == 'playlist' or (
+                entry_type == 'url' and entry.get('ie_key') not in (None, 'Youtube')
+                and is_collection_url(entry.get('url')))
+            if is_nested:
+                if depth >= _MAX_NESTING:
+                    continue
+                if entry_type == 'url':
+                    entry = self._resolve_url_result(ydl, entry)
+                yield from self._walk(ydl, entry, entry.get('title') or playlist_title, depth + 1)
+            else:
+                yield self._make_entry(entry, playlist_title)
+
+    def _make_entry(self, entry, playlist_title):
+        return {
+            'index': 0,
+            'id': entry.get('id'),
+            'url': _entry_url(entry),
+            'title': entry.get('title') or entry.get('id') or 'Unknown',
+            'duration': entry.get('duration') or 0,
+            'uploader': entry.get('uploader') or entry.get('channel') or '',
+            'playlist_title': playlist_title or '',
+            'thumbnail': thumbnail_url(entry),
+        }
+
+    def expand(self, url, on_entry=None, on_resolved=None, on_error=None, should_stop=None):
+        """
+        Liệt kê và lấy thông tin chi tiết của toàn bộ danh sách phát (chặn đến khi xong)
+
+        Các callback được gọi ngay khi có kết quả: on_entry từ luồng gọi hàm này,
+        on_resolved/on_error từ các luồng trong pool.
+
+        Args:
+            url (str): URL danh sách phát hoặc kênh
+            on_entry (callable, optional): on_entry(entry) khi liệt kê được một video
+            on_resolved (callable, optional): on_resolved(entry, info) khi đã có thông tin chi tiết
+            on_error (callable, optional): on_error(entry, message) khi lấy thông tin thất bại
+            should_stop (callable, optional): Trả về True để dừng sớm
+
+        Returns:
+            list: Danh sách các entry đã liệt kê
+        """
+        entries = []
+        pool = ThreadPoolExecutor(max_workers=self.max_workers) if self.resolve else None
+
+        def resolve(entry):
+            # Tác vụ chỉ chạy khi tới lượt trong pool, các video bị dừng sớm sẽ không được lấy
+            if should_stop and should_stop():
+                return
+            try:
+                info = self.downloader.extract_info(entry['url'])
+                if on_resolved:
+                    on_resolved(entry, info)
+            except Exception as e:
+                if on_error:
+                    on_error(entry, str(e))
+
+        try:
+            for entry in self.iter_entries(url, should_stop):
+                entries.append(entry)
+                if on_entry:
+                    on_entry(entry)
+                if pool is not None and entry['url']:
+                    pool.submit(resolve, entry)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=bool(should_stop and should_stop()))
+        return entries
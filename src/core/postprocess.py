@@ -0,0 +1,295 @@
+"""
+Module hậu xử lý file sau khi tải (chuyển sang mp4/mp3) bằng ffmpeg trên một pool riêng
+"""
+
+import concurrent.futures
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Codec có thể chép thẳng (remux) vào file mp4 mà không cần mã hóa lại
+MP4_VIDEO_CODECS = ('h264', 'hevc', 'av1', 'vp9', 'mpeg4')
+MP4_AUDIO_CODECS = ('aac', 'mp3', 'alac', 'ac3', 'eac3')
+
+# Bộ mã hóa H.264 phần cứng, theo thứ tự ưu tiên; libx264 là phương án cuối cùng
+HARDWARE_H264_ENCODERS = ('h264_nvenc', 'h264_qsv', 'h264_amf', 'h264_videotoolbox')
+
+
+def _bundled_tool(name):
+    """Đường dẫn công cụ đi kèm ứng dụng trong assets/bin"""
+    if getattr(sys, 'frozen', False):
+        # Nếu ứng dụng đã được đóng gói bằng PyInstaller
+        base_path = sys._MEIPASS
+    else:
+        # Nếu đang chạy từ mã nguồn
+        base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    return os.path.join(base_path, 'assets', 'bin', f'{name}.exe')
+
+
+def find_ffmpeg(ffmpeg_path=None):
+    """
+    Tìm ffmpeg: đường dẫn chỉ định, bản đi kèm trong assets/bin, rồi đến PATH
+
+    Args:
+        ffmpeg_path (str, optional): Đường dẫn do người dùng chỉ định
+
+    Returns:
+        str: Đường dẫn ffmpeg, hoặc None nếu không tìm thấy
+    """
+    if ffmpeg_path:
+        return ffmpeg_path if os.path.exists(ffmpeg_path) else None
+    bundled = _bundled_tool('ffmpeg')
+    if os.path.exists(bundled):
+        return bundled
+    logger.warning("Không tìm thấy ffmpeg tại %s", bundled)
+    found = shutil.which('ffmpeg')
+    if found:
+        logger.info("Đã tìm thấy ffmpeg trong PATH: %s", found)
+    return found
+
+
+def find_ffprobe(ffmpeg_path=None):
+    """
+    Tìm ffprobe, ưu tiên file nằm cạnh ffmpeg
+
+    Returns:
+        str: Đường dẫn ffprobe, hoặc None nếu không tìm thấy
+    """
+    if ffmpeg_path:
+        directory, name = os.path.split(ffmpeg_path)
+        candidate = os.path.join(directory, name.replace('ffmpeg', 'ffprobe'))
+        if candidate != ffmpeg_path and os.path.exists(candidate):
+            return candidate
+    bundled = _bundled_tool('ffprobe')
+    if os.path.exists(bundled):
+        return bundled
+    return shutil.which('ffprobe')
+
+
+def probe_streams(path, ffprobe_path):
+    """
+    Đọc danh sách luồng (video/audio) của file bằng ffprobe
+
+    Args:
+        path (str): File cần đọc
+        ffprobe_path (str): Đường dẫn ffprobe
+
+    Returns:
+        list: Các dict {'codec_type', 'codec_name'}, hoặc None nếu không đọc được
+    """
+    if not ffprobe_path:
+        return None
+    try:
+        result = subprocess.run(
+            [ffprobe_path, '-v', 'error', '-show_entries', 'stream=codec_type,codec_name',
+             '-of', 'json', path],
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60
+        )
+        return json.loads(result.stdout.decode('utf-8', 'replace')).get('streams') or []
+    except (OSError, subprocess.SubprocessError, ValueError) as e:
+        logger.warning("Không thể đọc thông tin luồng của %s: %s", path, e)
+        return None
+
+
+def _codecs(streams, codec_type):
+    return [s.get('codec_name') for s in streams if s.get('codec_type') == codec_type]
+
+
+def plan_mp4(streams, video_encoder='libx264'):
+    """
+    Quyết định chép thẳng hay mã hóa lại từng loại luồng khi chuyển sang mp4
+
+    Args:
+        streams (list): Kết quả probe_streams, None nếu không đọc được
+        video_encoder (str): Bộ mã hóa dùng khi phải mã hóa lại video
+
+    Returns:
+        tuple: (các tham số codec cho ffmpeg, True nếu chỉ cần remux)
+    """
+    if streams is None:
+        # Không có ffprobe: giữ video, chuyển audio sang AAC như trước đây
+        return ['-c:v', 'copy', '-c:a', 'aac'], False
+
+    video = _codecs(streams, 'video')
+    audio = _codecs(streams, 'audio')
+    copy_video = all(codec in MP4_VIDEO_CODECS for codec in video)
+    copy_audio = all(codec in MP4_AUDIO_CODECS for codec in audio)
+    args = ['-c:v', 'copy' if copy_video else video_encoder,
+            '-c:a', 'copy' if copy_audio else 'aac']
+    return args, copy_video and copy_audio
+
+
+def plan_mp3(streams, bitrate=192):
+    """
+    Quyết định chép thẳng hay mã hóa lại audio khi chuyển sang mp3
+
+    Returns:
+        tuple: (các tham số codec cho ffmpeg, True nếu chỉ cần remux)
+    """
+    if streams is not None and _codecs(streams, 'audio') == ['mp3']:
+        return ['-vn', '-c:a', 'copy'], True
+    return ['-vn', '-c:a', 'libmp3lame', '-b:a', f'{int(bitrate)}k'], False
+
+
+class PostProcessor:
+    """
+    Hậu xử lý file tải về trên một pool luồng riêng, kích thước theo số nhân CPU
+
+    Tách khỏi luồng tải xuống để mạng không phải chờ ffmpeg: hàng đợi có thể bắt đầu tải
+    video tiếp theo trong khi video trước đang được ghép/chuyển định dạng. Với mỗi file,
+    ffprobe cho biết codec nguồn để chỉ mã hóa lại khi container đích không chứa được.
+    """
+
+    def __init__(self, ffmpeg_path=None, max_workers=None):
+        """
+        Khởi tạo
+
+        Args:
+            ffmpeg_path (str, optional): Đường dẫn ffmpeg, mặc định tự tìm
+            max_workers (int, optional): Số file xử lý đồng thời, mặc định một nửa số nhân CPU
+        """
+        self.ffmpeg_path = ffmpeg_path
+        cpu_count = os.cpu_count() or 2
+        self.max_workers = max(1, int(max_workers or cpu_count // 2))
+        # Chia đều số nhân cho các tiến trình ffmpeg chạy song song khi mã hóa lại
+        self.threads_per_job = max(1, cpu_count // self.max_workers)
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._video_encoders = {}  # ffmpeg_path -> danh sách bộ mã hóa H.264 khả dụng
+
+    def submit(self, input_file, download_type="video", audio_bitrate=None, ffmpeg_path=None,
+               should_stop=None, on_start=None):
+        """
+        Đưa một file vào pool hậu xử lý
+
+        Args:
+            on_start (callable, optional): Được gọi (không tham số) khi pool bắt đầu xử lý file
+
+        Returns:
+            concurrent.futures.Future: Kết quả là đường dẫn file cuối cùng
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="postprocess")
+            executor = self._executor
+        if on_start is None:
+            return executor.submit(self.process, input_file, download_type, audio_bitrate,
+                                   ffmpeg_path, should_stop)
+
+        def task():
+            on_start()
+            return self.process(input_file, download_type, audio_bitrate, ffmpeg_path, should_stop)
+
+        return executor.submit(task)
+
+    def shutdown(self, wait=True):
+        """Dừng pool hậu xử lý"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def process(self, input_file, download_type="video", audio_bitrate=None, ffmpeg_path=None,
+                should_stop=None):
+        """
+        Chuyển file sang mp4 (video) hoặc mp3 (audio), chạy đồng bộ trên luồng hiện tại
+
+        Args:
+            input_file (str): File vừa tải về
+            download_type (str): "video" hoặc "audio"
+            audio_bitrate (int, optional): Bitrate mp3 (kbps), mặc định 192
+            ffmpeg_path (str, optional): Đường dẫn ffmpeg, mặc định dùng của PostProcessor
+            should_stop (callable, optional): Trả về True để dừng ffmpeg giữa chừng
+
+        Returns:
+            str: Đường dẫn file kết quả (là input_file nếu không cần hoặc không thể xử lý)
+        """
+        ffmpeg_path = find_ffmpeg(ffmpeg_path or self.ffmpeg_path)
+        if not ffmpeg_path:
+            logger.warning("Không có ffmpeg, giữ nguyên file %s", input_file)
+            return input_file
+
+        streams = probe_streams(input_file, find_ffprobe(ffmpeg_path))
+        if download_type == "audio":
+            ext = '.mp3'
+            args, remux = plan_mp3(streams, audio_bitrate or 192)
+        else:
+            ext = '.mp4'
+            encoders = self._hardware_encoders(ffmpeg_path)
+            args, remux = plan_mp4(streams, encoders[0] if encoders else 'libx264')
+
+        # Không đọc được luồng (thiếu ffprobe): file đã đúng phần mở rộng thì giữ nguyên như trước,
+        # không mã hóa lại audio chỉ vì không biết codec
+        if (remux or streams is None) and input_file.lower().endswith(ext):
+            return input_file
+
+        output_file = os.path.splitext(input_file)[0] + ext
+        try:
+            self._run_ffmpeg(ffmpeg_path, input_file, output_file, args, remux, should_stop)
+        except subprocess.CalledProcessError:
+            # Bộ mã hóa phần cứng có trong bản build nhưng thiết bị không hỗ trợ: dùng libx264
+            if download_type == "audio" or 'copy' in args[:2] or args[1] == 'libx264':
+                raise
+            logger.warning("Bộ mã hóa %s lỗi, chuyển sang libx264", args[1])
+            self._video_encoders[ffmpeg_path] = []
+            args[1] = 'libx264'
+            self._run_ffmpeg(ffmpeg_path, input_file, output_file, args, remux, should_stop)
+
+        if os.path.abspath(output_file) != os.path.abspath(input_file):
+            os.remove(input_file)
+        return output_file
+
+    def _run_ffmpeg(self, ffmpeg_path, input_file, output_file, args, remux, should_stop):
+        stem, ext = os.path.splitext(output_file)
+        temp_file = f"{stem}.temp{ext}"
+        command = [ffmpeg_path, '-y', '-v', 'error', '-i', input_file] + args
+        if not remux:
+            command += ['-threads', str(self.threads_per_job)]
+        if ext == '.mp4':
+            command += ['-movflags', '+faststart']
+        command.append(temp_file)
+
+        logger.debug("Chạy ffmpeg (%s): %s", 'remux' if remux else 'transcode', command)
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        try:
+            while True:
+                try:
+                    _, stderr = process.communicate(timeout=0.5)
+                    break
+                except subprocess.TimeoutExpired:
+                    if should_stop and should_stop():
+                        process.kill()
+                        process.communicate()
+                        raise Exception("Đã hủy hậu xử lý")
+            if process.returncode != 0 or not os.path.exists(temp_file) or not os.path.getsize(temp_file):
+                raise subprocess.CalledProcessError(process.returncode, command,
+                                                    stderr=stderr.decode('utf-8', 'replace'))
+            os.replace(temp_file, output_file)
+        finally:
+            if os.path.exists(temp_file):
+                try:
+                    os.remove(temp_file)
+                except OSError:
+                    pass
+
+    def _hardware_encoders(self, ffmpeg_path):
+        """Các bộ mã hóa H.264 phần cứng mà bản ffmpeg này được build kèm"""
+        if ffmpeg_path not in self._video_encoders:
+            encoders = []
+            try:
+                result = subprocess.run([ffmpeg_path, '-hide_banner', '-encoders'], check=True,
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=30)
+                output = result.stdout.decode('utf-8', 'replace')
+                encoders = [name for name in HARDWARE_H264_ENCODERS if f' {name} ' in output]
+            except (OSError, subprocess.SubprocessError) as e:
+                logger.warning("Không thể liệt kê bộ mã hóa của ffmpeg: %s", e)
+            self._video_encoders[ffmpeg_path] = encoders
+        return self._video_encoders[ffmpeg_path]
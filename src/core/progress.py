@@ -0,0 +1,91 @@
+"""
+Module gom và điều tiết thông báo tiến trình tải xuống
+"""
+
+import collections
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressAggregator:
+    """
+    Gom các cập nhật tiến trình theo từng công việc và phát ra với tần suất cố định
+
+    yt-dlp gọi progress hook rất dày (mỗi khối dữ liệu của mỗi fragment), nên thay vì
+    chuyển tiếp từng lần gọi, aggregator chỉ đánh dấu công việc là "đã thay đổi" và một
+    luồng nền phát danh sách các công việc thay đổi mỗi `interval` giây qua publish(jobs).
+    Thay đổi trạng thái (bắt đầu, hoàn tất, lỗi...) được phát ngay để không bị trễ.
+    """
+
+    def __init__(self, publish, interval=1.0):
+        """
+        Khởi tạo
+
+        Args:
+            publish (callable): Hàm nhận danh sách DownloadJob đã thay đổi
+            interval (float): Khoảng thời gian giữa hai lần phát (giây)
+        """
+        self.publish = publish
+        self.interval = max(0.05, float(interval))
+
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        self._dirty = collections.OrderedDict()  # id -> DownloadJob
+        self._published_states = {}  # id -> trạng thái đã phát gần nhất
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Khởi động luồng phát định kỳ"""
+        if self._thread is not None:
+            return self
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._loop, name="progress-aggregator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Dừng luồng phát định kỳ và phát nốt các cập nhật còn lại"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def set_interval(self, interval):
+        """Thay đổi tần suất phát (giây)"""
+        self.interval = max(0.05, float(interval))
+        self._wake.set()
+
+    def on_job_event(self, job):
+        """Listener cho DownloadQueue: chỉ ghi nhận, không phát ngay trừ khi trạng thái đổi"""
+        with self._lock:
+            self._dirty[job.id] = job
+            state_changed = self._published_states.get(job.id) != job.state
+        if state_changed:
+            self.flush()
+
+    def flush(self):
+        """Phát ngay tất cả các cập nhật đang chờ"""
+        with self._publish_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                jobs = list(self._dirty.values())
+                self._dirty.clear()
+                for job in jobs:
+                    self._published_states[job.id] = job.state
+            try:
+                self.publish(jobs)
+            except Exception:
+                logger.exception("Lỗi khi phát cập nhật tiến trình")
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
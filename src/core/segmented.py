@@ -0,0 +1,525 @@
+"""
+Module tải một file đơn (định dạng progressive, không phân mảnh) qua nhiều kết nối HTTP Range
+"""
+
+import http.client
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+
+logger = logging.getLogger(__name__)
+
+# Giới hạn kích thước mỗi đoạn (byte); kích thước thực tế được điều chỉnh theo tốc độ của từng kết nối
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 32 * 1024 * 1024
+# Thời gian mong muốn để tải xong một đoạn (giây)
+TARGET_CHUNK_SECONDS = 2.0
+_MAX_REDIRECTS = 5
+# Đuôi file tạm khi tải theo đoạn; khác '.part' của yt-dlp để hai bên không dùng nhầm file của nhau
+# (file được cấp phát trước toàn số 0, yt-dlp sẽ coi là đã tải xong)
+PART_SUFFIX = '.segpart'
+RANGES_SUFFIX = PART_SUFFIX + '.ranges'
+
+
+class RangeNotSupported(Exception):
+    """Máy chủ không hỗ trợ tải theo Range"""
+
+
+class _Aborted(Exception):
+    """progress_hook đã ném ngoại lệ (ví dụ người dùng hủy), dừng mọi kết nối"""
+
+
+class SegmentedDownloadError(Exception):
+    """Tải theo đoạn thất bại"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def is_segmentable(info, min_size=0):
+    """
+    Kiểm tra định dạng đã chọn có thể tải theo đoạn hay không
+
+    Args:
+        info (dict): Thông tin video sau khi yt-dlp chọn định dạng (process_ie_result download=False)
+        min_size (int): Kích thước tối thiểu (byte) để tải nhiều kết nối, khi biết kích thước
+
+    Returns:
+        bool: True nếu là một file đơn tải qua http(s)
+    """
+    if info.get('requested_formats') or info.get('fragments') or not info.get('url'):
+        return False
+    if info.get('protocol') not in ('http', 'https'):
+        return False
+    size = info.get('filesize') or info.get('filesize_approx')
+    return not size or size >= min_size
+
+
+def partial_progress(tmp_path):
+    """
+    Số byte đã tải của một file .segpart dở dang, tính từ danh sách khoảng còn thiếu đi kèm
+
+    File được cấp phát trước đủ kích thước nên dung lượng trên đĩa không phản ánh phần đã tải.
+
+    Args:
+        tmp_path (str): Đường dẫn file .segpart
+
+    Returns:
+        int: Số byte đã tải, 0 nếu không có danh sách hợp lệ (lần sau sẽ tải lại từ đầu)
+    """
+    ranges_path = tmp_path[:-len(PART_SUFFIX)] + RANGES_SUFFIX if tmp_path.endswith(PART_SUFFIX) else None
+    try:
+        with open(ranges_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        total = int(data['total'])
+        return max(0, total - sum(int(end) - int(start) for start, end in data['ranges']))
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0
+
+
+class _Span:
+    """Một khoảng byte đang được một kết nối tải; end có thể bị thu hẹp khi kết nối khác chia việc"""
+
+    __slots__ = ('pos', 'end', 'attempts')
+
+    def __init__(self, pos, end, attempts=0):
+        self.pos = pos
+        self.end = end  # Không bao gồm
+        self.attempts = attempts
+
+
+class HttpConnection:
+    """Kết nối HTTP giữ lại giữa các đoạn của cùng một luồng (keep-alive)"""
+
+    def __init__(self, url, headers, timeout):
+        self.url = url
+        self.headers = headers
+        self.timeout = timeout
+        self._conn = None
+        self._netloc = None
+
+    def request(self, start, end=None):
+        """Gửi yêu cầu Range [start, end] (bao gồm end, None là đến hết file), tự theo chuyển hướng"""
+        url = self.url
+        for _ in range(_MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            conn_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+            if self._conn is None or self._netloc != (parts.scheme, parts.netloc):
+                self.close()
+                self._conn = conn_class(parts.netloc, timeout=self.timeout)
+                self._netloc = (parts.scheme, parts.netloc)
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+            headers = dict(self.headers)
+            headers['Range'] = f'bytes={start}-{"" if end is None else end}'
+            # Offset tính trên dữ liệu gốc nên không nhận dữ liệu nén
+            headers['Accept-Encoding'] = 'identity'
+            try:
+                self._conn.request('GET', path, headers=headers)
+                response = self._conn.getresponse()
+            except (http.client.HTTPException, OSError):
+                # Kết nối keep-alive có thể đã bị máy chủ đóng, mở lại một lần
+                self.close()
+                self._conn = conn_class(parts.netloc, timeout=self.timeout)
+                self._netloc = (parts.scheme, parts.netloc)
+                self._conn.request('GET', path, headers=headers)
+                response = self._conn.getresponse()
+            if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                response.read()
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                # Giữ URL sau chuyển hướng cho các đoạn tiếp theo
+                self.url = url
+                continue
+            return response
+        raise SegmentedDownloadError("Quá nhiều lần chuyển hướng")
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+
+class SegmentedDownloader:
+    """
+    Tải một file đơn qua nhiều kết nối HTTP Range song song
+
+    File tạm (.segpart) được cấp phát trước đủ kích thước và mỗi kết nối ghi trực tiếp vào đúng
+    vị trí của đoạn mình tải. Kích thước đoạn của từng kết nối được điều chỉnh theo tốc độ đo
+    được (nhắm khoảng TARGET_CHUNK_SECONDS mỗi đoạn); khi hết việc, kết nối rảnh chia đôi phần
+    còn lại của đoạn lớn nhất đang tải để không phải chờ một kết nối chậm ở cuối file. Mỗi
+    đoạn lỗi được thử lại từ byte chưa tải với thời gian chờ tăng dần.
+
+    progress_hook nhận dict giống progress hook của yt-dlp ('status', 'downloaded_bytes',
+    'total_bytes', 'speed', 'filename', 'tmpfilename'); các lần gọi được tuần tự hóa và một
+    ngoại lệ từ hook sẽ dừng toàn bộ lượt tải. Khi bị dừng như vậy (tạm dừng/hủy), file .segpart
+    được giữ lại cùng danh sách các khoảng byte chưa tải (.segpart.ranges) để lần sau tải tiếp.
+    """
+
+    def __init__(self, min_size=8 * 1024 * 1024, min_chunk=MIN_CHUNK_SIZE, max_chunk=MAX_CHUNK_SIZE,
+                 timeout=20):
+        """
+        Khởi tạo
+
+        Args:
+            min_size (int): File nhỏ hơn kích thước này (byte) được tải qua một kết nối
+            min_chunk (int): Kích thước đoạn nhỏ nhất (byte)
+            max_chunk (int): Kích thước đoạn lớn nhất (byte)
+            timeout (float): Thời gian chờ kết nối/đọc (giây)
+        """
+        self.min_size = min_size
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.timeout = timeout
+
+    def probe(self, url, headers=None):
+        """
+        Kiểm tra máy chủ có hỗ trợ Range và lấy kích thước file
+
+        Returns:
+            tuple: (kích thước file (byte), URL sau khi theo chuyển hướng)
+
+        Raises:
+            RangeNotSupported: Máy chủ trả về toàn bộ file thay vì một đoạn
+            SegmentedDownloadError: Lỗi HTTP (status chứa mã lỗi)
+        """
+        connection = HttpConnection(url, headers or {}, self.timeout)
+        try:
+            response = connection.request(0, 0)
+            response.read()
+            if response.status != 206:
+                if response.status >= 400:
+                    raise SegmentedDownloadError(f"HTTP {response.status}", response.status)
+                raise RangeNotSupported(f"Máy chủ trả về HTTP {response.status} cho yêu cầu Range")
+            content_range = response.getheader('Content-Range') or ''
+            total = content_range.rpartition('/')[2]
+            if not total.isdigit():
+                raise RangeNotSupported("Không rõ kích thước file")
+            return int(total), connection.url
+        finally:
+            connection.close()
+
+    def download(self, url, path, headers=None, connections=8, retries=10, progress_hook=None,
+                 read_size=256 * 1024, controller=None, on_retry=None):
+        """
+        Tải file về path
+
+        Args:
+            url (str): URL của file
+            path (str): Đường dẫn file đích
+            headers (dict, optional): HTTP header (ví dụ http_headers của định dạng yt-dlp)
+            connections (int): Số kết nối song song tối đa
+            retries (int): Số lần thử lại mỗi đoạn
+            progress_hook (callable, optional): Hàm nhận dict tiến trình như yt-dlp
+            read_size (int): Kích thước mỗi lần đọc từ socket (byte)
+            controller (AimdController, optional): Quyết định số kết nối trong lúc tải (thông lượng
+                do người gọi báo qua progress_hook); connections khi đó là số kết nối tối đa
+            on_retry (callable, optional): Được gọi (không tham số) mỗi lần một đoạn phải tải lại
+
+        Returns:
+            str: Đường dẫn file đã tải
+
+        Raises:
+            RangeNotSupported: Máy chủ không hỗ trợ Range (người gọi nên tải bằng cách khác)
+        """
+        headers = dict(headers or {})
+        total, url = self.probe(url, headers)
+        tmp_path = path + PART_SUFFIX
+        ranges_path = path + RANGES_SUFFIX
+        remaining = self._load_ranges(tmp_path, ranges_path, total)
+        done = total - sum(end - start for start, end in remaining) if remaining is not None else 0
+        hook_lock = threading.Lock()
+        state = {'downloaded': done, 'error': None, 'aborted': False, 'speed': 0,
+                 'sample': (time.monotonic(), done)}
+
+        def report(status, count=0):
+            with hook_lock:
+                state['downloaded'] += count
+                now = time.monotonic()
+                sample_time, sample_bytes = state['sample']
+                if now - sample_time >= 0.5:
+                    state['speed'] = (state['downloaded'] - sample_bytes) / (now - sample_time)
+                    state['sample'] = (now, state['downloaded'])
+                if not progress_hook:
+                    return
+                try:
+                    progress_hook({
+                        'status': status,
+                        'downloaded_bytes': state['downloaded'] if status == 'downloading' else total,
+                        'total_bytes': total,
+                        'speed': state['speed'],
+                        'filename': path,
+                        'tmpfilename': tmp_path,
+                    })
+                except Exception as e:
+                    if state['error'] is None:
+                        state['error'] = e
+                        state['aborted'] = True
+                    raise _Aborted()
+
+        if os.path.exists(path) and os.path.getsize(path) == total:
+            report('finished')
+            return path
+
+        if remaining is None:
+            # Cấp phát trước file đích để các kết nối ghi vào đúng vị trí
+            with open(tmp_path, 'wb') as f:
+                f.truncate(total)
+        else:
+            logger.debug("Tải tiếp %s: còn %d byte", tmp_path, total - done)
+
+        connections = max(1, min(int(connections), -(-total // self.min_chunk)))
+        if total < self.min_size:
+            connections = 1
+        scheduler = _Scheduler(total, self.min_chunk, self.max_chunk, retries, remaining)
+        workers = {}
+        if controller is not None:
+            # Từ đây số kết nối theo controller.target, controller được phép điều chỉnh
+            controller.engage()
+
+        def spawn(index):
+            # Kết nối có số thứ tự vượt số kết nối mong muốn sẽ dừng sau đoạn đang tải
+            retire = (lambda: index >= controller.target) if controller is not None else (lambda: False)
+            worker = threading.Thread(target=self._worker, name=f"segment-{index}",
+                                      args=(url, headers, tmp_path, scheduler, report, read_size, state,
+                                            retire, controller, on_retry), daemon=True)
+            workers[index] = worker
+            worker.start()
+
+        # Giữ số kết nối đang chạy bằng số mong muốn cho tới khi hết việc
+        while True:
+            alive = {index for index, worker in workers.items() if worker.is_alive()}
+            if state['error'] is None and scheduler.has_work():
+                wanted = min(connections, controller.target) if controller is not None else connections
+                for index in range(wanted):
+                    if index not in alive:
+                        spawn(index)
+            elif not alive:
+                break
+            time.sleep(0.1)
+
+        if state['error'] is not None:
+            if state['aborted']:
+                # Bị dừng từ bên ngoài: giữ phần đã tải để lần sau tải tiếp
+                self._save_ranges(ranges_path, total, scheduler.remaining())
+            else:
+                for leftover in (tmp_path, ranges_path):
+                    try:
+                        os.remove(leftover)
+                    except OSError:
+                        pass
+            raise state['error']
+
+        os.replace(tmp_path, path)
+        try:
+            os.remove(ranges_path)
+        except OSError:
+            pass
+        report('finished')
+        return path
+
+    @staticmethod
+    def discard_partial(path):
+        """
+        Xóa phần tải dở (.segpart, .segpart.ranges) của path, gọi trước khi chuyển sang tải bằng
+        cách khác để không còn file tạm bị bỏ rơi
+
+        Args:
+            path (str): Đường dẫn file đích
+        """
+        for leftover in (path + PART_SUFFIX, path + RANGES_SUFFIX):
+            try:
+                os.remove(leftover)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Không thể xóa file tạm %s: %s", leftover, e)
+
+    @staticmethod
+    def _load_ranges(tmp_path, ranges_path, total):
+        """Các khoảng byte còn thiếu của lần tải trước, None nếu phải tải lại từ đầu"""
+        try:
+            with open(ranges_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('total') != total or os.path.getsize(tmp_path) != total:
+                return None
+            return [(int(start), int(end)) for start, end in data['ranges'] if 0 <= start < end <= total]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    @staticmethod
+    def _save_ranges(ranges_path, total, ranges):
+        try:
+            with open(ranges_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({'total': total, 'ranges': ranges}, f)
+            os.replace(ranges_path + '.tmp', ranges_path)
+        except OSError as e:
+            logger.warning("Không thể lưu tiến trình tải %s: %s", ranges_path, e)
+
+    def _worker(self, url, headers, tmp_path, scheduler, report, read_size, state, retire, controller,
+                on_retry=None):
+        connection = HttpConnection(url, headers, self.timeout)
+        chunk_size = self.min_chunk * 4
+        try:
+            with open(tmp_path, 'r+b') as f:
+                while state['error'] is None and not retire():
+                    span = scheduler.take(chunk_size)
+                    if span is None:
+                        return
+                    started = time.monotonic()
+                    start = span.pos
+                    try:
+                        self._fetch(connection, scheduler, span, f, report, read_size, state)
+                    except _Aborted:
+                        return
+                    except Exception as e:
+                        connection.close()
+                        if controller is not None:
+                            controller.on_error()
+                        if isinstance(e, SegmentedDownloadError) and e.status in (401, 403, 404, 410):
+                            raise
+                        if not scheduler.retry(span):
+                            raise SegmentedDownloadError(f"Tải đoạn {span.pos}-{span.end} thất bại: {e}")
+                        logger.debug("Thử lại đoạn %d-%d (lần %d): %s", span.pos, span.end, span.attempts, e)
+                        if on_retry:
+                            on_retry()
+                        time.sleep(min(0.5 * 2 ** (span.attempts - 1), 10))
+                        continue
+                    finally:
+                        scheduler.release(span)
+                    # Đoạn tiếp theo nhắm khoảng TARGET_CHUNK_SECONDS với tốc độ vừa đo
+                    elapsed = time.monotonic() - started
+                    if elapsed > 0 and span.pos > start:
+                        rate = (span.pos - start) / elapsed
+                        chunk_size = int(min(self.max_chunk, max(self.min_chunk, rate * TARGET_CHUNK_SECONDS)))
+        except BaseException as e:
+            with scheduler.lock:
+                if state['error'] is None:
+                    state['error'] = e
+        finally:
+            connection.close()
+
+    def _fetch(self, connection, scheduler, span, f, report, read_size, state):
+        response = connection.request(span.pos, span.end - 1)
+        try:
+            if response.status != 206:
+                raise SegmentedDownloadError(f"HTTP {response.status}", response.status)
+            f.seek(span.pos)
+            while state['error'] is None:
+                # Đoạn có thể đã bị thu hẹp khi kết nối khác lấy bớt phần cuối
+                remaining = span.end - span.pos
+                if remaining <= 0:
+                    break
+                data = response.read(min(read_size, remaining))
+                if not data:
+                    raise SegmentedDownloadError("Kết nối bị đóng trước khi tải xong đoạn")
+                # Nhận phần dữ liệu còn thuộc đoạn (dưới khóa của scheduler, nên không chồng lên
+                # phần vừa bị kết nối khác lấy bớt) rồi mới ghi
+                count = scheduler.advance(span, len(data))
+                if count <= 0:
+                    break
+                try:
+                    f.write(data[:count])
+                except BaseException:
+                    scheduler.rewind(span, count)
+                    raise
+                report('downloading', count)
+        finally:
+            if span.pos < span.end or state['error'] is not None:
+                # Còn dữ liệu chưa đọc: không dùng lại kết nối này
+                connection.close()
+            else:
+                response.read()
+
+
+class _Scheduler:
+    """Chia file thành các đoạn cho các kết nối, kể cả chia lại đoạn đang tải và thử lại đoạn lỗi"""
+
+    def __init__(self, total, min_chunk, max_chunk, retries, remaining=None):
+        self.total = total
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.retries = retries
+        self.lock = threading.Lock()
+        self._next = 0
+        self._retry = []
+        self._active = set()
+        if remaining is not None:
+            # Tải tiếp: chỉ còn các khoảng chưa tải của lần trước
+            self._next = total
+            self._retry = [_Span(start, end) for start, end in reversed(remaining)]
+
+    def take(self, chunk_size):
+        with self.lock:
+            if self._retry:
+                span = self._retry.pop()
+            elif self._next < self.total:
+                end = min(self.total, self._next + chunk_size)
+                # Không để lại đoạn cuối quá nhỏ
+                if self.total - end < self.min_chunk:
+                    end = self.total
+                span = _Span(self._next, end)
+                self._next = end
+            else:
+                # Hết việc: lấy nửa sau của đoạn đang tải còn lại nhiều nhất
+                busiest = max(self._active, key=lambda s: s.end - s.pos, default=None)
+                if busiest is None or busiest.end - busiest.pos < 2 * self.min_chunk:
+                    return None
+                middle = busiest.pos + (busiest.end - busiest.pos) // 2
+                span = _Span(middle, busiest.end)
+                busiest.end = middle
+            self._active.add(span)
+            return span
+
+    def has_work(self):
+        """Còn đoạn chưa giao, đoạn cần thử lại hoặc đoạn đang tải đủ lớn để chia"""
+        with self.lock:
+            return (self._next < self.total or bool(self._retry)
+                    or any(span.end - span.pos >= 2 * self.min_chunk for span in self._active))
+
+    def advance(self, span, count):
+        """
+        Đánh dấu count byte tiếp theo của span là đã tải
+
+        Chia việc (take) đọc và thu hẹp span dưới cùng khóa, nên phần được nhận không bao giờ
+        nằm trong khoảng đã giao cho kết nối khác.
+
+        Returns:
+            int: Số byte thực sự thuộc span (đã cắt theo span.end hiện tại)
+        """
+        with self.lock:
+            count = max(0, min(count, span.end - span.pos))
+            span.pos += count
+            return count
+
+    def rewind(self, span, count):
+        """Trả lại count byte vừa nhận bằng advance() nhưng chưa ghi được"""
+        with self.lock:
+            span.pos -= count
+
+    def retry(self, span):
+        with self.lock:
+            span.attempts += 1
+            return span.attempts <= self.retries
+
+    def release(self, span):
+        # Phần chưa tải của đoạn (lỗi hoặc bị dừng) được giao lại sau
+        with self.lock:
+            self._active.discard(span)
+            if span.pos < span.end:
+                self._retry.append(span)
+
+    def remaining(self):
+        """Các khoảng byte [start, end) chưa tải"""
+        with self.lock:
+            ranges = [[span.pos, span.end] for span in self._retry + list(self._active) if span.pos < span.end]
+            if self._next < self.total:
+                ranges.append([self._next, self.total])
+            return sorted(ranges)
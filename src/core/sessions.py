@@ -0,0 +1,220 @@
+"""
+Module giữ các phiên yt_dlp.YoutubeDL dùng lại được giữa các lần phân tích và tải xuống
+"""
+
+import collections
+import contextlib
+import logging
+import threading
+import time
+
+from src.core.ytdlp_loader import load_yt_dlp
+
+logger = logging.getLogger(__name__)
+
+# Các tùy chọn được đặt lại cho từng lần mượn phiên thay vì làm khóa phân loại
+DYNAMIC_OPTIONS = ('format', 'progress_hooks', 'postprocessor_hooks', 'logger')
+
+
+def _freeze(value):
+    """Chuyển giá trị tùy chọn thành dạng hashable để làm khóa"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(item) for item in value)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return id(value)
+
+
+def profile_key(options):
+    """
+    Khóa phân loại (profile) của một bộ tùy chọn yt-dlp
+
+    Args:
+        options (dict): Tùy chọn yt-dlp
+
+    Returns:
+        tuple: Khóa hashable, không tính các tùy chọn trong DYNAMIC_OPTIONS
+    """
+    return _freeze({key: value for key, value in options.items() if key not in DYNAMIC_OPTIONS})
+
+
+class _Session:
+    """Một đối tượng YoutubeDL cùng các hook và logger của lượt mượn hiện tại"""
+
+    __slots__ = ('ydl', 'hooks', 'pp_hooks', 'uses', 'idle_since')
+
+    def __init__(self, options):
+        self.hooks = []
+        self.pp_hooks = []
+        self.uses = 0
+        self.idle_since = None
+        options = dict(options)
+        # Các hook cố định chuyển tiếp tới hook của lượt mượn hiện tại
+        options['progress_hooks'] = [self._dispatch]
+        options['postprocessor_hooks'] = [self._dispatch_pp]
+        options.pop('format', None)
+        self.ydl = load_yt_dlp().YoutubeDL(options)
+
+    def _dispatch(self, status):
+        for hook in self.hooks:
+            hook(status)
+
+    def _dispatch_pp(self, status):
+        for hook in self.pp_hooks:
+            hook(status)
+
+    def lease(self, options):
+        """Áp dụng các tùy chọn riêng của lượt mượn (DYNAMIC_OPTIONS)"""
+        if options.get('format') is not None:
+            self.ydl.params['format'] = options['format']
+        else:
+            self.ydl.params.pop('format', None)
+        # yt-dlp đọc params['logger'] mỗi lần ghi log nên đổi được giữa các lượt mượn
+        self.ydl.params['logger'] = options.get('logger') or logger
+        self.hooks = list(options.get('progress_hooks') or [])
+        self.pp_hooks = list(options.get('postprocessor_hooks') or [])
+
+    def unlease(self):
+        """Bỏ hook và logger của lượt mượn để phiên rảnh không giữ tham chiếu tới công việc cũ"""
+        self.hooks = []
+        self.pp_hooks = []
+        self.ydl.params['logger'] = logger
+
+    def close(self):
+        try:
+            self.ydl.close()
+        except Exception as e:
+            logger.debug("Lỗi khi đóng phiên yt-dlp: %s", e)
+
+
+class YoutubeDLPool:
+    """
+    Kho các phiên YoutubeDL đã "khởi động", phân loại theo bộ tùy chọn
+
+    Giữ lại một YoutubeDL giữa các lần gọi giúp dùng lại các extractor đã khởi tạo (kèm bộ
+    đệm player JS/chữ ký của YouTube), cookie và kết nối HTTP/TLS. YoutubeDL không an toàn
+    khi nhiều luồng dùng cùng lúc, nên mỗi phiên chỉ được cho một luồng mượn tại một thời
+    điểm; luồng khác cần phiên cùng loại sẽ được tạo phiên mới, và phiên rảnh được trả về
+    kho để luồng sau dùng tiếp. Phiên gặp lỗi trong lúc mượn bị đóng thay vì trả về kho.
+    """
+
+    def __init__(self, max_idle_per_profile=4, max_profiles=8, idle_timeout=15 * 60):
+        """
+        Khởi tạo
+
+        Args:
+            max_idle_per_profile (int): Số phiên rảnh tối đa giữ lại cho mỗi loại
+            max_profiles (int): Số loại tùy chọn tối đa được giữ phiên rảnh
+            idle_timeout (float): Phiên rảnh lâu hơn thời gian này (giây) sẽ bị đóng
+        """
+        self.max_idle_per_profile = max(1, int(max_idle_per_profile))
+        self.max_profiles = max(1, int(max_profiles))
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        self._idle = collections.OrderedDict()  # khóa -> list[_Session]
+        self.created = 0
+        self.reused = 0
+
+    @contextlib.contextmanager
+    def session(self, options):
+        """
+        Mượn một YoutubeDL phù hợp với bộ tùy chọn
+
+        Các tùy chọn trong DYNAMIC_OPTIONS ('format', các hook, 'logger') được áp dụng riêng cho
+        lượt mượn này và không làm phát sinh loại phiên mới.
+
+        Args:
+            options (dict): Tùy chọn yt-dlp
+
+        Yields:
+            yt_dlp.YoutubeDL: Đối tượng chỉ luồng hiện tại được dùng cho tới khi trả lại
+        """
+        key = profile_key(options)
+        session = self._acquire(key, options)
+        session.lease(options)
+        try:
+            yield session.ydl
+        except GeneratorExit:
+            # Người gọi dừng một generator (ví dụ liệt kê danh sách phát) giữa chừng: phiên vẫn dùng được
+            session.unlease()
+            self._release(key, session)
+            raise
+        except BaseException:
+            session.unlease()
+            session.close()
+            raise
+        session.unlease()
+        self._release(key, session)
+
+    def _acquire(self, key, options):
+        with self._lock:
+            self._expire_idle()
+            sessions = self._idle.get(key)
+            if sessions:
+                session = sessions.pop()
+                self._idle.move_to_end(key)
+                session.uses += 1
+                self.reused += 1
+                return session
+        # Logger của lượt mượn đầu tiên được dùng cả khi khởi tạo YoutubeDL
+        session = _Session(options)
+        session.uses = 1
+        with self._lock:
+            self.created += 1
+        return session
+
+    def _release(self, key, session):
+        to_close = []
+        with self._lock:
+            session.idle_since = time.monotonic()
+            sessions = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            sessions.append(session)
+            while len(sessions) > self.max_idle_per_profile:
+                to_close.append(sessions.pop(0))
+            while len(self._idle) > self.max_profiles:
+                _, evicted = self._idle.popitem(last=False)
+                to_close.extend(evicted)
+        for old in to_close:
+            old.close()
+
+    def _expire_idle(self):
+        # Gọi khi đang giữ khóa; đóng phiên ngay tại chỗ vì close() chỉ lưu cookie và đóng kết nối
+        if not self.idle_timeout:
+            return
+        deadline = time.monotonic() - self.idle_timeout
+        for key in list(self._idle):
+            sessions = self._idle[key]
+            expired = [session for session in sessions if session.idle_since < deadline]
+            for session in expired:
+                sessions.remove(session)
+                session.close()
+            if not sessions:
+                del self._idle[key]
+
+    def close(self):
+        """Đóng tất cả phiên rảnh (lưu cookie, đóng kết nối)"""
+        with self._lock:
+            sessions = [session for group in self._idle.values() for session in group]
+            self._idle.clear()
+        for session in sessions:
+            session.close()
+
+    def stats(self):
+        """
+        Thống kê sử dụng
+
+        Returns:
+            dict: {'created', 'reused', 'idle'}
+        """
+        with self._lock:
+            return {
+                'created': self.created,
+                'reused': self.reused,
+                'idle': sum(len(group) for group in self._idle.values()),
+            }
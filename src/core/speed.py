@@ -0,0 +1,282 @@
+"""
+Module ước lượng tốc độ tải và thời gian còn lại (ETA), dùng chung cho giao diện và dòng lệnh
+"""
+
+import math
+import threading
+import time
+
+
+def estimate_eta(remaining, speed):
+    """
+    Thời gian còn lại để tải remaining byte với tốc độ speed
+
+    Args:
+        remaining (int): Số byte còn lại
+        speed (float): Tốc độ (byte/giây)
+
+    Returns:
+        float: Số giây còn lại, None nếu chưa ước lượng được
+    """
+    if remaining is None or remaining < 0 or not speed or speed <= 0:
+        return None
+    return remaining / speed
+
+
+def format_eta(seconds):
+    """
+    Định dạng thời gian còn lại, ví dụ "0:42" hoặc "1:05:09"
+
+    Returns:
+        str: Chuỗi thời gian, "--:--" nếu chưa ước lượng được
+    """
+    if seconds is None or seconds != seconds or seconds == float('inf'):
+        return "--:--"
+    seconds = int(math.ceil(seconds))
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours > 0:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class SpeedEstimator:
+    """
+    Ước lượng tốc độ từ bộ đếm số byte đã tải, mỗi mẫu chỉ tốn O(1)
+
+    Tốc độ được tính từ chênh lệch số byte theo thời gian đo bằng time.monotonic(), không dựa
+    vào tốc độ do nguồn báo về, nên đúng ở mọi tốc độ (kể cả trên 1 Gbit/s). Các mẫu tới quá
+    dày (progress hook gọi sau mỗi khối dữ liệu) được gộp thành các ô cách nhau ít nhất
+    window/slots giây trong một ring buffer cố định:
+
+    - tốc độ cửa sổ: (byte mới nhất - byte ở ô cũ nhất) / khoảng thời gian giữa hai ô, tức trung
+      bình theo thời gian của khoảng window giây gần nhất;
+    - tốc độ hiển thị: EWMA theo thời gian (chu kỳ bán rã half_life giây) của tốc độ từng ô, mỗi
+      giá trị được chặn trong [1/outlier, outlier] lần tốc độ cửa sổ trước khi đưa vào (cắt
+      ngọn), nên một khối dữ liệu tới dồn hay một quãng ngắt quãng không làm số nhảy vọt.
+
+    Bộ đếm giảm (ví dụ yt-dlp chuyển sang tải luồng âm thanh sau luồng hình) được hiểu là một
+    luồng mới bắt đầu từ 0; số byte tích lũy vẫn tăng đều.
+    """
+
+    def __init__(self, window=5.0, slots=20, half_life=2.0, outlier=4.0):
+        """
+        Khởi tạo
+
+        Args:
+            window (float): Độ dài cửa sổ tính tốc độ trung bình (giây)
+            slots (int): Số ô của ring buffer
+            half_life (float): Chu kỳ bán rã của EWMA (giây)
+            outlier (float): Hệ số chặn các mẫu lệch quá xa tốc độ cửa sổ
+        """
+        self.slots = max(2, int(slots))
+        self.min_interval = window / self.slots
+        self.half_life = half_life
+        self.outlier = max(1.0, float(outlier))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Xóa toàn bộ mẫu"""
+        with self._lock:
+            self._times = [0.0] * self.slots
+            self._bytes = [0] * self.slots
+            self._head = 0  # vị trí ghi tiếp theo
+            self._count = 0
+            self._last = None  # giá trị bộ đếm lần trước
+            self._total = 0  # số byte tích lũy
+            self._ewma = 0.0
+            self._window_speed = 0.0
+
+    @property
+    def total(self):
+        """Số byte tích lũy đã ghi nhận"""
+        return self._total
+
+    def update(self, downloaded, now=None):
+        """
+        Ghi nhận giá trị mới của bộ đếm số byte đã tải
+
+        Args:
+            downloaded (int): Số byte đã tải của luồng hiện tại
+            now (float, optional): Thời điểm (time.monotonic()), mặc định là bây giờ
+
+        Returns:
+            float: Tốc độ ước lượng (byte/giây)
+        """
+        if now is None:
+            now = time.monotonic()
+        downloaded = downloaded or 0
+        with self._lock:
+            if self._last is not None:
+                self._total += downloaded - self._last if downloaded >= self._last else downloaded
+            self._last = downloaded
+            return self._sample(now)
+
+    def add(self, nbytes, now=None):
+        """
+        Cộng thêm nbytes vào số byte tích lũy (khi chỉ biết lượng tải thêm)
+
+        Returns:
+            float: Tốc độ ước lượng (byte/giây)
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self._total += max(0, nbytes)
+            return self._sample(now)
+
+    def speed(self):
+        """Tốc độ ước lượng hiện tại (byte/giây), đã làm mượt"""
+        with self._lock:
+            return self._current()
+
+    def window_speed(self):
+        """Tốc độ trung bình trong cửa sổ gần nhất (byte/giây)"""
+        with self._lock:
+            return self._window_speed
+
+    def eta(self, remaining):
+        """Thời gian còn lại (giây) để tải remaining byte, None nếu chưa ước lượng được"""
+        return estimate_eta(remaining, self.speed())
+
+    def _sample(self, now):
+        """Ghi một mẫu (cần giữ self._lock)"""
+        slots = self.slots
+        if self._count:
+            newest = (self._head - 1) % slots
+            elapsed = now - self._times[newest]
+            if elapsed < self.min_interval:
+                # Còn trong ô hiện tại: chỉ cập nhật tốc độ cửa sổ, chưa thêm mẫu mới
+                self._update_window(now)
+                return self._current()
+            rate = (self._total - self._bytes[newest]) / elapsed
+        else:
+            rate = None
+
+        self._times[self._head] = now
+        self._bytes[self._head] = self._total
+        self._head = (self._head + 1) % slots
+        self._count = min(self._count + 1, slots)
+        if rate is None:
+            return self._current()
+
+        reference = self._window_speed
+        self._update_window(now)
+        if self._count == 2:
+            # Mẫu đầu tiên: chưa có gì để làm mượt
+            self._ewma = rate
+        else:
+            if reference > 0:
+                rate = min(max(rate, reference / self.outlier), reference * self.outlier)
+            alpha = 1.0 - 0.5 ** (elapsed / self.half_life) if self.half_life > 0 else 1.0
+            self._ewma += alpha * (rate - self._ewma)
+        return self._ewma
+
+    def _current(self):
+        # Trước khi có mẫu EWMA đầu tiên, dùng tốc độ trung bình từ lúc bắt đầu
+        return self._ewma if self._count >= 2 else self._window_speed
+
+    def _update_window(self, now):
+        oldest = self._head if self._count == self.slots else 0
+        elapsed = now - self._times[oldest]
+        if elapsed > 0:
+            self._window_speed = (self._total - self._bytes[oldest]) / elapsed
+
+
+class ThroughputMeter:
+    """
+    Thông lượng tổng của nhiều công việc tải song song
+
+    Mỗi công việc báo bộ đếm số byte của nó qua update(); phần tăng thêm được cộng vào một bộ
+    đếm chung và sample() đưa bộ đếm chung vào một SpeedEstimator. Nhờ vậy tốc độ tổng là
+    lượng byte thực sự về máy trên một đơn vị thời gian, không phải tổng các tốc độ tức thời
+    (vốn lệch khi các công việc báo tiến trình vào những thời điểm khác nhau).
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Khởi tạo
+
+        Args:
+            **kwargs: Tham số của SpeedEstimator
+        """
+        self.estimator = SpeedEstimator(**kwargs)
+        self._lock = threading.Lock()
+        self._last = {}  # khóa công việc -> giá trị bộ đếm lần trước
+        self._finished = set()  # khóa các công việc đã kết thúc (đã tính xong)
+        self._pending = 0  # byte tải thêm chưa đưa vào estimator
+
+    def update(self, key, downloaded, baseline=0):
+        """
+        Ghi nhận bộ đếm số byte của một công việc
+
+        Bộ đếm giảm là luồng mới bắt đầu từ 0.
+
+        Args:
+            key: Khóa công việc
+            downloaded (int): Số byte đã tải của công việc
+            baseline (int, optional): Mốc tính cho lần đầu gặp công việc; None để lấy chính
+                downloaded làm mốc (công việc tải tiếp từ phiên trước, phần đã có sẵn không tính
+                vào thông lượng)
+        """
+        with self._lock:
+            if key in self._finished:
+                # Công việc chạy lại (ví dụ tải lại sau lỗi): phần tải ở lượt trước đã được tính
+                self._finished.discard(key)
+                baseline = None
+            self._count(key, downloaded, baseline)
+
+    def finish(self, key, downloaded, baseline=0):
+        """
+        Tính nốt số byte của một công việc đã kết thúc rồi bỏ theo dõi nó
+
+        Gọi lại nhiều lần cho cùng công việc không tính trùng. Tham số như update().
+        """
+        with self._lock:
+            if key in self._finished:
+                return
+            self._finished.add(key)
+            self._count(key, downloaded, baseline)
+            del self._last[key]
+
+    def _count(self, key, downloaded, baseline):
+        """Cộng phần tăng thêm của bộ đếm (cần giữ self._lock)"""
+        downloaded = downloaded or 0
+        last = self._last.get(key)
+        if last is None:
+            last = downloaded if baseline is None else baseline
+        self._last[key] = downloaded
+        self._pending += downloaded - last if downloaded >= last else downloaded
+
+    def sample(self, now=None):
+        """
+        Lấy mẫu bộ đếm chung (gọi định kỳ, sau mỗi đợt update)
+
+        Returns:
+            float: Thông lượng tổng ước lượng (byte/giây)
+        """
+        with self._lock:
+            pending, self._pending = self._pending, 0
+        return self.estimator.add(pending, now)
+
+    def speed(self):
+        """Thông lượng tổng hiện tại (byte/giây)"""
+        return self.estimator.speed()
+
+    def eta(self, remaining):
+        """Thời gian còn lại (giây) để tải remaining byte với thông lượng tổng hiện tại"""
+        return self.estimator.eta(remaining)
+
+    @property
+    def total(self):
+        """Tổng số byte đã ghi nhận"""
+        return self.estimator.total
+
+    def reset(self):
+        """Xóa toàn bộ trạng thái"""
+        with self._lock:
+            self._last.clear()
+            self._finished.clear()
+            self._pending = 0
+        self.estimator.reset()
@@ -0,0 +1,248 @@
+"""
+Module tách audio trực tiếp trong lúc tải: dữ liệu được đưa thẳng vào ffmpeg, không cần file trung gian
+"""
+
+import logging
+import os
+import subprocess
+import threading
+import time
+
+from src.core.postprocess import plan_mp3
+from src.core.segmented import HttpConnection, SegmentedDownloadError
+
+logger = logging.getLogger(__name__)
+
+# Container đọc được tuần tự từ pipe (không cần tua tới cuối file để đọc chỉ mục)
+STREAMABLE_EXTS = ('webm', 'weba', 'mka', 'ogg', 'opus', 'mp3', 'aac', 'flac', 'wav')
+_STDERR_LIMIT = 64 * 1024
+
+
+class StreamingError(Exception):
+    """Không tách audio trực tiếp được, người gọi nên tải file rồi hậu xử lý như bình thường"""
+
+
+class _Aborted(Exception):
+    """progress_hook đã ném ngoại lệ (ví dụ người dùng hủy)"""
+
+
+def is_streamable(info):
+    """
+    Kiểm tra định dạng audio đã chọn có thể tách trực tiếp trong lúc tải hay không
+
+    Args:
+        info (dict): Thông tin video sau khi yt-dlp chọn định dạng (process_ie_result download=False)
+
+    Returns:
+        bool: True nếu là một file đơn tải qua http(s) và container đọc được từ pipe
+    """
+    if info.get('requested_formats') or info.get('fragments') or not info.get('url'):
+        return False
+    if info.get('protocol') not in ('http', 'https'):
+        return False
+    # Định dạng DASH của YouTube (m4a_dash, webm_dash) đặt chỉ mục ở đầu file
+    container = info.get('container') or ''
+    return (info.get('ext') or '').lower() in STREAMABLE_EXTS or container.endswith('_dash')
+
+
+def source_codec(info):
+    """Tên codec audio theo kiểu ffprobe từ trường acodec của yt-dlp (ví dụ 'mp4a.40.2' -> 'mp4a')"""
+    acodec = (info.get('acodec') or '').lower()
+    if not acodec or acodec == 'none':
+        return None
+    return acodec.split('.')[0]
+
+
+class StreamingAudioExtractor:
+    """
+    Tải audio qua một kết nối HTTP và chuyển sang mp3 ngay khi dữ liệu về
+
+    Các byte nhận được được ghi thẳng vào stdin của ffmpeg, nên file mp3 xong gần như cùng lúc
+    với lượt tải và không có file trung gian lớn trên đĩa. Nếu nguồn đã là mp3 thì dữ liệu được
+    ghi thẳng ra file (không cần ffmpeg); nếu chỉ container khác thì ffmpeg chép luồng không mã
+    hóa lại. Kết nối bị ngắt được nối lại bằng Range từ byte đang dở.
+
+    progress_hook nhận dict giống progress hook của yt-dlp; một ngoại lệ từ hook sẽ dừng ffmpeg
+    và được ném lại nguyên vẹn.
+    """
+
+    def __init__(self, timeout=20, read_size=256 * 1024):
+        """
+        Khởi tạo
+
+        Args:
+            timeout (float): Thời gian chờ kết nối/đọc (giây)
+            read_size (int): Kích thước mỗi lần đọc từ socket (byte)
+        """
+        self.timeout = timeout
+        self.read_size = read_size
+
+    def extract(self, info, output_file, ffmpeg_path, bitrate=192, retries=10, progress_hook=None, copy_to=None,
+                on_retry=None):
+        """
+        Tải định dạng audio đã chọn và ghi ra output_file (mp3)
+
+        Args:
+            info (dict): Thông tin video sau khi chọn định dạng (xem is_streamable)
+            output_file (str): File mp3 đích
+            ffmpeg_path (str): Đường dẫn ffmpeg
+            bitrate (int): Bitrate mp3 (kbps) khi phải mã hóa lại
+            retries (int): Số lần nối lại khi kết nối bị ngắt
+            progress_hook (callable, optional): Hàm nhận dict tiến trình như yt-dlp
+            copy_to (str, optional): Đồng thời ghi luồng gốc ra file này (ví dụ để đưa vào bộ đệm media)
+            on_retry (callable, optional): Được gọi (không tham số) mỗi lần phải nối lại kết nối
+
+        Returns:
+            str: Đường dẫn file mp3
+
+        Raises:
+            StreamingError: Máy chủ/ffmpeg không xử lý được luồng, chưa có file nào được tạo
+        """
+        codec = source_codec(info)
+        args, remux = plan_mp3([{'codec_type': 'audio', 'codec_name': codec}] if codec else None, bitrate)
+        direct = remux and (info.get('ext') or '').lower() == 'mp3'
+
+        stem, ext = os.path.splitext(output_file)
+        temp_file = f"{output_file}.part" if direct else f"{stem}.temp{ext}"
+        if direct:
+            process = None
+            sink = open(temp_file, 'wb')
+        else:
+            command = [ffmpeg_path, '-y', '-v', 'error', '-i', 'pipe:0'] + args + ['-f', 'mp3', temp_file]
+            logger.debug("Chạy ffmpeg (%s, trực tiếp): %s", 'remux' if remux else 'transcode', command)
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.PIPE)
+            sink = process.stdin
+        copy_file = open(f"{copy_to}.part", 'wb') if copy_to else None
+        stderr = bytearray()
+        drain = None
+        if process is not None:
+            drain = threading.Thread(target=self._drain, args=(process.stderr, stderr), daemon=True)
+            drain.start()
+
+        completed = False
+        try:
+            try:
+                self._stream(info['url'], info.get('http_headers') or {}, sink, retries, output_file, temp_file,
+                             progress_hook, copy_file, on_retry)
+            except _Aborted as e:
+                raise e.__cause__
+            except BrokenPipeError:
+                # ffmpeg đã thoát (thường do không đọc được container), lỗi nằm trong stderr
+                pass
+            finally:
+                try:
+                    sink.close()
+                except OSError:
+                    pass
+                if copy_file is not None:
+                    copy_file.close()
+            if process is not None:
+                process.wait()
+                drain.join(timeout=5)
+                if process.returncode != 0 or not os.path.exists(temp_file) or not os.path.getsize(temp_file):
+                    raise StreamingError(f"ffmpeg lỗi ({process.returncode}): "
+                                         f"{stderr.decode('utf-8', 'replace').strip()}")
+            os.replace(temp_file, output_file)
+            if copy_file is not None:
+                os.replace(f"{copy_to}.part", copy_to)
+            completed = True
+            if progress_hook:
+                size = os.path.getsize(output_file)
+                progress_hook({'status': 'finished', 'downloaded_bytes': size, 'total_bytes': size,
+                               'filename': output_file, 'tmpfilename': temp_file})
+            return output_file
+        finally:
+            if process is not None and process.poll() is None:
+                process.kill()
+                process.wait()
+            if not completed:
+                for path in (temp_file, f"{copy_to}.part" if copy_to else None):
+                    if path and os.path.exists(path):
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+
+    def _stream(self, url, headers, sink, retries, output_file, temp_file, progress_hook, copy_file=None,
+                on_retry=None):
+        """Đọc toàn bộ file theo thứ tự và ghi vào sink, nối lại từ byte đang dở khi lỗi mạng"""
+        connection = HttpConnection(url, headers, self.timeout)
+        state = {'downloaded': 0, 'speed': 0, 'sample': (time.monotonic(), 0)}
+        total = None
+        attempts = 0
+        try:
+            while True:
+                try:
+                    response = connection.request(state['downloaded'])
+                    if response.status >= 400:
+                        response.read()
+                        raise SegmentedDownloadError(f"HTTP {response.status}", response.status)
+                    if response.status != 206 and state['downloaded']:
+                        # Không nối lại được giữa chừng: dữ liệu đã đưa vào ffmpeg không thể rút lại
+                        raise StreamingError(f"Máy chủ trả về HTTP {response.status} khi nối lại")
+                    if total is None:
+                        content_range = response.getheader('Content-Range') or ''
+                        length = content_range.rpartition('/')[2] if response.status == 206 \
+                            else response.getheader('Content-Length') or ''
+                        total = int(length) if length.isdigit() else None
+                    while True:
+                        data = response.read(self.read_size)
+                        if not data:
+                            break
+                        sink.write(data)
+                        if copy_file is not None:
+                            copy_file.write(data)
+                        self._report(progress_hook, state, len(data), total, output_file, temp_file)
+                    if total is None or state['downloaded'] >= total:
+                        return
+                    raise SegmentedDownloadError(f"Kết nối bị ngắt ở byte {state['downloaded']}/{total}")
+                except (_Aborted, StreamingError, BrokenPipeError):
+                    raise
+                except SegmentedDownloadError as e:
+                    if e.status in (401, 403, 404, 410):
+                        raise StreamingError(str(e))
+                    error = e
+                except Exception as e:
+                    error = e
+                attempts += 1
+                if attempts > retries:
+                    raise StreamingError(f"Tải luồng audio thất bại: {error}")
+                logger.debug("Nối lại luồng audio từ byte %d (lần %d): %s", state['downloaded'], attempts, error)
+                if on_retry:
+                    on_retry()
+                connection.close()
+                time.sleep(min(0.5 * 2 ** (attempts - 1), 10))
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _report(progress_hook, state, count, total, output_file, temp_file):
+        state['downloaded'] += count
+        now = time.monotonic()
+        sample_time, sample_bytes = state['sample']
+        if now - sample_time >= 0.5:
+            state['speed'] = (state['downloaded'] - sample_bytes) / (now - sample_time)
+            state['sample'] = (now, state['downloaded'])
+        if not progress_hook:
+            return
+        try:
+            progress_hook({
+                'status': 'downloading',
+                'downloaded_bytes': state['downloaded'],
+                'total_bytes': total or 0,
+                'speed': state['speed'],
+                'filename': output_file,
+                'tmpfilename': temp_file,
+            })
+        except Exception as e:
+            raise _Aborted() from e
+
+    @staticmethod
+    def _drain(pipe, buffer):
+        """Đọc stderr của ffmpeg để tiến trình không bị chặn, chỉ giữ phần cuối"""
+        for line in iter(pipe.readline, b''):
+            buffer.extend(line)
+            if len(buffer) > _STDERR_LIMIT:
+                del buffer[:-_STDERR_LIMIT]
+        pipe.close()
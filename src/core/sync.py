@@ -0,0 +1,215 @@
+"""
+Module đồng bộ tăng dần danh sách phát/kênh: chỉ tải các video mới kể từ lần đồng bộ trước
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from src.core.playlist import PlaylistExpander
+from src.utils.helpers import get_app_data_dir
+
+logger = logging.getLogger(__name__)
+
+# Tab video của kênh liệt kê video mới nhất trước, nên có thể dừng khi gặp lại video đã biết.
+# Danh sách phát thường thêm video vào cuối nên phải liệt kê hết (vẫn ở chế độ flat)
+_NEWEST_FIRST_RE = re.compile(r'youtube\.com/(?:@[^/?#]+|channel/|c/|user/)')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    url TEXT PRIMARY KEY,
+    seen_ids TEXT NOT NULL DEFAULT '[]',
+    pending TEXT NOT NULL DEFAULT '[]',
+    last_sync_at REAL,
+    last_new INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def is_newest_first(url):
+    """URL liệt kê video mới nhất trước (kênh) hay không"""
+    return bool(_NEWEST_FIRST_RE.search(url or ''))
+
+
+class SyncSource:
+    """Mốc (watermark) đồng bộ của một danh sách phát/kênh"""
+
+    __slots__ = ('url', 'seen_ids', 'pending', 'last_sync_at', 'last_new')
+
+    def __init__(self, url, seen_ids=None, pending=None, last_sync_at=None, last_new=0):
+        self.url = url
+        self.seen_ids = list(seen_ids or [])  # ID đã xử lý, mới nhất trước
+        self.pending = list(pending or [])  # URL tải thất bại ở lần trước, cần thử lại
+        self.last_sync_at = last_sync_at
+        self.last_new = last_new
+
+
+class SyncStore:
+    """Lưu mốc đồng bộ của từng nguồn trong SQLite (~/.lappytube/sync.db)"""
+
+    def __init__(self, db_path=None):
+        """
+        Khởi tạo
+
+        Args:
+            db_path (str, optional): Đường dẫn file SQLite, mặc định ~/.lappytube/sync.db
+        """
+        self.db_path = db_path or os.path.join(get_app_data_dir(), 'sync.db')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        """Đóng kết nối cơ sở dữ liệu"""
+        with self._lock:
+            self._conn.close()
+
+    def get(self, url):
+        """
+        Lấy mốc đồng bộ của một nguồn
+
+        Returns:
+            SyncSource: Mốc đã lưu, hoặc None nếu nguồn chưa từng được đồng bộ
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM sources WHERE url=?", (url,)).fetchone()
+        if row is None:
+            return None
+        return SyncSource(row['url'], json.loads(row['seen_ids']), json.loads(row['pending']),
+                          row['last_sync_at'], row['last_new'])
+
+    def save(self, source):
+        """Ghi mốc đồng bộ của một nguồn"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sources (url, seen_ids, pending, last_sync_at, last_new) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (source.url, json.dumps(source.seen_ids), json.dumps(source.pending, ensure_ascii=False),
+                     source.last_sync_at, source.last_new)
+                )
+
+    def sources(self):
+        """Danh sách URL các nguồn đã đồng bộ"""
+        with self._lock:
+            return [row['url'] for row in self._conn.execute("SELECT url FROM sources ORDER BY url")]
+
+
+class SyncPlan:
+    """Kết quả liệt kê một nguồn: các video cần tải và các ID đã thấy"""
+
+    __slots__ = ('url', 'entries', 'listed_ids', 'known', 'stopped_early')
+
+    def __init__(self, url):
+        self.url = url
+        self.entries = []  # entry (như PlaylistExpander.iter_entries) cần tải
+        self.listed_ids = []  # ID đã liệt kê, theo thứ tự của nguồn
+        self.known = 0  # Số video bỏ qua vì đã biết hoặc đã tải
+        self.stopped_early = False  # Dừng liệt kê khi gặp lại các video đã biết
+
+
+class ChannelSync:
+    """
+    Đồng bộ tăng dần danh sách phát/kênh
+
+    Mỗi nguồn có một mốc gồm các ID video đã xử lý. Nguồn được liệt kê ở chế độ flat (không
+    lấy định dạng); với kênh, việc liệt kê dừng ngay khi gặp known_streak video đã biết liên
+    tiếp, nên một lần đồng bộ không có video mới chỉ tải trang đầu tiên. Video chưa biết nhưng
+    đã có trong lịch sử tải xuống cũng được bỏ qua. Mốc chỉ được cập nhật qua commit() sau khi
+    tải xong; video tải thất bại được giữ lại để thử lại ở lần sau.
+    """
+
+    def __init__(self, downloader, store=None, history=None, known_streak=3, max_seen=500):
+        """
+        Khởi tạo
+
+        Args:
+            downloader (YouTubeDownloader): Downloader dùng để liệt kê nguồn
+            store (SyncStore, optional): Nơi lưu mốc đồng bộ
+            history (DownloadHistory, optional): Lịch sử dùng để bỏ qua video đã tải
+            known_streak (int): Số video đã biết liên tiếp để dừng liệt kê kênh
+            max_seen (int): Số ID tối đa giữ lại trong mốc của mỗi kênh
+        """
+        self.expander = PlaylistExpander(downloader, resolve=False)
+        self.store = store or SyncStore()
+        self.history = history
+        self.known_streak = max(1, int(known_streak))
+        self.max_seen = max(1, int(max_seen))
+
+    def plan(self, url, download_type="video", should_stop=None):
+        """
+        Liệt kê các video mới của một nguồn
+
+        Args:
+            url (str): URL danh sách phát hoặc kênh
+            download_type (str): "video" hoặc "audio" (dùng khi tra lịch sử)
+            should_stop (callable, optional): Trả về True để dừng liệt kê
+
+        Returns:
+            SyncPlan: Các video cần tải
+        """
+        plan = SyncPlan(url)
+        source = self.store.get(url)
+        known = set(source.seen_ids) if source else set()
+        stop_at_known = bool(known) and is_newest_first(url)
+
+        # Video thất bại ở lần trước được thử lại trước
+        pending = source.pending if source else []
+        for pending_url in pending:
+            plan.entries.append({'index': 0, 'id': None, 'url': pending_url, 'title': pending_url,
+                                 'duration': 0, 'uploader': '', 'playlist_title': ''})
+        pending = set(pending)
+
+        streak = 0
+        entries = self.expander.iter_entries(url, should_stop)
+        try:
+            for entry in entries:
+                video_id = entry.get('id')
+                if video_id:
+                    plan.listed_ids.append(video_id)
+                if video_id in known:
+                    plan.known += 1
+                    streak += 1
+                    if stop_at_known and streak >= self.known_streak:
+                        plan.stopped_early = True
+                        break
+                    continue
+                streak = 0
+                if not entry['url'] or entry['url'] in pending:
+                    continue
+                if self.history is not None and self.history.is_downloaded(entry['url'], download_type):
+                    plan.known += 1
+                    continue
+                plan.entries.append(entry)
+        finally:
+            # Dừng liệt kê ngay, không tải thêm trang nào của nguồn
+            entries.close()
+        return plan
+
+    def commit(self, plan, failed_urls=()):
+        """
+        Cập nhật mốc đồng bộ sau khi đã tải các video của plan
+
+        Args:
+            plan (SyncPlan): Kết quả của plan()
+            failed_urls (iterable): URL tải thất bại, sẽ được thử lại ở lần đồng bộ sau
+        """
+        previous = self.store.get(plan.url)
+        seen = list(plan.listed_ids)
+        listed = set(seen)
+        if previous is not None:
+            seen.extend(video_id for video_id in previous.seen_ids if video_id not in listed)
+        failed = sorted(set(failed_urls))
+        # Danh sách phát được liệt kê toàn bộ mỗi lần nên giữ lại mọi ID
+        if is_newest_first(plan.url):
+            seen = seen[:self.max_seen]
+        self.store.save(SyncSource(plan.url, seen, failed, time.time(), len(plan.entries)))
+        logger.info("Đồng bộ %s: %d video mới, %d đã biết, %d thất bại",
+                    plan.url, len(plan.entries), plan.known, len(failed))
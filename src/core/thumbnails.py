@@ -0,0 +1,259 @@
+"""
+Module tải ảnh thu nhỏ (thumbnail) của video: thu nhỏ một lần bằng Pillow và lưu trong bộ đệm đĩa LRU
+"""
+
+import collections
+import concurrent.futures
+import hashlib
+import io
+import logging
+import os
+import threading
+
+from src.utils.helpers import get_app_data_dir, is_video_id
+
+logger = logging.getLogger(__name__)
+
+# Kích thước hiển thị mặc định (16:9)
+DEFAULT_SIZE = (160, 90)
+
+
+def thumbnail_url(info, width=DEFAULT_SIZE[0]):
+    """
+    Chọn URL ảnh thu nhỏ phù hợp để hiển thị ở độ rộng width
+
+    Ưu tiên ảnh nhỏ nhất nhưng không nhỏ hơn width (đỡ tải và đỡ giải mã), sau đó tới trường
+    'thumbnail' của yt-dlp. Với entry flat của YouTube không có ảnh, dùng ảnh mqdefault theo ID.
+
+    Args:
+        info (dict): Thông tin video hoặc entry của danh sách phát từ yt-dlp
+        width (int): Độ rộng hiển thị (pixel)
+
+    Returns:
+        str: URL ảnh, None nếu không có
+    """
+    candidates = [t for t in info.get('thumbnails') or [] if t.get('url') and t.get('url').startswith('http')]
+    sized = [t for t in candidates if t.get('width')]
+    if sized:
+        large_enough = [t for t in sized if t['width'] >= width]
+        if large_enough:
+            return min(large_enough, key=lambda t: t['width'])['url']
+        return max(sized, key=lambda t: t['width'])['url']
+    if info.get('thumbnail'):
+        return info['thumbnail']
+    if candidates:
+        # Không rõ kích thước: yt-dlp sắp xếp từ kém tới tốt nhất
+        return candidates[-1]['url']
+    extractor = (info.get('ie_key') or info.get('extractor_key') or '').lower()
+    if extractor == 'youtube' and is_video_id(info.get('id')):
+        return f"https://i.ytimg.com/vi/{info['id']}/mqdefault.jpg"
+    return None
+
+
+def downscale(data, size):
+    """
+    Thu nhỏ ảnh về vừa khung size (giữ tỉ lệ) và mã hóa lại dạng JPEG
+
+    Args:
+        data (bytes): Ảnh gốc (JPEG, WebP, PNG...)
+        size (tuple): (rộng, cao) tối đa
+
+    Returns:
+        bytes: Ảnh JPEG đã thu nhỏ
+    """
+    # Nạp khi cần để không làm chậm lúc khởi động
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEG được giải mã thẳng ở độ phân giải thấp hơn (thu nhỏ trong miền DCT)
+        image.draft('RGB', size)
+        image = image.convert('RGB')
+        image.thumbnail(size, Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=85, optimize=True)
+    return output.getvalue()
+
+
+class ThumbnailCache:
+    """
+    Bộ đệm ảnh thu nhỏ trên đĩa, giới hạn dung lượng, xóa ảnh lâu không dùng nhất (LRU)
+
+    Mỗi ảnh là một file JPEG đặt tên theo băm của URL và kích thước. Thứ tự dùng được lưu qua
+    thời gian sửa đổi của file (được cập nhật khi đọc), nên vẫn đúng sau khi khởi động lại.
+    """
+
+    def __init__(self, root=None, max_size=100 * 1024 * 1024):
+        """
+        Khởi tạo
+
+        Args:
+            root (str, optional): Thư mục bộ đệm, mặc định ~/.lappytube/thumbs
+            max_size (int): Dung lượng tối đa (byte)
+        """
+        self.root = root or get_app_data_dir('thumbs')
+        os.makedirs(self.root, exist_ok=True)
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # tên file -> kích thước, cũ nhất trước
+        self._total = 0
+        files = []
+        for name in os.listdir(self.root):
+            if not name.endswith('.jpg'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total += size
+
+    @staticmethod
+    def _name(url, size):
+        return hashlib.sha1(f"{url}|{size[0]}x{size[1]}".encode('utf-8')).hexdigest() + '.jpg'
+
+    def get(self, url, size):
+        """
+        Đọc ảnh đã thu nhỏ
+
+        Returns:
+            bytes: Ảnh JPEG, None nếu chưa có
+        """
+        name = self._name(url, size)
+        path = os.path.join(self.root, name)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            with self._lock:
+                self._total -= self._entries.pop(name, 0)
+            return None
+
+    def put(self, url, size, data):
+        """Lưu ảnh đã thu nhỏ, xóa bớt ảnh cũ nếu vượt dung lượng"""
+        if len(data) > self.max_size:
+            return
+        name = self._name(url, size)
+        path = os.path.join(self.root, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug("Không thể lưu ảnh thu nhỏ %s: %s", url, e)
+            return
+        with self._lock:
+            self._total += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            while self._total > self.max_size and len(self._entries) > 1:
+                old_name, old_size = self._entries.popitem(last=False)
+                self._total -= old_size
+                try:
+                    os.remove(os.path.join(self.root, old_name))
+                except OSError:
+                    pass
+
+    def size(self):
+        """Tổng dung lượng các ảnh trong bộ đệm (byte)"""
+        with self._lock:
+            return self._total
+
+
+class ThumbnailFetcher:
+    """
+    Tải ảnh thu nhỏ bất đồng bộ trên một thread pool có giới hạn
+
+    Ảnh được tải một lần, thu nhỏ về kích thước hiển thị trên luồng nền rồi lưu vào bộ đệm
+    đĩa, nên giao diện chỉ phải giải mã ảnh JPEG nhỏ. Các ảnh vừa dùng được giữ trong bộ nhớ;
+    nhiều yêu cầu cùng một ảnh đang tải dùng chung một lượt tải. Yêu cầu chưa tới lượt có thể
+    hủy (Future.cancel) khi dòng tương ứng không còn hiển thị.
+    """
+
+    def __init__(self, cache=None, size=DEFAULT_SIZE, max_workers=4, memory_items=512, timeout=15):
+        """
+        Khởi tạo
+
+        Args:
+            cache (ThumbnailCache, optional): Bộ đệm đĩa, mặc định ~/.lappytube/thumbs
+            size (tuple): Kích thước hiển thị (rộng, cao)
+            max_workers (int): Số ảnh tải đồng thời
+            memory_items (int): Số ảnh giữ trong bộ nhớ
+            timeout (float): Thời gian chờ mỗi lượt tải (giây)
+        """
+        self.cache = cache if cache is not None else ThumbnailCache()
+        self.size = tuple(size)
+        self.timeout = timeout
+        self.memory_items = memory_items
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, int(max_workers)),
+                                                               thread_name_prefix="thumbnail")
+        self._lock = threading.Lock()
+        self._memory = collections.OrderedDict()  # url -> bytes
+        self._inflight = {}  # url -> Future
+        self._local = threading.local()
+
+    def fetch(self, url):
+        """
+        Lấy ảnh thu nhỏ của url
+
+        Returns:
+            concurrent.futures.Future: Kết quả là ảnh JPEG đã thu nhỏ (bytes), hoặc None nếu lỗi
+        """
+        with self._lock:
+            data = self._memory.get(url)
+            if data is not None:
+                self._memory.move_to_end(url)
+                future = concurrent.futures.Future()
+                future.set_result(data)
+                return future
+            future = self._inflight.get(url)
+            if future is not None and not future.cancelled():
+                return future
+            future = self._executor.submit(self._load, url)
+            self._inflight[url] = future
+        future.add_done_callback(lambda f: self._done(url, f))
+        return future
+
+    def close(self):
+        """Hủy các ảnh đang chờ và dừng thread pool"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _done(self, url, future):
+        with self._lock:
+            if self._inflight.get(url) is future:
+                del self._inflight[url]
+            if future.cancelled() or future.exception() is not None or future.result() is None:
+                return
+            self._memory[url] = future.result()
+            self._memory.move_to_end(url)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _session(self):
+        # Mỗi luồng một Session để dùng lại kết nối tới máy chủ ảnh
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+            session = self._local.session = requests.Session()
+        return session
+
+    def _load(self, url):
+        data = self.cache.get(url, self.size)
+        if data is not None:
+            return data
+        try:
+            response = self._session().get(url, timeout=self.timeout)
+            response.raise_for_status()
+            data = downscale(response.content, self.size)
+        except Exception as e:
+            logger.debug("Không thể tải ảnh thu nhỏ %s: %s", url, e)
+            return None
+        self.cache.put(url, self.size, data)
+        return data
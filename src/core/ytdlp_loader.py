@@ -0,0 +1,63 @@
+"""
+Module nạp yt-dlp khi cần để cửa sổ hiển thị trước khi hàng trăm extractor được import
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_module = None
+_load_seconds = None
+
+
+def load_yt_dlp():
+    """
+    Import yt-dlp ở lần gọi đầu tiên (an toàn khi nhiều luồng gọi cùng lúc)
+
+    Returns:
+        module: Module yt_dlp
+    """
+    global _module, _load_seconds
+    if _module is None:
+        with _lock:
+            if _module is None:
+                started = time.perf_counter()
+                import yt_dlp
+                _load_seconds = time.perf_counter() - started
+                logger.info("Đã nạp yt-dlp trong %.0f ms", _load_seconds * 1000)
+                _module = yt_dlp
+    return _module
+
+
+def is_loaded():
+    """yt-dlp đã được nạp hay chưa"""
+    return _module is not None
+
+
+def load_seconds():
+    """Thời gian nạp yt-dlp (giây), None nếu chưa nạp"""
+    return _load_seconds
+
+
+def warm_up():
+    """
+    Nạp yt-dlp trên một luồng nền để lần phân tích/tải đầu tiên không phải chờ
+
+    Returns:
+        threading.Thread: Luồng nạp, hoặc None nếu đã nạp xong
+    """
+    if _module is not None:
+        return None
+
+    def run():
+        try:
+            load_yt_dlp()
+        except Exception:
+            logger.exception("Không thể nạp yt-dlp")
+
+    thread = threading.Thread(target=run, name="yt-dlp-warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -2,8 +2,15 @@
 Điểm khởi chạy chính của ứng dụng LappyTube
 """
 
+import time
+
+# Mốc thời gian sớm nhất để đo thời gian từ lúc khởi động tới khi cửa sổ hiển thị
+_STARTED_AT = time.perf_counter()
+
 import sys
 import os
+import json
+import logging
 
 # Thêm thư mục gốc vào đường dẫn để có thể import các module
 base_path = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
@@ -12,6 +19,8 @@ if base_path not in sys.path:
 
 # Import các module cần thiết
 from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QTimer
+from src.utils.helpers import setup_logging
 try:
     from src.ui.main_window import MainWindow
 except ModuleNotFoundError:
@@ -29,13 +38,49 @@ except ModuleNotFoundError:
         spec.loader.exec_module(module)
         MainWindow = module.MainWindow
 
+logger = logging.getLogger('lappytube.startup')
+
+# Ngân sách thời gian khởi động (ms), có thể đổi bằng biến môi trường LAPPYTUBE_STARTUP_BUDGET_MS
+DEFAULT_STARTUP_BUDGET_MS = 1000
+
+def on_first_window_shown(app):
+    """
+    Được gọi ở vòng lặp sự kiện đầu tiên sau khi cửa sổ đã hiển thị
+    
+    Ghi lại thời gian khởi động, cảnh báo nếu vượt ngân sách, rồi mới nạp yt-dlp trên luồng nền.
+    Khi biến môi trường LAPPYTUBE_STARTUP_PROBE chứa đường dẫn file, kết quả đo được ghi vào
+    file đó dạng JSON và ứng dụng thoát ngay (dùng bởi src.startup_report).
+    """
+    elapsed_ms = (time.perf_counter() - _STARTED_AT) * 1000
+    budget_ms = float(os.environ.get('LAPPYTUBE_STARTUP_BUDGET_MS', DEFAULT_STARTUP_BUDGET_MS))
+    if elapsed_ms > budget_ms:
+        logger.warning("Cửa sổ hiển thị sau %.0f ms, vượt ngân sách %.0f ms", elapsed_ms, budget_ms)
+    else:
+        logger.info("Cửa sổ hiển thị sau %.0f ms", elapsed_ms)
+    
+    probe_path = os.environ.get('LAPPYTUBE_STARTUP_PROBE')
+    if probe_path:
+        with open(probe_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'first_window_ms': elapsed_ms,
+                'budget_ms': budget_ms,
+                'yt_dlp_loaded': 'yt_dlp' in sys.modules,
+            }, f)
+        app.quit()
+        return
+    
+    from src.core.ytdlp_loader import warm_up
+    warm_up()
+
 def main():
     """Hàm chính để khởi chạy ứng dụng"""
+    setup_logging()
     app = QApplication(sys.argv)
     app.setApplicationName("LappyTube")
     
     window = MainWindow()
     window.show()
+    QTimer.singleShot(0, lambda: on_first_window_shown(app))
     
     sys.exit(app.exec_())
 
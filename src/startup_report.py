@@ -0,0 +1,159 @@
+"""
+Báo cáo thời gian khởi động của LappyTube
+
+Gồm hai phần:
+- Thời gian import của cửa sổ chính (python -X importtime), liệt kê các module tốn thời gian
+  nhất và báo lỗi nếu yt-dlp bị import ngay lúc khởi động.
+- Thời gian tới khi cửa sổ đầu tiên hiển thị, đo nhiều lần khởi động lạnh và so với ngân sách.
+
+Ví dụ:
+    python -m src.startup_report --runs 5 --budget 1000
+    python -m src.startup_report --exe dist/LappyTube/LappyTube.exe
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Thêm thư mục gốc vào đường dẫn để có thể import các module
+base_path = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+if base_path not in sys.path:
+    sys.path.insert(0, base_path)
+
+# Các module không được phép nạp trước khi cửa sổ hiển thị
+DEFERRED_MODULES = ('yt_dlp',)
+
+
+def import_times(module='src.ui.main_window'):
+    """
+    Đo thời gian import bằng python -X importtime
+
+    Args:
+        module (str): Module cần import
+
+    Returns:
+        list: Các tuple (tên module, thời gian riêng µs, thời gian tích lũy µs, độ sâu)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=base_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    stderr = result.stderr.decode('utf-8', 'replace')
+    if result.returncode != 0:
+        raise RuntimeError(stderr.strip().splitlines()[-1] if stderr.strip() else "Import thất bại")
+
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def measure_first_window(exe=None, runs=3, timeout=60):
+    """
+    Khởi động ứng dụng nhiều lần và đo thời gian tới khi cửa sổ đầu tiên hiển thị
+
+    Args:
+        exe (str, optional): File thực thi đã đóng gói, mặc định chạy src/main.py
+        runs (int): Số lần khởi động
+        timeout (float): Thời gian chờ tối đa mỗi lần (giây)
+
+    Returns:
+        list: Mỗi phần tử là dict {'wall_ms', 'first_window_ms', 'yt_dlp_loaded'}
+    """
+    command = [exe] if exe else [sys.executable, os.path.join(base_path, 'src', 'main.py')]
+    env = dict(os.environ)
+    if sys.platform.startswith('linux') and not env.get('DISPLAY') and not env.get('WAYLAND_DISPLAY'):
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    samples = []
+    for _ in range(runs):
+        fd, probe_path = tempfile.mkstemp(prefix='lappytube-startup-', suffix='.json')
+        os.close(fd)
+        env['LAPPYTUBE_STARTUP_PROBE'] = probe_path
+        try:
+            started = time.perf_counter()
+            subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                           timeout=timeout, check=True)
+            wall_ms = (time.perf_counter() - started) * 1000
+            with open(probe_path, 'r', encoding='utf-8') as f:
+                probe = json.load(f)
+        finally:
+            os.remove(probe_path)
+        samples.append({
+            'wall_ms': wall_ms,
+            'first_window_ms': probe.get('first_window_ms'),
+            'yt_dlp_loaded': probe.get('yt_dlp_loaded'),
+        })
+    return samples
+
+
+def main(argv=None):
+    """Điểm vào của báo cáo khởi động"""
+    parser = argparse.ArgumentParser(prog='lappytube-startup-report',
+                                     description='Báo cáo thời gian import và thời gian khởi động.')
+    parser.add_argument('--budget', type=float, default=1000,
+                        help='Ngân sách thời gian tới khi cửa sổ hiển thị (ms, mặc định: %(default)s)')
+    parser.add_argument('--runs', type=int, default=3, help='Số lần khởi động lạnh (mặc định: %(default)s)')
+    parser.add_argument('--top', type=int, default=15, help='Số module chậm nhất cần liệt kê (mặc định: %(default)s)')
+    parser.add_argument('--exe', help='Đo file thực thi đã đóng gói thay vì src/main.py')
+    parser.add_argument('--skip-imports', action='store_true', help='Bỏ qua phần đo thời gian import')
+    parser.add_argument('--json', dest='json_path', help='Ghi báo cáo ra file JSON')
+    args = parser.parse_args(argv)
+
+    report = {'budget_ms': args.budget}
+    ok = True
+
+    if not args.skip_imports:
+        entries = import_times()
+        total_us = sum(entry[1] for entry in entries)
+        eager = sorted({entry[0].split('.')[0] for entry in entries} & set(DEFERRED_MODULES))
+        print(f"Tổng thời gian import cửa sổ chính: {total_us / 1000:.0f} ms")
+        print(f"{'Module':<50} {'riêng (ms)':>12} {'tích lũy (ms)':>14}")
+        top_level = [entry for entry in entries if entry[3] == 0]
+        slowest = sorted(top_level, key=lambda entry: entry[2], reverse=True)[:args.top]
+        for name, self_us, cumulative_us, _ in slowest:
+            print(f"{name:<50} {self_us / 1000:>12.1f} {cumulative_us / 1000:>14.1f}")
+        if eager:
+            print(f"LỖI: {', '.join(eager)} bị import trước khi cửa sổ hiển thị")
+            ok = False
+        report['imports'] = {
+            'total_ms': total_us / 1000,
+            'eager_deferred_modules': eager,
+            'top': [{'module': name, 'self_ms': self_us / 1000, 'cumulative_ms': cumulative_us / 1000}
+                    for name, self_us, cumulative_us, _ in slowest],
+        }
+
+    samples = measure_first_window(args.exe, args.runs)
+    median_wall = statistics.median(sample['wall_ms'] for sample in samples)
+    first_window = [sample['first_window_ms'] for sample in samples if sample['first_window_ms'] is not None]
+    median_window = statistics.median(first_window) if first_window else None
+    summary = f"Khởi động lạnh ({args.runs} lần): tổng {median_wall:.0f} ms (trung vị)"
+    if median_window is not None:
+        summary += f", trong tiến trình {median_window:.0f} ms"
+    print(f"{summary}, ngân sách {args.budget:.0f} ms")
+    if median_wall > args.budget:
+        print("LỖI: vượt ngân sách khởi động")
+        ok = False
+    if any(sample['yt_dlp_loaded'] for sample in samples):
+        print("LỖI: yt-dlp đã được nạp trước khi cửa sổ hiển thị")
+        ok = False
+    report['startup'] = {'median_wall_ms': median_wall, 'median_first_window_ms': median_window,
+                         'samples': samples}
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Bảng danh sách công việc tải xuống (model/view), chịu được hàng nghìn công việc
+"""
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer
+from PyQt5.QtWidgets import QApplication, QStyle, QStyleOptionProgressBar, QStyledItemDelegate
+
+from src.core.download_queue import JobPriority, JobState
+from src.core.speed import format_eta
+from src.utils.helpers import format_filesize
+
+# Tên hiển thị của các trạng thái
+STATE_LABELS = {
+    JobState.QUEUED: "Đang chờ",
+    JobState.RUNNING: "Đang tải",
+    JobState.POSTPROCESSING: "Đang xử lý",
+    JobState.PAUSED: "Tạm dừng",
+    JobState.DONE: "Hoàn tất",
+    JobState.FAILED: "Lỗi",
+    JobState.CANCELLED: "Đã hủy",
+}
+PRIORITY_LABELS = {JobPriority.HIGH: "Cao", JobPriority.NORMAL: "Bình thường", JobPriority.LOW: "Thấp"}
+
+
+class JobRecord:
+    """Bản sao gọn các trường hiển thị của một DownloadJob (một dòng của bảng)"""
+
+    __slots__ = ('id', 'title', 'state', 'priority', 'percent', 'downloaded', 'total', 'speed', 'eta', 'error')
+
+    def __init__(self, job):
+        self.id = job.id
+        self.update(job)
+
+    def update(self, job):
+        """
+        Chép trạng thái mới nhất của công việc
+
+        Returns:
+            bool: True nếu có trường hiển thị thay đổi
+        """
+        eta = int(job.eta) if job.eta is not None else None
+        values = (job.metadata.get('title') or job.url, job.state, job.priority, job.percent,
+                  job.downloaded, job.total, int(job.speed or 0), eta, job.error)
+        if getattr(self, 'title', None) is not None and values == (
+                self.title, self.state, self.priority, self.percent, self.downloaded, self.total,
+                self.speed, self.eta, self.error):
+            return False
+        (self.title, self.state, self.priority, self.percent, self.downloaded, self.total,
+         self.speed, self.eta, self.error) = values
+        return True
+
+
+class JobTableModel(QAbstractTableModel):
+    """
+    Model của bảng công việc
+
+    Mỗi công việc là một JobRecord (__slots__) trong một list, tra dòng theo id qua dict.
+    Cập nhật từ hàng đợi chỉ ghi vào record và đánh dấu dòng; một QTimer gom các dòng mới và
+    các dòng thay đổi rồi phát một beginInsertRows/dataChanged cho cả đợt, nên số lần view vẽ
+    lại không phụ thuộc vào tần suất cập nhật hay số công việc. View chỉ hỏi data() của các
+    ô đang hiển thị.
+    """
+
+    COLUMNS = ("#", "Video", "Trạng thái", "Ưu tiên", "Tiến trình", "Tốc độ", "Kích thước")
+    COL_ID, COL_TITLE, COL_STATE, COL_PRIORITY, COL_PROGRESS, COL_SPEED, COL_SIZE = range(7)
+
+    def __init__(self, parent=None, interval_ms=50):
+        """
+        Khởi tạo
+
+        Args:
+            parent (QObject, optional): Đối tượng cha
+            interval_ms (int): Khoảng thời gian giữa hai lần phát thay đổi cho view (ms)
+        """
+        super().__init__(parent)
+        self._records = []
+        self._rows = {}  # id công việc -> chỉ số dòng
+        self._pending = []  # công việc mới chưa chèn vào bảng
+        self._pending_ids = {}  # id -> JobRecord chờ chèn
+        self._dirty = set()  # các dòng đã thay đổi chưa báo cho view
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    # ------------------------------------------------------------------
+    # Cập nhật từ hàng đợi
+    # ------------------------------------------------------------------
+    def update_jobs(self, jobs):
+        """Ghi nhận một đợt thay đổi của các công việc (gọi trên luồng giao diện)"""
+        for job in jobs:
+            row = self._rows.get(job.id)
+            if row is not None:
+                if self._records[row].update(job):
+                    self._dirty.add(row)
+                continue
+            record = self._pending_ids.get(job.id)
+            if record is not None:
+                record.update(job)
+            else:
+                record = JobRecord(job)
+                self._pending.append(record)
+                self._pending_ids[job.id] = record
+
+    def flush(self):
+        """Chèn các dòng mới và báo các dòng đã thay đổi cho view"""
+        if self._pending:
+            first = len(self._records)
+            self.beginInsertRows(QModelIndex(), first, first + len(self._pending) - 1)
+            for record in self._pending:
+                self._rows[record.id] = len(self._records)
+                self._records.append(record)
+            self._pending = []
+            self._pending_ids = {}
+            self.endInsertRows()
+        if self._dirty:
+            # Một tín hiệu cho khoảng dòng thay đổi; view chỉ vẽ lại phần đang hiển thị
+            top, bottom = min(self._dirty), max(self._dirty)
+            self._dirty.clear()
+            self.dataChanged.emit(self.index(top, 0), self.index(bottom, len(self.COLUMNS) - 1))
+
+    def job_id(self, row):
+        """Id công việc của dòng, None nếu dòng không tồn tại"""
+        if 0 <= row < len(self._records):
+            return self._records[row].id
+        return None
+
+    def remove_finished(self):
+        """Bỏ khỏi bảng các công việc đã kết thúc"""
+        self.flush()
+        keep = [record for record in self._records if record.state not in JobState.FINISHED]
+        if len(keep) == len(self._records):
+            return
+        self.beginResetModel()
+        self._records = keep
+        self._rows = {record.id: row for row, record in enumerate(keep)}
+        self._dirty.clear()
+        self.endResetModel()
+
+    # ------------------------------------------------------------------
+    # QAbstractTableModel
+    # ------------------------------------------------------------------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._records)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self._records[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == self.COL_ID:
+                return record.id
+            if column == self.COL_TITLE:
+                return record.title
+            if column == self.COL_STATE:
+                return STATE_LABELS.get(record.state, record.state)
+            if column == self.COL_PRIORITY:
+                return PRIORITY_LABELS.get(record.priority, "")
+            if column == self.COL_PROGRESS:
+                return record.percent
+            if column == self.COL_SPEED:
+                if record.state != JobState.RUNNING or not record.speed:
+                    return ""
+                if record.eta is not None:
+                    return f"{format_filesize(record.speed)}/s · {format_eta(record.eta)}"
+                return f"{format_filesize(record.speed)}/s"
+            if column == self.COL_SIZE:
+                if record.total:
+                    return f"{format_filesize(record.downloaded)} / {format_filesize(record.total)}"
+                return format_filesize(record.downloaded) if record.downloaded else ""
+        elif role == Qt.ToolTipRole:
+            return record.error or record.title
+        elif role == Qt.TextAlignmentRole and column in (self.COL_ID, self.COL_SPEED, self.COL_SIZE):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+
+class ProgressDelegate(QStyledItemDelegate):
+    """Vẽ cột tiến trình bằng style của thanh tiến trình, không tạo widget cho từng dòng"""
+
+    def paint(self, painter, option, index):
+        percent = index.data(Qt.DisplayRole)
+        if not isinstance(percent, int):
+            super().paint(painter, option, index)
+            return
+        bar = QStyleOptionProgressBar()
+        bar.rect = option.rect.adjusted(2, 3, -2, -3)
+        bar.minimum = 0
+        bar.maximum = 100
+        bar.progress = max(0, min(100, percent))
+        bar.text = f"{bar.progress}%"
+        bar.textVisible = True
+        bar.state = option.state
+        bar.palette = option.palette
+        bar.fontMetrics = option.fontMetrics
+        style = option.widget.style() if option.widget is not None else QApplication.style()
+        style.drawControl(QStyle.CE_ProgressBar, bar, painter)
@@ -4,92 +4,109 @@ Cửa sổ chính của ứng dụng LappyTube
 
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QPushButton, QLineEdit, QLabel, QComboBox, 
-                            QProgressBar, QFileDialog, QMessageBox, QGroupBox, QApplication,
-                            QTabWidget, QCheckBox, QSpinBox)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
-from PyQt5.QtGui import QIcon
+                            QProgressBar, QFileDialog, QMessageBox, QGroupBox,
+                            QTabWidget, QCheckBox, QSpinBox, QDoubleSpinBox, QListWidget,
+                            QListWidgetItem, QTableView, QHeaderView, QAbstractItemView, QMenu)
+from PyQt5.QtCore import Qt, QThread, QObject, QTimer, QSize, pyqtSignal
+from PyQt5.QtGui import QIcon, QPixmap, QPixmapCache
 import os
 import time
 import sys
+import logging
 import subprocess
 
 from src.core.downloader import YouTubeDownloader
+from src.core.analysis import ExtractionService
+from src.core.download_queue import DownloadQueue, JobState, JobPriority
+from src.core.playlist import PlaylistExpander, is_collection_url
+from src.core.progress import ProgressAggregator
+from src.core.journal import JobJournal
+from src.core.history import DownloadHistory
+from src.core.formats import generic_quality_options
+from src.core.bandwidth import parse_bandwidth_schedule
+from src.core.config import Config
+from src.core.media_cache import MediaCache
+from src.core.metrics import format_report
+from src.core.speed import ThroughputMeter, format_eta
+from src.core.thumbnails import ThumbnailFetcher
+from src.ui.job_table import JobTableModel, ProgressDelegate
+from src.utils.helpers import parse_url_list, format_filesize, open_file_location
 
-class DownloadThread(QThread):
-    """Thread xử lý tải xuống để không chặn giao diện người dùng"""
-    progress_signal = pyqtSignal(int, int, int, int)  # percent, downloaded, total, speed
-    finished_signal = pyqtSignal(str)
-    error_signal = pyqtSignal(str)
+logger = logging.getLogger(__name__)
+
+class QueueSignalBridge(QObject):
+    """Chuyển thông báo từ các luồng của DownloadQueue về luồng giao diện"""
+    jobs_updated = pyqtSignal(list)  # Danh sách DownloadJob đã thay đổi
     
-    def __init__(self, downloader, url, save_path, download_type, quality, speed_limit=0,
-                 concurrent_downloads=8, buffer_size=16*1024*1024, retry_count=10, ffmpeg_path=None):
-        super().__init__()
-        self.downloader = downloader
-        self.url = url
-        self.save_path = save_path
-        self.download_type = download_type
-        self.quality = quality
-        self.speed_limit = speed_limit
-        self.concurrent_downloads = concurrent_downloads
-        self.buffer_size = buffer_size
-        self.retry_count = retry_count
-        self.ffmpeg_path = ffmpeg_path
-        self.is_cancelled = False
-        
-    def run(self):
-        try:
-            # Thêm hàm callback riêng để đảm bảo tín hiệu được gửi đúng cách
-            def progress_callback(percent, downloaded, total, speed):
-                # Kiểm tra nếu đã hủy thì dừng tải xuống
-                if self.is_cancelled:
-                    return False  # Trả về False để báo hiệu dừng tải xuống
-                
-                # In ra console để debug
-                print(f"Progress: {percent}%, Downloaded: {downloaded}, Total: {total}, Speed: {speed}")
-                self.progress_signal.emit(percent, downloaded, total, speed)
-                return True  # Tiếp tục tải xuống
-            
-            self.downloader.download(
-                self.url, 
-                self.save_path, 
-                self.download_type,
-                self.quality,
-                progress_callback,
-                self.speed_limit,
-                self.concurrent_downloads,
-                self.buffer_size,
-                self.retry_count,
-                self.ffmpeg_path
-            )
-            
-            if not self.is_cancelled:
-                self.finished_signal.emit("Tải xuống hoàn tất!")
-            else:
-                self.error_signal.emit("Đã hủy tải xuống")
-        except Exception as e:
-            if not self.is_cancelled:
-                self.error_signal.emit(f"Lỗi: {str(e)}")
-            
-    def cancel_download(self):
-        """Hủy quá trình tải xuống"""
-        self.is_cancelled = True
+    def on_jobs_event(self, jobs):
+        # Được gọi từ luồng nền, tín hiệu sẽ được Qt xếp hàng sang luồng chính
+        self.jobs_updated.emit(jobs)
+
+class ThumbnailSignalBridge(QObject):
+    """Chuyển ảnh thu nhỏ tải xong từ thread pool về luồng giao diện"""
+    ready = pyqtSignal(str, bytes)  # URL ảnh, JPEG đã thu nhỏ (rỗng nếu lỗi/bị hủy)
+    
+    def on_done(self, url, future):
+        data = None if future.cancelled() or future.exception() else future.result()
+        self.ready.emit(url, data or b'')
 
 class MainWindow(QMainWindow):
     """Cửa sổ chính của ứng dụng"""
     
     def __init__(self):
         super().__init__()
+        # Cấu hình dùng chung với CLI; thay đổi được gom lại và ghi nguyên tử xuống đĩa
+        self.config = Config()
+        self.config.add_listener(self.on_config_changed)
         self.downloader = YouTubeDownloader()
-        self.last_downloaded = 0
-        self.last_time = 0
-        # Cải thiện biến lưu trữ lịch sử tốc độ tải xuống
-        self.speed_history = []
-        self.speed_history_max_size = 10  # Tăng lên 10 giá trị để làm mượt hơn
-        self.last_displayed_speed = 0  # Lưu tốc độ hiển thị cuối cùng
-        self.speed_update_threshold = 0.15  # Ngưỡng thay đổi 15% để cập nhật hiển thị
-        self.last_speed_update_time = 0  # Thời điểm cập nhật tốc độ cuối cùng
-        self.speed_update_interval = 1.0  # Chỉ cập nhật tốc độ mỗi 1 giây
+        self.update_media_cache()
+        # Ảnh thu nhỏ: tải và thu nhỏ trên luồng nền, lưu trong ~/.lappytube/thumbs
+        self.thumbnail_fetcher = ThumbnailFetcher(size=(160, 90), max_workers=4)
+        self.thumbnail_bridge = ThumbnailSignalBridge()
+        self.thumbnail_bridge.ready.connect(self.on_thumbnail_ready)
+        self.thumbnail_requests = {}  # URL ảnh -> Future đang tải
+        QPixmapCache.setCacheLimit(64 * 1024)  # KB
+        self.current_thumbnail_url = None
+        # Dịch vụ trích xuất song song dùng khi kiểm tra một danh sách nhiều URL
+        self.extraction_service = ExtractionService(self.downloader, max_workers=16, per_host=4)
+        # Hàng đợi tải xuống song song; tiến trình được gom lại và phát định kỳ
+        # (theo speed_update_interval) về giao diện qua bridge
+        self.queue_bridge = QueueSignalBridge()
+        self.queue_bridge.jobs_updated.connect(self.on_jobs_updated)
+        self.progress_aggregator = ProgressAggregator(self.queue_bridge.on_jobs_event, interval=1.0).start()
+        self.download_queue = DownloadQueue(self.downloader, max_parallel=3,
+                                            listener=self.progress_aggregator.on_job_event)
+        # Journal ghi lại các công việc để tiếp tục sau khi ứng dụng bị tắt giữa chừng
+        try:
+            self.journal = JobJournal()
+            self.download_queue.add_listener(self.journal.on_job_event)
+        except Exception as e:
+            logger.warning("Không thể mở journal tải xuống: %s", e)
+            self.journal = None
+        # Lịch sử tải xuống dùng để tìm kiếm và bỏ qua video đã tải
+        try:
+            self.history = DownloadHistory()
+            self.download_queue.add_listener(self.history.on_job_event)
+        except Exception as e:
+            logger.warning("Không thể mở lịch sử tải xuống: %s", e)
+            self.history = None
+        # Số liệu tổng hợp (số công việc, thời gian chờ) của mọi lượt tải
+        self.download_queue.add_listener(self.downloader.metrics.on_job_event)
+        self.batch_job_ids = {}  # Id các công việc thuộc đợt tải hiện tại (dict giữ thứ tự thêm vào)
+        self.skipped_count = 0  # Số video đã tải bị bỏ qua trong đợt hiện tại
+        self.recorded_job_ids = set()  # Các công việc đã ghi vào danh sách tải gần đây
+        # Trạng thái phân tích danh sách phát/kênh
+        self.playlist_url = None
+        self.playlist_entries = []
+        self.playlist_auto_enqueue = False
+        # URL không trích xuất được trong lần kiểm tra danh sách gần nhất (bỏ qua khi tải)
+        self.invalid_urls = set()
+        self.download_settings = None  # Cài đặt của lần bấm "Tải xuống" gần nhất
+        # Thông lượng tổng của đợt tải (ước lượng O(1) mỗi mẫu, dùng chung với CLI)
+        self.throughput = ThroughputMeter()
         self.init_ui()
+        # Hỏi tiếp tục các công việc dang dở sau khi cửa sổ đã hiển thị
+        QTimer.singleShot(0, self.offer_resume_interrupted)
     
     def init_ui(self):
         """Khởi tạo giao diện người dùng"""
@@ -112,6 +129,10 @@ class MainWindow(QMainWindow):
         download_tab = QWidget()
         self.tab_widget.addTab(download_tab, "Tải xuống")
         
+        # Tab lịch sử
+        history_tab = QWidget()
+        self.tab_widget.addTab(history_tab, "Lịch sử")
+        
         # Tab cài đặt
         settings_tab = QWidget()
         self.tab_widget.addTab(settings_tab, "Cài đặt")
@@ -119,6 +140,9 @@ class MainWindow(QMainWindow):
         # Thiết lập tab tải xuống
         self.setup_download_tab(download_tab)
         
+        # Thiết lập tab lịch sử
+        self.setup_history_tab(history_tab)
+        
         # Thiết lập tab cài đặt
         self.setup_settings_tab(settings_tab)
     
@@ -132,7 +156,8 @@ class MainWindow(QMainWindow):
         url_label = QLabel("URL Video:")
         url_label.setMinimumWidth(80)
         self.url_input = QLineEdit()
-        self.url_input.setPlaceholderText("Nhập URL video YouTube")
+        self.url_input.setPlaceholderText("Nhập URL video YouTube (có thể dán nhiều URL, cách nhau bởi dấu cách)")
+        self.url_input.textChanged.connect(self.on_url_text_changed)
         self.analyze_btn = QPushButton("Phân tích")
         self.analyze_btn.setMinimumWidth(100)
         self.analyze_btn.clicked.connect(self.analyze_video)
@@ -145,6 +170,14 @@ class MainWindow(QMainWindow):
         info_group = QGroupBox("Thông tin Video")
         info_layout = QVBoxLayout(info_group)
         
+        # Ảnh thu nhỏ bên trái, các dòng thông tin bên phải
+        summary_layout = QHBoxLayout()
+        self.thumbnail_label = QLabel()
+        self.thumbnail_label.setFixedSize(160, 90)
+        self.thumbnail_label.setAlignment(Qt.AlignCenter)
+        self.thumbnail_label.setStyleSheet("background-color: #ecf0f1;")
+        details_layout = QVBoxLayout()
+        
         # Tiêu đề
         title_layout = QHBoxLayout()
         title_label = QLabel("Tiêu đề:")
@@ -169,9 +202,26 @@ class MainWindow(QMainWindow):
         duration_layout.addWidget(duration_label)
         duration_layout.addWidget(self.duration_value)
         
-        info_layout.addLayout(title_layout)
-        info_layout.addLayout(channel_layout)
-        info_layout.addLayout(duration_layout)
+        # Danh sách video khi phân tích danh sách phát/kênh
+        self.playlist_list = QListWidget()
+        self.playlist_list.setUniformItemSizes(True)
+        self.playlist_list.setIconSize(QSize(96, 54))
+        self.playlist_list.setVisible(False)
+        # Chỉ tải ảnh của các dòng đang hiển thị, sau khi người dùng ngừng cuộn một chút
+        self.thumbnail_timer = QTimer(self)
+        self.thumbnail_timer.setSingleShot(True)
+        self.thumbnail_timer.setInterval(150)
+        self.thumbnail_timer.timeout.connect(self.load_visible_thumbnails)
+        self.playlist_list.verticalScrollBar().valueChanged.connect(self.thumbnail_timer.start)
+        self.playlist_list.model().rowsInserted.connect(self.thumbnail_timer.start)
+        
+        details_layout.addLayout(title_layout)
+        details_layout.addLayout(channel_layout)
+        details_layout.addLayout(duration_layout)
+        summary_layout.addWidget(self.thumbnail_label)
+        summary_layout.addLayout(details_layout)
+        info_layout.addLayout(summary_layout)
+        info_layout.addWidget(self.playlist_list)
         
         # Tùy chọn tải xuống
         download_group = QGroupBox("Tùy chọn tải xuống")
@@ -194,6 +244,7 @@ class MainWindow(QMainWindow):
         speed_label.setMinimumWidth(80)
         self.speed_combo = QComboBox()
         self.speed_combo.addItem("Không giới hạn")
+        self.speed_combo.addItem("0.5 MB/s")
         self.speed_combo.addItem("1 MB/s")
         self.speed_combo.addItem("2 MB/s")
         self.speed_combo.addItem("5 MB/s")
@@ -211,6 +262,18 @@ class MainWindow(QMainWindow):
         quality_layout.addWidget(quality_label)
         quality_layout.addWidget(self.quality_combo)
         
+        # Mức ưu tiên trong hàng đợi
+        priority_layout = QHBoxLayout()
+        priority_label = QLabel("Ưu tiên:")
+        priority_label.setMinimumWidth(80)
+        self.priority_combo = QComboBox()
+        self.priority_combo.addItem("Tự động", None)  # Video lẻ: bình thường, danh sách phát: thấp
+        self.priority_combo.addItem("Cao", JobPriority.HIGH)
+        self.priority_combo.addItem("Bình thường", JobPriority.NORMAL)
+        self.priority_combo.addItem("Thấp", JobPriority.LOW)
+        priority_layout.addWidget(priority_label)
+        priority_layout.addWidget(self.priority_combo)
+        
         # Thư mục lưu
         save_layout = QHBoxLayout()
         save_label = QLabel("Lưu vào:")
@@ -226,6 +289,7 @@ class MainWindow(QMainWindow):
         download_layout.addLayout(download_type_layout)
         download_layout.addLayout(speed_layout)
         download_layout.addLayout(quality_layout)
+        download_layout.addLayout(priority_layout)
         download_layout.addLayout(save_layout)
         
         # Tiến trình tải xuống
@@ -243,6 +307,31 @@ class MainWindow(QMainWindow):
         progress_layout.addWidget(self.download_info_label)
         progress_layout.addWidget(self.status_label)
         
+        # Danh sách công việc: model/view, chỉ các dòng đang hiển thị được vẽ
+        self.job_model = JobTableModel(self)
+        self.job_table = QTableView()
+        self.job_table.setModel(self.job_model)
+        self.job_table.setItemDelegateForColumn(JobTableModel.COL_PROGRESS, ProgressDelegate(self.job_table))
+        self.job_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.job_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.job_table.setWordWrap(False)
+        self.job_table.verticalHeader().setVisible(False)
+        # Chiều cao dòng cố định để view không phải đo từng dòng
+        self.job_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.job_table.verticalHeader().setDefaultSectionSize(24)
+        header = self.job_table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Interactive)
+        header.setSectionResizeMode(JobTableModel.COL_TITLE, QHeaderView.Stretch)
+        header.resizeSection(JobTableModel.COL_ID, 50)
+        header.resizeSection(JobTableModel.COL_PROGRESS, 140)
+        self.job_table.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.job_table.customContextMenuRequested.connect(self.show_job_menu)
+        self.queue_status_timer = QTimer(self)
+        self.queue_status_timer.setSingleShot(True)
+        self.queue_status_timer.setInterval(250)
+        self.queue_status_timer.timeout.connect(self.refresh_queue_status)
+        progress_layout.addWidget(self.job_table)
+        
         # Nút tải xuống và hủy
         button_layout = QHBoxLayout()
         button_layout.addStretch()
@@ -275,6 +364,13 @@ class MainWindow(QMainWindow):
         self.download_btn.setMinimumHeight(40)  # Làm nút to hơn
         self.download_btn.clicked.connect(self.download_video)
         
+        # Báo cáo thời gian từng giai đoạn của các video trong đợt tải
+        self.report_btn = QPushButton("Báo cáo")
+        self.report_btn.setEnabled(False)
+        self.report_btn.setMinimumHeight(40)
+        self.report_btn.clicked.connect(self.show_performance_report)
+        
+        button_layout.addWidget(self.report_btn)
         button_layout.addWidget(self.cancel_btn)
         button_layout.addWidget(self.download_btn)
         
@@ -285,6 +381,11 @@ class MainWindow(QMainWindow):
         tab_layout.addLayout(progress_layout)
         tab_layout.addLayout(button_layout)
     
+    def on_url_text_changed(self, text):
+        """Cho phép tải ngay khi người dùng dán nhiều URL mà không cần phân tích"""
+        if len(parse_url_list(text)) > 1:
+            self.download_btn.setEnabled(True)
+    
     def browse_save_location(self):
         """Mở hộp thoại chọn thư mục lưu"""
         directory = QFileDialog.getExistingDirectory(
@@ -300,8 +401,22 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Cảnh báo", "Vui lòng nhập URL video YouTube")
             return
         
-        # Đặt lại giao diện tiến trình
-        self.reset_progress_ui()
+        # Đặt lại giao diện tiến trình nếu không có đợt tải nào đang chạy
+        if self.download_queue.is_idle():
+            self.reset_progress_ui()
+        
+        # Dừng lần phân tích danh sách phát trước (nếu có)
+        self.stop_playlist_analysis()
+        self.show_thumbnail(None)
+        
+        if is_collection_url(url):
+            self.analyze_playlist(url)
+            return
+        
+        urls = parse_url_list(url)
+        if len(urls) > 1:
+            self.analyze_url_list(urls)
+            return
         
         # Vô hiệu hóa nút phân tích trong khi đang xử lý
         self.analyze_btn.setEnabled(False)
@@ -333,19 +448,224 @@ class MainWindow(QMainWindow):
             duration_str = f"{int(minutes)}:{int(seconds):02d}"
         
         self.duration_value.setText(duration_str)
+        self.show_thumbnail(video_info.get('thumbnail'))
         
         # Cập nhật các tùy chọn chất lượng
         self.update_quality_options(video_info)
         
-        # Kích hoạt nút tải xuống
+        # Kích hoạt nút tải xuống và phân tích
         self.download_btn.setEnabled(True)
+        self.analyze_btn.setEnabled(True)
         
-        # Đặt lại thanh tiến trình
-        self.progress_bar.setValue(0)
-        self.progress_bar.setVisible(False)
-        self.download_info_label.setVisible(False)
+        # Không đặt lại tiến trình khi hàng đợi vẫn đang tải các video khác
+        if self.download_queue.is_idle():
+            self.progress_bar.setValue(0)
+            self.progress_bar.setVisible(False)
+            self.download_info_label.setVisible(False)
+            self.status_label.setText("Sẵn sàng tải xuống")
+    
+    def analyze_playlist(self, url):
+        """Liệt kê danh sách phát/kênh, các video được hiển thị dần khi có kết quả"""
+        self.playlist_url = url
+        self.playlist_entries = []
+        self.playlist_auto_enqueue = False
+        self.playlist_list.clear()
+        self.playlist_list.setVisible(True)
+        
+        self.title_value.setText("Đang liệt kê danh sách phát...")
+        self.channel_value.setText("Chưa có thông tin")
+        self.duration_value.setText("0 video")
+        self.status_label.setText("Đang phân tích danh sách phát...")
+        
+        # Danh sách phát dùng các mức chất lượng chung thay vì định dạng của từng video
+        self.video_info = {
+            'title': '',
+            'author': '',
+            'length': 0,
+            'options': generic_quality_options(),
+        }
+        self.update_quality_options(self.video_info)
+        
+        self.playlist_thread = PlaylistAnalyzeThread(self.downloader, url)
+        self.playlist_thread.entry_signal.connect(self.on_playlist_entry)
+        self.playlist_thread.resolved_signal.connect(self.on_playlist_entry_resolved)
+        self.playlist_thread.finished_signal.connect(self.on_playlist_finished)
+        self.playlist_thread.error_signal.connect(self.on_analyze_error)
+        self.playlist_thread.start()
+    
+    def analyze_url_list(self, urls):
+        """Kiểm tra song song một danh sách URL, kết quả từng video được hiển thị ngay khi có"""
+        self.invalid_urls = set()
+        self.bulk_total = len(urls)
+        self.bulk_done = 0
+        self.playlist_list.clear()
+        self.playlist_list.setVisible(True)
+        
+        self.title_value.setText(f"Đang kiểm tra {len(urls)} URL...")
+        self.channel_value.setText("Chưa có thông tin")
+        self.duration_value.setText(f"0/{len(urls)} video")
+        self.status_label.setText("Đang kiểm tra danh sách URL...")
+        
+        # Nhiều video dùng các mức chất lượng chung
+        self.video_info = {
+            'title': '',
+            'author': '',
+            'length': 0,
+            'options': generic_quality_options(),
+        }
+        self.update_quality_options(self.video_info)
+        self.analyze_btn.setEnabled(False)
         
-        self.status_label.setText("Sẵn sàng tải xuống")
+        self.bulk_thread = BulkAnalyzeThread(self.extraction_service, urls)
+        self.bulk_thread.result_signal.connect(self.on_bulk_result)
+        self.bulk_thread.finished_signal.connect(self.on_bulk_finished)
+        self.bulk_thread.start()
+    
+    def on_bulk_result(self, summary):
+        """Thêm kết quả kiểm tra của một URL vào danh sách"""
+        self.bulk_done += 1
+        if summary['error']:
+            self.invalid_urls.add(summary['url'])
+            self.add_list_item(f"✗ {summary['url']} - {summary['error']}")
+        else:
+            duration = int(summary['duration'])
+            duration_str = f" ({duration // 60}:{duration % 60:02d})" if duration else ""
+            self.add_list_item(f"✓ {summary['title']}{duration_str}", summary['thumbnail'])
+        self.duration_value.setText(f"{self.bulk_done}/{self.bulk_total} video")
+    
+    def on_bulk_finished(self):
+        """Xử lý khi đã kiểm tra xong danh sách URL"""
+        self.analyze_btn.setEnabled(True)
+        self.download_btn.setEnabled(True)
+        valid = self.bulk_done - len(self.invalid_urls)
+        self.title_value.setText(f"{valid}/{self.bulk_total} URL hợp lệ")
+        if self.download_queue.is_idle():
+            self.status_label.setText(f"Sẵn sàng tải xuống {valid} video")
+    
+    def add_list_item(self, text, thumbnail=None):
+        """Thêm một dòng vào danh sách video, ảnh thu nhỏ được tải khi dòng hiển thị"""
+        item = QListWidgetItem(text)
+        if thumbnail:
+            item.setData(Qt.UserRole, thumbnail)
+            pixmap = QPixmapCache.find(thumbnail)
+            if pixmap is not None:
+                item.setIcon(QIcon(pixmap))
+        self.playlist_list.addItem(item)
+    
+    def show_thumbnail(self, url):
+        """Hiển thị ảnh thu nhỏ của video đang phân tích"""
+        self.current_thumbnail_url = url
+        self.thumbnail_label.clear()
+        if not url:
+            return
+        pixmap = QPixmapCache.find(url)
+        if pixmap is not None:
+            self.thumbnail_label.setPixmap(pixmap)
+        else:
+            self.request_thumbnail(url)
+    
+    def request_thumbnail(self, url):
+        """Yêu cầu tải ảnh thu nhỏ (mỗi URL chỉ một lượt đang chờ)"""
+        if url in self.thumbnail_requests:
+            return
+        future = self.thumbnail_fetcher.fetch(url)
+        self.thumbnail_requests[url] = future
+        future.add_done_callback(lambda f, u=url: self.thumbnail_bridge.on_done(u, f))
+    
+    def load_visible_thumbnails(self):
+        """Tải ảnh cho các dòng đang hiển thị, hủy các ảnh chưa tới lượt của dòng đã cuộn qua"""
+        if not self.playlist_list.count():
+            return
+        viewport = self.playlist_list.viewport().rect()
+        first = self.playlist_list.indexAt(viewport.topLeft()).row()
+        last = self.playlist_list.indexAt(viewport.bottomLeft()).row()
+        first = max(first, 0)
+        last = self.playlist_list.count() - 1 if last < 0 else last
+        visible = set()
+        # Tải trước thêm một trang phía dưới để cuộn mượt
+        for row in range(first, min(self.playlist_list.count(), last + 1 + (last - first + 1))):
+            item = self.playlist_list.item(row)
+            url = item.data(Qt.UserRole)
+            if not url or not item.icon().isNull():
+                continue
+            pixmap = QPixmapCache.find(url)
+            if pixmap is not None:
+                item.setIcon(QIcon(pixmap))
+                continue
+            visible.add(url)
+            self.request_thumbnail(url)
+        for url, future in list(self.thumbnail_requests.items()):
+            if url not in visible and url != self.current_thumbnail_url and future.cancel():
+                del self.thumbnail_requests[url]
+    
+    def on_thumbnail_ready(self, url, data):
+        """Nhận ảnh thu nhỏ đã tải (trên luồng giao diện), chỉ giải mã ảnh JPEG nhỏ"""
+        self.thumbnail_requests.pop(url, None)
+        if not data:
+            return
+        pixmap = QPixmap()
+        if not pixmap.loadFromData(data):
+            return
+        QPixmapCache.insert(url, pixmap)
+        if url == self.current_thumbnail_url:
+            self.thumbnail_label.setPixmap(pixmap)
+        if self.playlist_list.isVisible():
+            self.thumbnail_timer.start()
+    
+    def stop_playlist_analysis(self):
+        """Dừng luồng liệt kê danh sách phát/kiểm tra danh sách URL đang chạy và thoát chế độ danh sách phát"""
+        if hasattr(self, 'playlist_thread') and self.playlist_thread.isRunning():
+            self.playlist_thread.stop()
+        if hasattr(self, 'bulk_thread') and self.bulk_thread.isRunning():
+            self.bulk_thread.stop()
+        self.invalid_urls = set()
+        # Ảnh của các dòng cũ chưa tới lượt thì không cần tải nữa
+        for url, future in list(self.thumbnail_requests.items()):
+            if url != self.current_thumbnail_url and future.cancel():
+                del self.thumbnail_requests[url]
+        self.playlist_url = None
+        self.playlist_entries = []
+        self.playlist_auto_enqueue = False
+        self.playlist_list.clear()
+        self.playlist_list.setVisible(False)
+    
+    def is_playlist_mode(self):
+        """URL đang nhập là danh sách phát đã (hoặc đang) được phân tích"""
+        return self.playlist_url is not None and self.url_input.text().strip() == self.playlist_url
+    
+    def on_playlist_entry(self, entry):
+        """Thêm một video vừa được liệt kê vào danh sách"""
+        self.playlist_entries.append(entry)
+        duration = entry.get('duration') or 0
+        duration_str = f" ({int(duration) // 60}:{int(duration) % 60:02d})" if duration else ""
+        self.add_list_item(f"{entry['index']}. {entry['title']}{duration_str}", entry.get('thumbnail'))
+        
+        if len(self.playlist_entries) == 1:
+            self.show_thumbnail(entry.get('thumbnail'))
+            self.title_value.setText(entry.get('playlist_title') or entry['title'])
+            self.channel_value.setText(entry.get('uploader') or "Không rõ")
+            self.download_btn.setEnabled(True)
+            self.analyze_btn.setEnabled(True)
+        self.duration_value.setText(f"{len(self.playlist_entries)} video")
+        
+        # Nếu người dùng đã bấm tải xuống trong khi đang liệt kê, đưa ngay video mới vào hàng đợi
+        if self.playlist_auto_enqueue and entry['url']:
+            self.enqueue_urls([entry['url']])
+    
+    def on_playlist_entry_resolved(self, index, summary):
+        """Cập nhật dòng của video khi đã lấy được thông tin định dạng"""
+        item = self.playlist_list.item(index - 1)
+        if item is not None and summary:
+            item.setText(f"{item.text()} - {summary}")
+    
+    def on_playlist_finished(self, count):
+        """Xử lý khi đã liệt kê xong danh sách phát"""
+        self.analyze_btn.setEnabled(True)
+        self.playlist_auto_enqueue = False
+        if count == 0:
+            self.status_label.setText("Danh sách phát không có video nào")
+        elif self.download_queue.is_idle():
+            self.status_label.setText(f"Sẵn sàng tải xuống {count} video")
     
     def on_analyze_error(self, error_message):
         """Xử lý khi có lỗi phân tích"""
@@ -354,9 +674,14 @@ class MainWindow(QMainWindow):
         self.status_label.setText("Có lỗi xảy ra")
     
     def download_video(self):
-        """Tải xuống video"""
-        url = self.url_input.text().strip()
-        if not url:
+        """Thêm video (danh sách URL hoặc toàn bộ danh sách phát) vào hàng đợi tải xuống"""
+        playlist_mode = self.is_playlist_mode()
+        if playlist_mode:
+            urls = [entry['url'] for entry in self.playlist_entries if entry['url']]
+        else:
+            # Bỏ các URL đã kiểm tra là không tải được
+            urls = [url for url in parse_url_list(self.url_input.text()) if url not in self.invalid_urls]
+        if not urls and not playlist_mode:
             QMessageBox.warning(self, "Lỗi", "Vui lòng nhập URL video YouTube")
             return
         
@@ -368,177 +693,241 @@ class MainWindow(QMainWindow):
         # Lấy loại tải xuống (video hoặc audio)
         download_type = self.download_type_combo.currentData()
         
-        # Lấy chất lượng đã chọn
+        # Lấy chất lượng đã chọn; với nhiều URL chưa phân tích thì dùng chất lượng cao nhất
         quality_index = self.quality_combo.currentIndex()
-        if quality_index >= 0:
+        if (len(urls) == 1 or playlist_mode) and quality_index >= 0:
             quality = self.quality_combo.itemData(quality_index) or self.quality_combo.itemText(quality_index)
         else:
-            quality = "best" if download_type == "video" else "bestaudio"
+            quality = "highest" if download_type == "video" else "bestaudio"
         
         # Xử lý trường hợp đặc biệt cho "Chất lượng cao nhất (MP3)"
         if quality == "Chất lượng cao nhất (MP3)":
             quality = "bestaudio"
         
-        # Hiển thị thanh tiến trình
-        self.progress_bar.setValue(0)
-        self.progress_bar.setVisible(True)
-        self.download_info_label.setText("")
-        self.download_info_label.setVisible(True)
-        
-        # Vô hiệu hóa nút tải xuống và phân tích trong khi đang tải
-        self.download_btn.setEnabled(False)
-        self.analyze_btn.setEnabled(False)
-        self.cancel_btn.setEnabled(True)  # Kích hoạt nút hủy
-        
         # Xác định tốc độ tải xuống
         speed_limit = self.speed_combo.currentText()
         if speed_limit != "Không giới hạn":
             # Chuyển đổi từ MB/s sang B/s
-            speed_mb = int(speed_limit.split(" ")[0])
-            speed_bytes = speed_mb * 1024 * 1024
+            speed_mb = float(speed_limit.split(" ")[0])
+            speed_bytes = int(speed_mb * 1024 * 1024)
         else:
             speed_bytes = 0  # Không giới hạn
         
-        # Lấy cài đặt từ tab cài đặt
-        concurrent_downloads = self.concurrent_spinbox.value()
-        buffer_size = self.buffer_spinbox.value() * 1024 * 1024  # Chuyển từ MB sang bytes
-        retry_count = self.retry_spinbox.value()
-        
         # Đường dẫn ffmpeg
         if self.auto_detect_ffmpeg_checkbox.isChecked():
             ffmpeg_path = None  # Tự động phát hiện
         else:
             ffmpeg_path = self.ffmpeg_path_input.text()
         
-        # Sử dụng QThread để tải xuống
-        self.download_thread = DownloadThread(
-            self.downloader, url, save_path, download_type, quality, speed_bytes,
-            concurrent_downloads, buffer_size, retry_count, ffmpeg_path
+        # Video lẻ được ưu tiên hơn các danh sách phát/lô lớn đang chờ
+        priority = self.priority_combo.currentData()
+        if priority is None:
+            priority = JobPriority.LOW if playlist_mode or len(urls) > 1 else JobPriority.NORMAL
+        
+        # Lưu lại cài đặt để dùng cho các video được liệt kê sau
+        self.download_settings = {
+            'save_path': save_path,
+            'download_type': download_type,
+            'quality': quality,
+            'priority': priority,
+            'options': {
+                'speed_limit': speed_bytes,
+                'concurrent_downloads': self.concurrent_spinbox.value(),
+                'buffer_size': self.buffer_spinbox.value() * 1024 * 1024,  # Chuyển từ MB sang bytes
+                'retry_count': self.retry_spinbox.value(),
+                'ffmpeg_path': ffmpeg_path,
+                'auto_tune': self.auto_tune_checkbox.isChecked(),
+                'stream_audio': self.config.get('stream_audio', True),
+            },
+        }
+        
+        # Danh sách phát vẫn đang được liệt kê: các video tiếp theo sẽ tự vào hàng đợi
+        if playlist_mode and hasattr(self, 'playlist_thread') and self.playlist_thread.isRunning():
+            self.playlist_auto_enqueue = True
+        
+        self.enqueue_urls(urls)
+    
+    def enqueue_urls(self, urls):
+        """Đưa các URL vào hàng đợi với cài đặt của lần bấm "Tải xuống" gần nhất"""
+        if not urls or self.download_settings is None:
+            return
+        
+        # Bắt đầu đợt tải mới nếu đợt trước đã kết thúc
+        if self.download_queue.is_idle():
+            self.batch_job_ids = {}
+            self.skipped_count = 0
+            self.reset_progress_ui()
+        
+        # Hiển thị thanh tiến trình
+        self.progress_bar.setVisible(True)
+        self.download_info_label.setVisible(True)
+        self.cancel_btn.setEnabled(True)  # Kích hoạt nút hủy
+        
+        # Bỏ qua các video đã có trong lịch sử (tra theo ID video, không cần truy cập mạng)
+        settings = self.download_settings
+        if self.history is not None and self.skip_downloaded_checkbox.isChecked():
+            remaining = [url for url in urls
+                         if not self.history.is_downloaded(url, settings['download_type'])]
+            if len(remaining) < len(urls):
+                self.skipped_count += len(urls) - len(remaining)
+                self.status_label.setText(f"Bỏ qua {self.skipped_count} video đã tải")
+            urls = remaining
+            if not urls:
+                if self.download_queue.is_idle():
+                    self.progress_bar.setVisible(False)
+                    self.download_info_label.setVisible(False)
+                    self.cancel_btn.setEnabled(False)
+                return
+        
+        # Hàng đợi tự giới hạn số video tải song song
+        jobs = self.download_queue.submit_many(
+            urls, settings['save_path'], settings['download_type'], settings['quality'],
+            priority=settings['priority'], **settings['options']
         )
-        self.download_thread.progress_signal.connect(self.update_progress)
-        self.download_thread.finished_signal.connect(self.on_download_finished)
-        self.download_thread.error_signal.connect(self.on_download_error)
-        self.download_thread.start()
-        
-        self.status_label.setText("Đang tải xuống...")
-    
-    def update_progress(self, percent, downloaded, total, speed):
-        """Cập nhật thanh tiến trình và thông tin tải xuống"""
-        current_time = time.time()
-        
-        # Tính lại phần trăm dựa trên dung lượng đã tải và tổng dung lượng
-        # để đảm bảo tính nhất quán
-        if total > 0 and downloaded > 0:
-            calculated_percent = min(int(downloaded * 100 / total), 100)
-            # Nếu phần trăm tính toán khác với phần trăm nhận được, ưu tiên phần trăm tính toán
-            if abs(calculated_percent - percent) > 5:  # Nếu chênh lệch > 5%
-                print(f"Điều chỉnh phần trăm: {percent}% -> {calculated_percent}% (Đã tải: {downloaded}/{total})")
-                percent = calculated_percent
-        
-        # Cập nhật thanh tiến trình với giá trị phần trăm chính xác
-        self.progress_bar.setValue(percent)
+        self.batch_job_ids.update(dict.fromkeys(job.id for job in jobs))
+        self.report_btn.setEnabled(bool(self.batch_job_ids))
         
-        # Tính tốc độ tải xuống nếu không được cung cấp hoặc không hợp lệ
-        calculated_speed = 0
-        if self.last_time > 0 and current_time > self.last_time:
-            time_diff = current_time - self.last_time
-            if time_diff > 0:
-                bytes_diff = downloaded - self.last_downloaded
-                if bytes_diff > 0:
-                    calculated_speed = bytes_diff / time_diff
+        self.refresh_queue_status()
+    
+    def on_jobs_updated(self, jobs):
+        """Xử lý một đợt cập nhật trạng thái/tiến trình đã được gom từ hàng đợi"""
+        # Bảng công việc tự gom thay đổi và vẽ lại theo nhịp của nó
+        self.job_model.update_jobs(jobs)
+        jobs = [job for job in jobs if job.id in self.batch_job_ids]
+        if not jobs:
+            return
         
-        # Sử dụng tốc độ tính toán nếu tốc độ từ yt-dlp không hợp lệ
-        if speed <= 0 or speed > 100 * 1024 * 1024:  # Nếu tốc độ <= 0 hoặc > 100MB/s
-            speed = calculated_speed
+        for job in jobs:
+            if job.state == JobState.FAILED:
+                logger.warning("Tải xuống thất bại (%s): %s", job.url, job.error)
+            elif job.state == JobState.DONE and job.id not in self.recorded_job_ids:
+                self.recorded_job_ids.add(job.id)
+                logger.info("Hoàn tất %s: %s", job.url, format_report(job.metrics.report()))
+                title = job.metadata.get('title') or os.path.splitext(os.path.basename(job.file_path or ''))[0]
+                self.config.add_recent_download(job.url, title or job.url)
+        
+        # Khi toàn bộ đợt tải đã kết thúc
+        if self.download_queue.is_idle():
+            self.queue_status_timer.stop()
+            self.refresh_queue_status()
+            self.on_batch_finished()
+        elif not self.queue_status_timer.isActive():
+            # Trạng thái tổng duyệt cả đợt tải: gom lại, không tính lại sau mỗi cập nhật
+            self.queue_status_timer.start()
+    
+    def show_job_menu(self, pos):
+        """Menu chuột phải của bảng công việc: tạm dừng/tiếp tục/hủy/đổi ưu tiên các dòng đã chọn"""
+        rows = sorted({index.row() for index in self.job_table.selectionModel().selectedRows()})
+        clicked = self.job_table.indexAt(pos)
+        if clicked.isValid() and clicked.row() not in rows:
+            rows = [clicked.row()]
+        job_ids = [job_id for job_id in (self.job_model.job_id(row) for row in rows) if job_id is not None]
+        
+        menu = QMenu(self)
+        if job_ids:
+            menu.addAction("Tạm dừng", lambda: [self.download_queue.pause(job_id) for job_id in job_ids])
+            menu.addAction("Tiếp tục", lambda: [self.download_queue.resume(job_id) for job_id in job_ids])
+            menu.addAction("Hủy", lambda: [self.download_queue.cancel(job_id) for job_id in job_ids])
+            priority_menu = menu.addMenu("Mức ưu tiên")
+            for label, priority in (("Cao", JobPriority.HIGH), ("Bình thường", JobPriority.NORMAL),
+                                    ("Thấp", JobPriority.LOW)):
+                priority_menu.addAction(label, lambda p=priority: [self.download_queue.set_priority(job_id, p)
+                                                                   for job_id in job_ids])
+            menu.addSeparator()
+        menu.addAction("Xóa các mục đã xong khỏi danh sách", self.job_model.remove_finished)
+        menu.exec_(self.job_table.viewport().mapToGlobal(pos))
+    
+    def batch_jobs(self):
+        """Danh sách công việc thuộc đợt tải hiện tại"""
+        jobs = (self.download_queue.get(job_id) for job_id in self.batch_job_ids)
+        return [job for job in jobs if job is not None]
+    
+    def refresh_queue_status(self):
+        """Cập nhật thanh tiến trình tổng hợp và trạng thái hàng đợi"""
+        jobs = self.batch_jobs()
+        if not jobs:
+            return
         
-        # Thêm tốc độ hiện tại vào lịch sử nếu hợp lệ
-        if speed > 0:
-            # Loại bỏ các giá trị bất thường (quá cao hoặc quá thấp)
-            if len(self.speed_history) > 0:
-                avg = sum(self.speed_history) / len(self.speed_history)
-                # Chỉ thêm vào nếu tốc độ không chênh lệch quá 300% so với trung bình
-                if speed < avg * 3 and speed > avg * 0.3:
-                    self.speed_history.append(speed)
-            else:
-                self.speed_history.append(speed)
-            
-            # Giới hạn kích thước lịch sử
-            if len(self.speed_history) > self.speed_history_max_size:
-                self.speed_history.pop(0)
-        
-        # Chuyển đổi các giá trị sang định dạng dễ đọc
-        def format_size(size_bytes):
-            if size_bytes <= 0:
-                return "0 B"
-            size_names = ["B", "KB", "MB", "GB", "TB"]
-            i = 0
-            while size_bytes >= 1024 and i < len(size_names) - 1:
-                size_bytes /= 1024
-                i += 1
-            return f"{size_bytes:.2f} {size_names[i]}"
-        
-        downloaded_str = format_size(downloaded)
+        running = [job for job in jobs if job.state == JobState.RUNNING]
+        queued = sum(1 for job in jobs if job.state == JobState.QUEUED)
+        postprocessing = sum(1 for job in jobs if job.state == JobState.POSTPROCESSING)
+        done = sum(1 for job in jobs if job.state == JobState.DONE)
+        failed = sum(1 for job in jobs if job.state in (JobState.FAILED, JobState.CANCELLED))
+        
+        # Phần trăm tổng: trung bình phần trăm của tất cả công việc trong đợt
+        percent = int(sum(100 if job.is_finished else job.percent for job in jobs) / len(jobs))
+        downloaded = sum(job.downloaded for job in running)
+        total = sum(job.total for job in running)
+        # Thông lượng tổng tính từ số byte thực nhận của mọi công việc đang tải
+        for job in jobs:
+            # Công việc tải tiếp từ phiên trước: phần đã có sẵn không tính vào thông lượng
+            baseline = None if job.metadata.get('resumed') else 0
+            if job.state == JobState.RUNNING:
+                self.throughput.update(job.id, job.downloaded, baseline)
+            elif job.is_finished:
+                self.throughput.finish(job.id, job.downloaded, baseline)
+        speed = self.throughput.sample()
+        remaining = sum(job.total - job.downloaded for job in running if job.total)
+        eta = self.throughput.eta(remaining) if running and all(job.total for job in running) else None
+        self.update_progress(percent, downloaded, total, speed, eta)
+        
+        if running or queued or postprocessing:
+            self.status_label.setText(
+                f"Đang tải {len(running)} | Đang chờ {queued} | Hoàn tất {done}/{len(jobs)}"
+                + (f" | Đang xử lý {postprocessing}" if postprocessing else "")
+                + (f" | Lỗi {failed}" if failed else "")
+            )
+    
+    def update_progress(self, percent, downloaded, total, speed, eta=None):
+        """
+        Cập nhật thanh tiến trình và thông tin tải xuống
+        
+        Args:
+            percent (int): Phần trăm hoàn thành
+            downloaded (int): Số byte đã tải
+            total (int): Tổng số byte (0 nếu chưa biết)
+            speed (float): Tốc độ đã làm mượt (byte/giây)
+            eta (float, optional): Thời gian còn lại (giây)
+        """
+        self.progress_bar.setValue(percent)
         
         if total > 0:
-            total_str = format_size(total)
-            info_text = f"Đã tải: {downloaded_str} / {total_str}"
+            info_text = f"Đã tải: {format_filesize(downloaded)} / {format_filesize(total)}"
         else:
-            info_text = f"Đã tải: {downloaded_str}"
-        
-        # Chỉ cập nhật hiển thị tốc độ sau một khoảng thời gian nhất định
-        # hoặc khi có sự thay đổi đáng kể
-        should_update_speed = False
-        
-        # Kiểm tra xem đã đến thời gian cập nhật chưa
-        if current_time - self.last_speed_update_time >= self.speed_update_interval:
-            should_update_speed = True
-        
-        if should_update_speed and len(self.speed_history) > 0:
-            # Tính trung bình tốc độ để làm mượt, loại bỏ giá trị cao nhất và thấp nhất
-            if len(self.speed_history) > 2:
-                sorted_speeds = sorted(self.speed_history)
-                # Loại bỏ giá trị cao nhất và thấp nhất
-                filtered_speeds = sorted_speeds[1:-1]
-                avg_speed = sum(filtered_speeds) / len(filtered_speeds)
-            else:
-                avg_speed = sum(self.speed_history) / len(self.speed_history)
-            
-            # Làm tròn tốc độ để giảm sự thay đổi nhỏ
-            # Làm tròn đến KB gần nhất nếu < 1MB/s, đến 0.1MB gần nhất nếu >= 1MB/s
-            if avg_speed < 1024 * 1024:  # < 1MB/s
-                rounded_speed = round(avg_speed / 1024) * 1024  # Làm tròn đến KB gần nhất
-            else:  # >= 1MB/s
-                rounded_speed = round(avg_speed / (102.4 * 1024)) * (102.4 * 1024)  # Làm tròn đến 0.1MB gần nhất
-            
-            self.last_displayed_speed = rounded_speed
-            self.last_speed_update_time = current_time
-        
-        # Hiển thị tốc độ tải xuống
-        if self.last_displayed_speed > 0:
-            speed_str = format_size(self.last_displayed_speed)
-            info_text += f" | Tốc độ: {speed_str}/s"
+            info_text = f"Đã tải: {format_filesize(downloaded)}"
+        if speed > 0:
+            info_text += f" | Tốc độ: {format_filesize(int(speed))}/s"
+        if eta is not None:
+            info_text += f" | Còn lại: {format_eta(eta)}"
         
         self.download_info_label.setText(info_text)
-        
-        # Lưu giá trị hiện tại để tính toán lần sau
-        self.last_downloaded = downloaded
-        self.last_time = current_time
-        
-        # Đảm bảo UI được cập nhật ngay lập tức
-        self.progress_bar.repaint()
-        self.download_info_label.repaint()
-        QApplication.processEvents()  # Xử lý tất cả các sự kiện đang chờ
     
-    def on_download_finished(self, message):
-        """Xử lý khi tải xuống hoàn tất"""
-        # Không cần đặt lại giá trị 100% vì nó đã được cập nhật trong quá trình tải xuống
-        # self.progress_bar.setValue(100)
+    def on_batch_finished(self):
+        """Xử lý khi toàn bộ đợt tải xuống đã kết thúc"""
+        jobs = self.batch_jobs()
+        failed = [job for job in jobs if job.state == JobState.FAILED]
+        cancelled = [job for job in jobs if job.state == JobState.CANCELLED]
+        done = [job for job in jobs if job.state == JobState.DONE]
         
-        self.status_label.setText(message)
-        self.download_btn.setEnabled(True)
-        self.analyze_btn.setEnabled(True)
         self.cancel_btn.setEnabled(False)  # Vô hiệu hóa nút hủy
         
+        if failed:
+            self.progress_bar.setVisible(False)
+            self.download_info_label.setVisible(False)
+            self.status_label.setText(f"Có lỗi xảy ra ({len(failed)}/{len(jobs)} video)")
+            QMessageBox.critical(self, "Lỗi", f"Lỗi: {failed[0].error}" if len(failed) == 1 else
+                                 f"{len(failed)} video tải xuống thất bại.\nLỗi đầu tiên: {failed[0].error}")
+            return
+        
+        if cancelled and not done:
+            self.progress_bar.setVisible(False)
+            self.download_info_label.setVisible(False)
+            self.status_label.setText("Đã hủy tải xuống")
+            return
+        
+        self.status_label.setText("Tải xuống hoàn tất!")
+        self.refresh_history()
+        
         # Hiển thị thông báo hoàn tất nếu được bật
         if self.show_notification_checkbox.isChecked():
             QMessageBox.information(self, "Hoàn tất", "Tải xuống đã hoàn tất!")
@@ -551,40 +940,134 @@ class MainWindow(QMainWindow):
                     os.startfile(save_path)
                 elif os.name == 'posix':  # macOS, Linux
                     subprocess.call(['open' if sys.platform == 'darwin' else 'xdg-open', save_path])
-    
-    def on_download_error(self, error_message):
-        """Xử lý khi có lỗi tải xuống"""
-        self.progress_bar.setVisible(False)
-        self.download_info_label.setVisible(False)
-        self.status_label.setText("Có lỗi xảy ra")
-        self.download_btn.setEnabled(True)
-        self.analyze_btn.setEnabled(True)
-        self.cancel_btn.setEnabled(False)  # Vô hiệu hóa nút hủy
+
+    def show_performance_report(self):
+        """Hiển thị thời gian từng giai đoạn (trích xuất, tải, ghép, hậu xử lý...) của các video trong đợt tải"""
+        lines = []
+        for job in self.batch_jobs():
+            title = job.metadata.get('title') or job.url
+            lines.append(f"#{job.id} {title} [{job.state}]")
+            lines.append(f"    chờ {job.wait_time:.2f}s · {format_report(job.metrics.report())}")
+        summary = self.downloader.metrics.snapshot()
+        slowest = sorted(summary['phases'].items(), key=lambda item: item[1]['sum'], reverse=True)[:5]
+        if slowest:
+            lines.append("")
+            lines.append("Tổng (từ khi mở ứng dụng): " + " · ".join(
+                f"{name} {stat['sum']:.1f}s/{stat['count']} lần" for name, stat in slowest))
+        QMessageBox.information(self, "Báo cáo hiệu năng", "\n".join(lines) or "Chưa có video nào")
+
+    def offer_resume_interrupted(self):
+        """Đề nghị tiếp tục các công việc bị gián đoạn từ lần chạy trước"""
+        if self.journal is None:
+            return
+        entries = self.journal.interrupted()
+        if not entries:
+            return
         
-        # Nếu không phải là thông báo hủy, hiển thị lỗi
-        if error_message != "Đã hủy tải xuống":
-            QMessageBox.critical(self, "Lỗi", error_message)
-        else:
-            self.status_label.setText(error_message)
+        partial_bytes = sum(entry.partial_bytes() for entry in entries)
+        message = f"Có {len(entries)} video tải xuống bị gián đoạn từ lần trước"
+        if partial_bytes > 0:
+            message += f" ({format_filesize(partial_bytes)} đã tải)"
+        message += ".\nBạn có muốn tiếp tục tải không?"
+        
+        answer = QMessageBox.question(self, "Tiếp tục tải xuống", message,
+                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        if answer != QMessageBox.Yes:
+            self.journal.discard(entries)
+            return
+        
+        if self.download_queue.is_idle():
+            self.batch_job_ids = {}
+            self.reset_progress_ui()
+        self.progress_bar.setVisible(True)
+        self.download_info_label.setVisible(True)
+        self.cancel_btn.setEnabled(True)
+        jobs = self.journal.resume(self.download_queue, entries)
+        self.batch_job_ids.update(dict.fromkeys(job.id for job in jobs))
+        self.report_btn.setEnabled(bool(self.batch_job_ids))
+        self.refresh_queue_status()
 
     def cancel_download(self):
-        """Hủy quá trình tải xuống"""
-        if hasattr(self, 'download_thread') and self.download_thread.isRunning():
-            self.download_thread.cancel_download()
+        """Hủy tất cả công việc đang chạy và đang chờ trong đợt tải hiện tại"""
+        if not self.download_queue.is_idle():
+            for job_id in self.batch_job_ids:
+                self.download_queue.cancel(job_id)
             self.status_label.setText("Đang hủy tải xuống...")
             self.cancel_btn.setEnabled(False)
 
+    def closeEvent(self, event):
+        """Tạm dừng các công việc còn lại khi đóng cửa sổ (lần mở sau được đề nghị tải tiếp)"""
+        self.download_queue.pause_all()
+        self.downloader.postprocessor.shutdown(wait=False)
+        self.extraction_service.close()
+        self.thumbnail_fetcher.close()
+        self.downloader.sessions.close()
+        self.progress_aggregator.stop()
+        self.config.close()
+        super().closeEvent(event)
+
     def reset_progress_ui(self):
         """Đặt lại giao diện tiến trình"""
         self.progress_bar.setValue(0)
         self.progress_bar.setVisible(False)
         self.download_info_label.setVisible(False)
         self.download_info_label.setText("")
-        self.last_downloaded = 0
-        self.last_time = 0
-        self.speed_history = []  # Đặt lại lịch sử tốc độ
-        self.last_displayed_speed = 0  # Đặt lại tốc độ hiển thị cuối cùng
-        self.last_speed_update_time = 0  # Đặt lại thời điểm cập nhật tốc độ cuối cùng
+        self.throughput.reset()
+
+    def setup_history_tab(self, tab):
+        """Thiết lập giao diện cho tab lịch sử tải xuống"""
+        tab_layout = QVBoxLayout(tab)
+        
+        # Ô tìm kiếm theo tiêu đề, kênh, URL hoặc đường dẫn file
+        search_layout = QHBoxLayout()
+        search_label = QLabel("Tìm kiếm:")
+        search_label.setMinimumWidth(80)
+        self.history_search_input = QLineEdit()
+        self.history_search_input.setPlaceholderText("Tiêu đề, kênh, URL hoặc tên file")
+        search_layout.addWidget(search_label)
+        search_layout.addWidget(self.history_search_input)
+        
+        # Chỉ tìm khi người dùng ngừng gõ một lúc
+        self.history_search_timer = QTimer(self)
+        self.history_search_timer.setSingleShot(True)
+        self.history_search_timer.setInterval(200)
+        self.history_search_timer.timeout.connect(self.refresh_history)
+        self.history_search_input.textChanged.connect(self.history_search_timer.start)
+        
+        self.history_list = QListWidget()
+        self.history_list.itemDoubleClicked.connect(self.open_history_item)
+        self.history_count_label = QLabel("")
+        
+        tab_layout.addLayout(search_layout)
+        tab_layout.addWidget(self.history_list)
+        tab_layout.addWidget(self.history_count_label)
+        
+        self.refresh_history()
+
+    def refresh_history(self):
+        """Hiển thị kết quả tìm kiếm (hoặc các video mới nhất) trong lịch sử"""
+        self.history_list.clear()
+        if self.history is None:
+            self.history_count_label.setText("Không thể mở lịch sử tải xuống")
+            return
+        
+        entries = self.history.search(self.history_search_input.text())
+        for entry in entries:
+            date = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry.downloaded_at))
+            text = f"{date}  {entry.title}"
+            if entry.uploader:
+                text += f" - {entry.uploader}"
+            if entry.download_type == "audio":
+                text += " (MP3)"
+            self.history_list.addItem(text)
+            self.history_list.item(self.history_list.count() - 1).setData(Qt.UserRole, entry.file_path)
+        self.history_count_label.setText(f"{len(entries)} / {self.history.count()} video")
+
+    def open_history_item(self, item):
+        """Mở thư mục chứa file của video được chọn trong lịch sử"""
+        file_path = item.data(Qt.UserRole)
+        if not file_path or not os.path.exists(file_path) or not open_file_location(file_path):
+            QMessageBox.warning(self, "Lỗi", "Không tìm thấy file đã tải")
 
     def setup_settings_tab(self, tab):
         """Thiết lập giao diện cho tab cài đặt"""
@@ -628,9 +1111,69 @@ class MainWindow(QMainWindow):
         retry_layout.addWidget(self.retry_spinbox)
         retry_layout.addStretch()
         
+        # Số video tải song song trong hàng đợi
+        max_parallel_layout = QHBoxLayout()
+        max_parallel_label = QLabel("Số video tải song song tối đa:")
+        self.max_parallel_spinbox = QSpinBox()
+        self.max_parallel_spinbox.setMinimum(1)
+        self.max_parallel_spinbox.setMaximum(16)
+        self.max_parallel_spinbox.setValue(3)  # Giá trị mặc định
+        self.max_parallel_spinbox.valueChanged.connect(self.download_queue.set_max_parallel)
+        max_parallel_layout.addWidget(max_parallel_label)
+        max_parallel_layout.addWidget(self.max_parallel_spinbox)
+        max_parallel_layout.addStretch()
+        
+        # Ngân sách băng thông chung cho tất cả video đang tải
+        total_bandwidth_layout = QHBoxLayout()
+        total_bandwidth_label = QLabel("Băng thông tổng tối đa (MB/s, 0 = không giới hạn):")
+        self.total_bandwidth_spinbox = QDoubleSpinBox()
+        self.total_bandwidth_spinbox.setMinimum(0)
+        self.total_bandwidth_spinbox.setMaximum(1000)
+        self.total_bandwidth_spinbox.setSingleStep(0.5)
+        self.total_bandwidth_spinbox.setValue(0)  # Giá trị mặc định
+        self.total_bandwidth_spinbox.valueChanged.connect(self.apply_bandwidth_settings)
+        total_bandwidth_layout.addWidget(total_bandwidth_label)
+        total_bandwidth_layout.addWidget(self.total_bandwidth_spinbox)
+        total_bandwidth_layout.addStretch()
+        
+        # Lịch băng thông theo giờ trong ngày
+        bandwidth_schedule_layout = QHBoxLayout()
+        bandwidth_schedule_label = QLabel("Lịch băng thông:")
+        self.bandwidth_schedule_input = QLineEdit()
+        self.bandwidth_schedule_input.setPlaceholderText("Ví dụ: 08:00-18:00=2M; 18:00-08:00=0")
+        self.bandwidth_schedule_input.editingFinished.connect(self.apply_bandwidth_settings)
+        bandwidth_schedule_layout.addWidget(bandwidth_schedule_label)
+        bandwidth_schedule_layout.addWidget(self.bandwidth_schedule_input)
+        
+        # Bộ đệm các luồng đã tải (dùng lại khi tải cùng video ở chất lượng/thư mục khác)
+        media_cache_layout = QHBoxLayout()
+        media_cache_label = QLabel("Bộ đệm media (GB, 0 = tắt):")
+        self.media_cache_spinbox = QSpinBox()
+        self.media_cache_spinbox.setMinimum(0)
+        self.media_cache_spinbox.setMaximum(10000)
+        self.media_cache_spinbox.setValue(0)  # Giá trị mặc định
+        media_cache_layout.addWidget(media_cache_label)
+        media_cache_layout.addWidget(self.media_cache_spinbox)
+        media_cache_layout.addStretch()
+        
+        # Tự điều chỉnh số kết nối và buffer theo tốc độ đo được
+        self.auto_tune_checkbox = QCheckBox("Tự động điều chỉnh số kết nối và buffer theo tốc độ mạng")
+        self.auto_tune_checkbox.setChecked(True)
+        self.auto_tune_checkbox.toggled.connect(self.toggle_auto_tune)
+        
+        download_settings_layout.addLayout(max_parallel_layout)
+        download_settings_layout.addWidget(self.auto_tune_checkbox)
         download_settings_layout.addLayout(concurrent_layout)
         download_settings_layout.addLayout(buffer_layout)
         download_settings_layout.addLayout(retry_layout)
+        download_settings_layout.addLayout(total_bandwidth_layout)
+        download_settings_layout.addLayout(bandwidth_schedule_layout)
+        download_settings_layout.addLayout(media_cache_layout)
+        
+        # Bỏ qua video đã có trong lịch sử
+        self.skip_downloaded_checkbox = QCheckBox("Bỏ qua video đã tải (file vẫn còn trên đĩa)")
+        self.skip_downloaded_checkbox.setChecked(True)
+        download_settings_layout.addWidget(self.skip_downloaded_checkbox)
         
         # Nhóm cài đặt giao diện
         ui_settings_group = QGroupBox("Cài đặt giao diện")
@@ -655,6 +1198,7 @@ class MainWindow(QMainWindow):
         self.speed_update_spinbox.setMinimum(1)
         self.speed_update_spinbox.setMaximum(5)
         self.speed_update_spinbox.setValue(1)  # Giá trị mặc định
+        self.speed_update_spinbox.valueChanged.connect(self.on_speed_update_interval_changed)
         speed_update_layout.addWidget(speed_update_label)
         speed_update_layout.addWidget(self.speed_update_spinbox)
         speed_update_layout.addStretch()
@@ -708,6 +1252,13 @@ class MainWindow(QMainWindow):
         # Khởi tạo cài đặt
         self.load_settings()
         self.toggle_ffmpeg_path()
+        self.toggle_auto_tune()
+
+    def toggle_auto_tune(self):
+        """Số kết nối và buffer chỉ chỉnh tay được khi tắt tự điều chỉnh"""
+        manual = not self.auto_tune_checkbox.isChecked()
+        self.concurrent_spinbox.setEnabled(manual)
+        self.buffer_spinbox.setEnabled(manual)
 
     def toggle_ffmpeg_path(self):
         """Bật/tắt trường nhập đường dẫn ffmpeg"""
@@ -724,12 +1275,16 @@ class MainWindow(QMainWindow):
 
     def save_settings(self):
         """Lưu cài đặt người dùng"""
-        # Lưu cài đặt vào file cấu hình
-        import json
-        settings = {
+        self.config.update({
+            "max_parallel_downloads": self.max_parallel_spinbox.value(),
             "concurrent_downloads": self.concurrent_spinbox.value(),
             "buffer_size": self.buffer_spinbox.value(),
             "retry_count": self.retry_spinbox.value(),
+            "auto_tune": self.auto_tune_checkbox.isChecked(),
+            "total_bandwidth_limit": self.total_bandwidth_spinbox.value(),
+            "bandwidth_schedule": self.bandwidth_schedule_input.text(),
+            "skip_downloaded": self.skip_downloaded_checkbox.isChecked(),
+            "media_cache_size": self.media_cache_spinbox.value(),
             "show_notification": self.show_notification_checkbox.isChecked(),
             "open_folder_after_download": self.open_folder_checkbox.isChecked(),
             "save_last_path": self.save_last_path_checkbox.isChecked(),
@@ -737,50 +1292,84 @@ class MainWindow(QMainWindow):
             "ffmpeg_path": self.ffmpeg_path_input.text(),
             "last_save_path": self.save_path_input.text(),
             "speed_update_interval": self.speed_update_spinbox.value()
-        }
+        })
         
-        try:
-            config_dir = os.path.join(os.path.expanduser('~'), '.lappytube')
-            if not os.path.exists(config_dir):
-                os.makedirs(config_dir)
-            
-            config_file = os.path.join(config_dir, 'config.json')
-            with open(config_file, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, indent=4)
-            
+        # Người dùng bấm lưu nên ghi ngay thay vì chờ lượt ghi gộp
+        if self.config.flush():
             QMessageBox.information(self, "Thành công", "Đã lưu cài đặt thành công!")
-        except Exception as e:
-            QMessageBox.critical(self, "Lỗi", f"Không thể lưu cài đặt: {str(e)}")
+        else:
+            QMessageBox.critical(self, "Lỗi", f"Không thể lưu cài đặt vào {self.config.config_file}")
 
     def load_settings(self):
         """Tải cài đặt người dùng"""
-        import json
-        config_file = os.path.join(os.path.expanduser('~'), '.lappytube', 'config.json')
-        
-        if os.path.exists(config_file):
-            try:
-                with open(config_file, 'r', encoding='utf-8') as f:
-                    settings = json.load(f)
-                
-                # Áp dụng cài đặt
-                self.concurrent_spinbox.setValue(settings.get("concurrent_downloads", 8))
-                self.buffer_spinbox.setValue(settings.get("buffer_size", 16))
-                self.retry_spinbox.setValue(settings.get("retry_count", 10))
-                self.show_notification_checkbox.setChecked(settings.get("show_notification", True))
-                self.open_folder_checkbox.setChecked(settings.get("open_folder_after_download", False))
-                self.save_last_path_checkbox.setChecked(settings.get("save_last_path", True))
-                self.auto_detect_ffmpeg_checkbox.setChecked(settings.get("auto_detect_ffmpeg", True))
-                self.ffmpeg_path_input.setText(settings.get("ffmpeg_path", ""))
-                
-                # Nếu lưu đường dẫn cuối cùng, áp dụng nó
-                if settings.get("save_last_path", True) and "last_save_path" in settings:
-                    self.save_path_input.setText(settings.get("last_save_path"))
-                
-                # Cập nhật tần suất cập nhật tốc độ
-                self.speed_update_spinbox.setValue(settings.get("speed_update_interval", 1))
-                self.speed_update_interval = float(self.speed_update_spinbox.value())
-            except Exception as e:
-                print(f"Lỗi khi tải cài đặt: {str(e)}")
+        config = self.config
+        self.max_parallel_spinbox.setValue(config.get("max_parallel_downloads"))
+        self.concurrent_spinbox.setValue(config.get("concurrent_downloads"))
+        self.buffer_spinbox.setValue(config.get("buffer_size"))
+        self.retry_spinbox.setValue(config.get("retry_count"))
+        self.auto_tune_checkbox.setChecked(config.get("auto_tune"))
+        self.total_bandwidth_spinbox.setValue(config.get("total_bandwidth_limit"))
+        self.bandwidth_schedule_input.setText(config.get("bandwidth_schedule"))
+        self.apply_bandwidth_settings()
+        self.skip_downloaded_checkbox.setChecked(config.get("skip_downloaded"))
+        self.media_cache_spinbox.setValue(config.get("media_cache_size"))
+        self.show_notification_checkbox.setChecked(config.get("show_notification"))
+        self.open_folder_checkbox.setChecked(config.get("open_folder_after_download"))
+        self.save_last_path_checkbox.setChecked(config.get("save_last_path"))
+        self.auto_detect_ffmpeg_checkbox.setChecked(config.get("auto_detect_ffmpeg"))
+        self.ffmpeg_path_input.setText(config.get("ffmpeg_path"))
+        
+        # Nếu lưu đường dẫn cuối cùng, áp dụng nó
+        if config.get("save_last_path") and config.get("last_save_path"):
+            self.save_path_input.setText(config.get("last_save_path"))
+        
+        # Cập nhật tần suất cập nhật tốc độ
+        self.speed_update_spinbox.setValue(config.get("speed_update_interval"))
+        self.speed_update_interval = float(self.speed_update_spinbox.value())
+
+    def on_config_changed(self, key, value):
+        """Áp dụng cho hàng đợi và downloader các cài đặt vừa thay đổi trong cấu hình"""
+        if key == "max_parallel_downloads":
+            self.download_queue.set_max_parallel(value)
+        elif key == "speed_update_interval":
+            self.progress_aggregator.set_interval(value)
+        elif key == "total_bandwidth_limit":
+            self.downloader.bandwidth.set_limit(int(value * 1024 * 1024))
+        elif key in ("media_cache_size", "media_cache_dir"):
+            self.update_media_cache()
+
+    def update_media_cache(self):
+        """Bật/tắt hoặc đổi dung lượng bộ đệm media theo cấu hình"""
+        max_size = self.config.get("media_cache_size", 0) * 1024 * 1024 * 1024
+        if max_size <= 0:
+            self.downloader.media_cache = None
+            return
+        root = self.config.get("media_cache_dir") or None
+        cache = self.downloader.media_cache
+        if cache is not None and (not root or os.path.abspath(root) == os.path.abspath(cache.root)):
+            cache.set_max_size(max_size)
+            return
+        try:
+            self.downloader.media_cache = MediaCache(root, max_size)
+        except Exception as e:
+            logger.warning("Không thể mở bộ đệm media: %s", e)
+            self.downloader.media_cache = None
+
+    def apply_bandwidth_settings(self):
+        """Áp dụng ngân sách và lịch băng thông cho các lượt tải đang chạy và sắp chạy"""
+        bandwidth = self.downloader.bandwidth
+        bandwidth.set_limit(int(self.total_bandwidth_spinbox.value() * 1024 * 1024))
+        try:
+            bandwidth.set_schedule(parse_bandwidth_schedule(self.bandwidth_schedule_input.text()))
+            self.bandwidth_schedule_input.setStyleSheet("")
+        except ValueError as e:
+            logger.warning("%s", e)
+            self.bandwidth_schedule_input.setStyleSheet("border: 1px solid red;")
+
+    def on_speed_update_interval_changed(self, value):
+        """Tần suất cập nhật tốc độ cũng là tần suất phát tiến trình từ hàng đợi"""
+        self.speed_update_interval = float(value)
+        self.progress_aggregator.set_interval(value)
 
     def on_download_type_changed(self, index):
         """Xử lý khi người dùng thay đổi loại tải xuống"""
@@ -797,55 +1386,23 @@ class MainWindow(QMainWindow):
         
         self.quality_combo.clear()
         
+        # Mỗi dòng hiển thị nhãn dễ đọc, còn dữ liệu là khóa chất lượng truyền cho downloader
+        options = [option for option in video_info.get('options', []) if option.kind == download_type]
+        for option in options:
+            self.quality_combo.addItem(option.label, option.key)
+        
+        # Thêm tùy chọn "Tốt nhất" và chọn theo mặc định
         if download_type == "video":
-            # Lọc ra các tùy chọn video
-            video_qualities = [q for q in video_info['qualities'] if not q.startswith('0kbps') and not 'kbps' in q]
-            if video_qualities:
-                for quality in video_qualities:
-                    self.quality_combo.addItem(quality)
-                # Thêm tùy chọn "Tốt nhất"
-                self.quality_combo.addItem("Chất lượng cao nhất", "best")
-                # Chọn chất lượng cao nhất theo mặc định
-                self.quality_combo.setCurrentIndex(self.quality_combo.count() - 1)
-        else:  # audio
-            # Lọc ra các tùy chọn audio
-            audio_qualities = [q for q in video_info['qualities'] if 'kbps' in q]
-            
-            # Ưu tiên hiển thị các tùy chọn MP3 trước
-            mp3_qualities = [q for q in audio_qualities if 'mp3' in q]
-            other_audio_qualities = [q for q in audio_qualities if 'mp3' not in q]
-            
-            # Sắp xếp theo bitrate
-            def get_bitrate(quality_str):
-                try:
-                    if 'kbps' in quality_str:
-                        return float(quality_str.split('kbps')[0])
-                    return 0
-                except:
-                    return 0
-            
-            mp3_qualities.sort(key=get_bitrate)
-            other_audio_qualities.sort(key=get_bitrate)
-            
-            # Kết hợp lại, đặt MP3 lên đầu
-            sorted_audio_qualities = mp3_qualities + other_audio_qualities
-            
-            if sorted_audio_qualities:
-                for quality in sorted_audio_qualities:
-                    self.quality_combo.addItem(quality)
-                # Thêm tùy chọn "Tốt nhất"
-                self.quality_combo.addItem("Chất lượng cao nhất (MP3)", "bestaudio")
-                # Chọn chất lượng cao nhất theo mặc định
-                self.quality_combo.setCurrentIndex(self.quality_combo.count() - 1)
-            else:
-                # Nếu không có tùy chọn audio cụ thể, thêm tùy chọn mặc định
-                self.quality_combo.addItem("Chất lượng cao nhất (MP3)", "bestaudio")
+            self.quality_combo.addItem("Chất lượng cao nhất", "best")
+        else:
+            self.quality_combo.addItem("Chất lượng cao nhất (MP3)", "bestaudio")
+        self.quality_combo.setCurrentIndex(self.quality_combo.count() - 1)
         
         self.quality_combo.setEnabled(True)
 
 class AnalyzeThread(QThread):
     """Thread xử lý phân tích video"""
-    finished_signal = pyqtSignal(dict)
+    finished_signal = pyqtSignal(object)
     error_signal = pyqtSignal(str)
     
     def __init__(self, downloader, url):
@@ -858,4 +1415,69 @@ class AnalyzeThread(QThread):
             video_info = self.downloader.get_video_info(self.url)
             self.finished_signal.emit(video_info)
         except Exception as e:
-            self.error_signal.emit(str(e)) 
\ No newline at end of file
+            self.error_signal.emit(str(e)) 
+
+class BulkAnalyzeThread(QThread):
+    """Thread kiểm tra song song danh sách URL, phát kết quả theo thứ tự hoàn thành"""
+    result_signal = pyqtSignal(dict)  # AnalysisResult.summary()
+    finished_signal = pyqtSignal()
+    
+    def __init__(self, service, urls):
+        super().__init__()
+        self.service = service
+        self.urls = urls
+        self.is_stopped = False
+    
+    def run(self):
+        for result in self.service.analyze(self.urls, should_stop=lambda: self.is_stopped):
+            if self.is_stopped:
+                break
+            self.result_signal.emit(result.summary())
+        if not self.is_stopped:
+            self.finished_signal.emit()
+    
+    def stop(self):
+        """Dừng kiểm tra (các URL chưa bắt đầu bị bỏ)"""
+        self.is_stopped = True
+
+class PlaylistAnalyzeThread(QThread):
+    """Thread liệt kê danh sách phát/kênh và lấy thông tin từng video song song"""
+    entry_signal = pyqtSignal(dict)  # entry đã liệt kê
+    resolved_signal = pyqtSignal(int, str)  # index, tóm tắt định dạng
+    finished_signal = pyqtSignal(int)  # số video
+    error_signal = pyqtSignal(str)
+    
+    def __init__(self, downloader, url, max_workers=4):
+        super().__init__()
+        self.url = url
+        self.expander = PlaylistExpander(downloader, max_workers=max_workers)
+        self.is_stopped = False
+    
+    def run(self):
+        def on_entry(entry):
+            if not self.is_stopped:
+                self.entry_signal.emit(entry)
+        
+        def on_resolved(entry, info):
+            if self.is_stopped:
+                return
+            heights = [f.get('height') for f in info.get('formats', [])
+                       if f.get('vcodec') not in (None, 'none') and f.get('height')]
+            self.resolved_signal.emit(entry['index'], f"tối đa {max(heights)}p" if heights else "")
+        
+        try:
+            entries = self.expander.expand(
+                self.url,
+                on_entry=on_entry,
+                on_resolved=on_resolved,
+                should_stop=lambda: self.is_stopped
+            )
+            if not self.is_stopped:
+                self.finished_signal.emit(len(entries))
+        except Exception as e:
+            if not self.is_stopped:
+                self.error_signal.emit(f"Lỗi khi lấy danh sách phát: {str(e)}")
+    
+    def stop(self):
+        """Dừng liệt kê"""
+        self.is_stopped = True
@@ -4,9 +4,45 @@ Các hàm tiện ích cho ứng dụng
 
 import os
 import re
+import logging
 import platform
 import subprocess
 
+def setup_logging(level=None, stream=None):
+    """
+    Cấu hình logging cho ứng dụng
+    
+    Mức log mặc định lấy từ biến môi trường LAPPYTUBE_LOG_LEVEL (mặc định WARNING),
+    các thông tin debug trong quá trình tải chỉ được ghi khi bật mức DEBUG.
+    
+    Args:
+        level (str|int, optional): Mức log, ví dụ "DEBUG", "INFO"
+        stream (file, optional): Nơi ghi log, mặc định là stderr
+    """
+    if level is None:
+        level = os.environ.get('LAPPYTUBE_LOG_LEVEL', 'WARNING')
+    if isinstance(level, str):
+        level = getattr(logging, level.upper(), logging.WARNING)
+    logging.basicConfig(
+        level=level,
+        stream=stream,
+        format='%(asctime)s %(levelname)s [%(name)s] %(message)s'
+    )
+
+def get_app_data_dir(*parts):
+    """
+    Lấy (và tạo nếu chưa có) thư mục dữ liệu của ứng dụng trong ~/.lappytube
+    
+    Args:
+        *parts (str): Các thư mục con bên trong thư mục dữ liệu
+        
+    Returns:
+        str: Đường dẫn thư mục
+    """
+    path = os.path.join(os.path.expanduser('~'), '.lappytube', *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
 def sanitize_filename(filename):
     """
     Làm sạch tên file để tránh các ký tự không hợp lệ
@@ -40,6 +76,28 @@ def format_filesize(size_bytes):
     else:
         return f"{size_bytes/(1024*1024*1024):.2f} GB"
 
+def parse_size(value):
+    """
+    Chuyển chuỗi kích thước như "500K", "5M", "1.5G" thành số byte
+    
+    Args:
+        value (str): Chuỗi kích thước
+        
+    Returns:
+        int: Số byte
+        
+    Raises:
+        ValueError: Chuỗi không hợp lệ (argparse báo lỗi tham số khi dùng làm type)
+    """
+    text = str(value).strip().upper().rstrip('B')
+    multipliers = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    try:
+        if text and text[-1] in multipliers:
+            return int(float(text[:-1]) * multipliers[text[-1]])
+        return int(float(text))
+    except ValueError:
+        raise ValueError(f"Kích thước không hợp lệ: {value}")
+
 def format_duration(seconds):
     """
     Định dạng thời lượng thành dạng dễ đọc
@@ -80,4 +138,62 @@ def open_file_location(file_path):
             subprocess.Popen(["xdg-open", os.path.dirname(file_path)])
         return True
     except Exception:
-        return False 
\ No newline at end of file
+        return False
+
+def parse_url_list(text):
+    """
+    Tách danh sách URL từ một đoạn văn bản (mỗi dòng, dấu cách hoặc dấu phẩy)
+    
+    Args:
+        text (str): Văn bản chứa một hoặc nhiều URL
+        
+    Returns:
+        list: Danh sách URL không trùng lặp, giữ nguyên thứ tự xuất hiện
+    """
+    urls = []
+    seen = set()
+    for token in re.split(r'[\s,]+', text or ''):
+        token = token.strip()
+        # Bỏ qua dòng chú thích và các chuỗi không phải URL
+        if not token or token.startswith('#'):
+            continue
+        if not re.match(r'^https?://', token, re.IGNORECASE):
+            continue
+        if token not in seen:
+            seen.add(token)
+            urls.append(token)
+    return urls
+
+# ID video YouTube: đúng 11 ký tự [0-9A-Za-z_-]
+_VIDEO_ID = r'[0-9A-Za-z_-]{11}'
+_VIDEO_ID_RE = re.compile(rf'^{_VIDEO_ID}$')
+# ID video YouTube trong các dạng URL phổ biến (watch?v=, youtu.be/, shorts/, embed/, live/)
+_YOUTUBE_ID_RE = re.compile(
+    r'(?:youtube(?:-nocookie)?\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)'
+    rf'({_VIDEO_ID})(?![0-9A-Za-z_-])'
+)
+
+def is_video_id(value):
+    """
+    Kiểm tra chuỗi có đúng dạng ID video YouTube hay không
+    
+    Args:
+        value (str): Chuỗi cần kiểm tra
+        
+    Returns:
+        bool: True nếu là ID video hợp lệ
+    """
+    return bool(_VIDEO_ID_RE.match(value or ''))
+
+def extract_video_id(url):
+    """
+    Lấy ID video YouTube từ URL mà không cần truy cập mạng
+    
+    Args:
+        url (str): URL video
+        
+    Returns:
+        str: ID video (11 ký tự), hoặc None nếu URL không phải video YouTube
+    """
+    match = _YOUTUBE_ID_RE.search(url or '')
+    return match.group(1) if match else None